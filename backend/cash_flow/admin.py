@@ -1,10 +1,20 @@
-import logging
+from datetime import date, datetime, time, timedelta
 
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import Model, QuerySet
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
 
-from .models import CashFlow, CashFlowType, Category, Status, Subcategory
+from .filters import CashFlowFilter
+from .models import CashFlow, CashFlowRollup, CashFlowType, Category, Status, Subcategory
+from .pagination import EstimatedCountPaginator
 
-logger = logging.getLogger(__name__)
+# Parents with more children than this link to the filtered child changelist
+# instead of rendering every child in an inline formset
+MAX_INLINE_ROWS = 50
 
 
 class StatusAdmin(admin.ModelAdmin):
@@ -13,6 +23,45 @@ class StatusAdmin(admin.ModelAdmin):
     fieldsets = [
         (None, {"fields": ["name"]}),
     ]
+    search_fields = ["name"]
+    ordering = ["name"]
+
+
+class BoundedInlineMixin:
+    """Inlines only for parents with at most ``MAX_INLINE_ROWS`` children.
+
+    ``children_link`` is a read-only field linking to the filtered changelist
+    of the children, which stays usable for parents of any size.
+    """
+
+    inline_model: type[Model]
+    inline_fk: str
+
+    def get_inlines(self, request: HttpRequest, obj: Model | None) -> list[type]:
+        """Drop the inlines of parents with too many children"""
+        inlines = super().get_inlines(request, obj)
+        if obj is not None and self._children(obj).count() > MAX_INLINE_ROWS:
+            return []
+        return inlines
+
+    @admin.display(description="Children")
+    def children_link(self, obj: Model) -> str:
+        """Return the number of children, linked to their changelist"""
+        if obj.pk is None:
+            return "-"
+        opts = self.inline_model._meta  # noqa: SLF001
+        url = reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist")
+        return format_html(
+            '<a href="{}?{}__id__exact={}">{} {}</a>',
+            url,
+            self.inline_fk,
+            obj.pk,
+            self._children(obj).count(),
+            opts.verbose_name_plural.lower(),
+        )
+
+    def _children(self, obj: Model) -> QuerySet:
+        return self.inline_model.objects.filter(**{self.inline_fk: obj})
 
 
 class CategoryInline(admin.TabularInline):
@@ -22,13 +71,19 @@ class CategoryInline(admin.TabularInline):
     extra = 1
 
 
-class CashFlowTypeAdmin(admin.ModelAdmin):
+class CashFlowTypeAdmin(BoundedInlineMixin, admin.ModelAdmin):
     """Admin for CashFlowType model"""
 
     fieldsets = [
-        (None, {"fields": ["name"]}),
+        (None, {"fields": ["name", "sign", "children_link"]}),
     ]
+    readonly_fields = ["children_link"]
     inlines = [CategoryInline]
+    inline_model = Category
+    inline_fk = "cash_flow_type"
+    list_display = ["name", "sign"]
+    search_fields = ["name"]
+    ordering = ["name"]
 
 
 class SubcategoryInline(admin.TabularInline):
@@ -38,13 +93,22 @@ class SubcategoryInline(admin.TabularInline):
     extra = 1
 
 
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(BoundedInlineMixin, admin.ModelAdmin):
     """Admin for Category model"""
 
     fieldsets = [
-        (None, {"fields": ["name", "cash_flow_type"]}),
+        (None, {"fields": ["name", "cash_flow_type", "children_link"]}),
     ]
+    readonly_fields = ["children_link"]
     inlines = [SubcategoryInline]
+    inline_model = Subcategory
+    inline_fk = "category"
+    list_display = ["name", "cash_flow_type"]
+    list_select_related = ["cash_flow_type"]
+    list_filter = ["cash_flow_type"]
+    search_fields = ["name"]
+    ordering = ["name"]
+    autocomplete_fields = ["cash_flow_type"]
 
 
 class SubcategoryAdmin(admin.ModelAdmin):
@@ -53,14 +117,145 @@ class SubcategoryAdmin(admin.ModelAdmin):
     fieldsets = [
         (None, {"fields": ["name", "category"]}),
     ]
+    list_display = ["name", "category"]
+    list_select_related = ["category"]
+    list_filter = ["category"]
+    search_fields = ["name"]
+    ordering = ["name"]
+    autocomplete_fields = ["category"]
+
+
+class AdminEstimatedCountPaginator(EstimatedCountPaginator):
+    """``EstimatedCountPaginator`` with the constructor signature the admin calls"""
+
+    def __init__(
+        self,
+        object_list: QuerySet,
+        per_page: int,
+        orphans: int = 0,  # noqa: ARG002
+        allow_empty_first_page: bool = True,  # noqa: ARG002, FBT001, FBT002
+    ) -> None:
+        """Count at most ``CASH_FLOW_COUNT_CAP`` rows of filtered changelists"""
+        super().__init__(object_list, per_page, cap=settings.CASH_FLOW_COUNT_CAP)
+
+
+class CreatedMonthFilter(admin.SimpleListFilter):
+    """Month of ``created_at``, filtered as a range so partitions are pruned.
+
+    The choices come from the daily rollup instead of a scan of the cash flows.
+    """
+
+    title = "created month"
+    parameter_name = "created_month"
+
+    def lookups(self, request: HttpRequest, model_admin: admin.ModelAdmin) -> list[tuple[str, str]]:  # noqa: ARG002
+        """Months with cash flows, latest first"""
+        months = CashFlowRollup.objects.dates("day", "month", order="DESC")
+        return [(month.strftime("%Y-%m"), month.strftime("%Y-%m")) for month in months]
+
+    def queryset(self, request: HttpRequest, queryset: QuerySet) -> QuerySet:  # noqa: ARG002
+        """Rows created within the selected month"""
+        if not (month := _parse_date(f"{self.value()}-01")):
+            return queryset
+        following = (month + timedelta(days=32)).replace(day=1)
+        return queryset.filter(
+            created_at__gte=_midnight(month), created_at__lt=_midnight(following)
+        )
+
+
+class CreatedDayFilter(admin.SimpleListFilter):
+    """Day of ``created_at`` within the selected month, filtered as a range"""
+
+    title = "created day"
+    parameter_name = "created_day"
+
+    def lookups(self, request: HttpRequest, model_admin: admin.ModelAdmin) -> list[tuple[str, str]]:  # noqa: ARG002
+        """Days with cash flows in the selected month; none without a month"""
+        month = _parse_date(f"{request.GET.get(CreatedMonthFilter.parameter_name)}-01")
+        if month is None:
+            return []
+        following = (month + timedelta(days=32)).replace(day=1)
+        days = CashFlowRollup.objects.filter(day__gte=month, day__lt=following).dates("day", "day")
+        return [(day.isoformat(), day.strftime("%d")) for day in days]
+
+    def queryset(self, request: HttpRequest, queryset: QuerySet) -> QuerySet:  # noqa: ARG002
+        """Rows created on the selected day"""
+        if not (day := _parse_date(self.value())):
+            return queryset
+        following = day + timedelta(days=1)
+        return queryset.filter(created_at__gte=_midnight(day), created_at__lt=_midnight(following))
+
+
+def _parse_date(value: str | None) -> date | None:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _midnight(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 
 class CashFlowAdmin(admin.ModelAdmin):
-    """Admin for CashFlow model"""
+    """Admin for CashFlow model.
+
+    Built for large tables: the changelist joins the dictionary names in its
+    query, counts at most ``CASH_FLOW_COUNT_CAP`` filtered rows, and every
+    filter and the comment search are served by indexes. Dictionaries are picked
+    with autocomplete widgets instead of full dropdowns.
+    """
 
     fieldsets = [
-        (None, {"fields": ["amount", "cash_flow_type", "subcategory", "status", "comment"]}),
+        (
+            None,
+            {
+                "fields": [
+                    "amount",
+                    "cash_flow_type",
+                    "category",
+                    "subcategory",
+                    "status",
+                    "comment",
+                ]
+            },
+        ),
+        (None, {"fields": ["created_at", "updated_at"]}),
     ]
+    readonly_fields = ["created_at", "updated_at"]
+    list_display = [
+        "id",
+        "created_at",
+        "amount",
+        "cash_flow_type",
+        "category",
+        "subcategory",
+        "status",
+        "comment",
+    ]
+    list_select_related = ["cash_flow_type", "category", "subcategory", "status"]
+    list_filter = [CreatedMonthFilter, CreatedDayFilter, "status", "cash_flow_type", "category"]
+    # Shows the search box; get_search_results does the searching
+    search_fields = ["comment"]
+    autocomplete_fields = ["status", "cash_flow_type", "category", "subcategory"]
+    paginator = AdminEstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Leave out the search vector, which only the database reads"""
+        return super().get_queryset(request).defer("search_vector")
+
+    def get_search_results(
+        self,
+        request: HttpRequest,  # noqa: ARG002
+        queryset: QuerySet,
+        search_term: str,
+    ) -> tuple[QuerySet, bool]:
+        """Search the comments like the API's ``search`` parameter: full-text or
+        trigram word similarity, served by the GIN indexes of the comment. The
+        default ``UPPER(comment) LIKE`` lookup cannot use them and scans every
+        partition. Rows are never duplicated."""
+        return CashFlowFilter().filter_search(queryset, "search", search_term), False
 
 
 admin.site.register(Status, StatusAdmin)
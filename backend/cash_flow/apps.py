@@ -2,5 +2,8 @@ from django.apps import AppConfig
 
 
 class CashFlowConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'cash_flow'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "cash_flow"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,165 @@
+from collections.abc import Iterable, Mapping, Sequence
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.utils import timezone
+
+from . import versions
+from .models import BalanceSnapshot, CashFlow, CashFlowRollup, CashFlowType
+
+SNAPSHOTS = BalanceSnapshot._meta.db_table  # noqa: SLF001
+ROLLUP = CashFlowRollup._meta.db_table  # noqa: SLF001
+SOURCE = CashFlow._meta.db_table  # noqa: SLF001
+TYPES = CashFlowType._meta.db_table  # noqa: SLF001
+
+# A cash flow adds amount * cash_flow_type.sign to the balance of its status.
+# BalanceSnapshot keeps the closing balance of every status-day with cash flows up
+# to the last take() run, so a balance is the nearest earlier snapshot plus the
+# signed rollup totals of the few days after it. Rollup changes are added to the
+# later snapshots as they happen (see rollup.py); rows that leave with a detached
+# partition stay in the balance.
+
+type BalanceKey = tuple[int, date]
+
+
+def opening_balances(keys: Iterable[BalanceKey]) -> dict[BalanceKey, Decimal]:
+    """Balance of each ``(status_id, day)`` at the start of the day"""
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    statuses, days = zip(*keys, strict=True)
+    with connections[router.db_for_read(CashFlowRollup)].cursor() as cursor:
+        cursor.execute(
+            "SELECT k.status_id, k.day, COALESCE(snapshot.balance, 0) + COALESCE(("  # noqa: S608
+            f" SELECT SUM(r.total * t.sign) FROM {ROLLUP} r"
+            f" JOIN {TYPES} t ON t.id = r.cash_flow_type_id"
+            " WHERE r.status_id = k.status_id AND r.day < k.day"
+            " AND r.day > COALESCE(snapshot.day, '-infinity'::date)), 0)"
+            " FROM unnest(%s::bigint[], %s::date[]) AS k (status_id, day)"
+            " LEFT JOIN LATERAL ("
+            f" SELECT s.day, s.balance FROM {SNAPSHOTS} s"
+            " WHERE s.status_id = k.status_id AND s.day < k.day ORDER BY s.day DESC LIMIT 1"
+            ") AS snapshot ON TRUE",
+            [list(statuses), list(days)],
+        )
+        return {(status, day): balance for status, day, balance in cursor.fetchall()}
+
+
+def balances_at(day: date, statuses: Iterable[int]) -> dict[int, Decimal]:
+    """Balance of each status at the end of ``day``"""
+    following = day + timedelta(days=1)
+    opening = opening_balances((status, following) for status in statuses)
+    return {status: balance for (status, _), balance in opening.items()}
+
+
+def running_balances(rows: Sequence[Mapping[str, Any]]) -> dict[int, Decimal]:
+    """Balance of the status right after each row, ordered by ``(created_at, id)``.
+
+    ``rows`` are value rows with ``id``, ``status_id`` and ``created_at``. The
+    cash flows of the rows' status-days are summed with a window function on top
+    of the opening balance of each day, so the cost does not depend on history.
+    """
+    if not rows:
+        return {}
+    keys = sorted({(row["status_id"], timezone.localdate(row["created_at"])) for row in rows})
+    opening = opening_balances(keys)
+    statuses, days = zip(*keys, strict=True)
+    with connections[router.db_for_read(CashFlow)].cursor() as cursor:
+        cursor.execute(
+            "SELECT id, status_id, day, running FROM ("  # noqa: S608
+            " SELECT c.id, c.status_id, k.day, SUM(c.amount_minor * t.sign) OVER ("
+            " PARTITION BY c.status_id, k.day ORDER BY c.created_at, c.id) * 0.01 AS running"
+            " FROM unnest(%s::bigint[], %s::date[]) AS k (status_id, day)"
+            f" JOIN {SOURCE} c ON c.status_id = k.status_id"
+            " AND c.created_at >= k.day::timestamp AT TIME ZONE %s"
+            " AND c.created_at < (k.day + 1)::timestamp AT TIME ZONE %s"
+            f" JOIN {TYPES} t ON t.id = c.cash_flow_type_id"
+            ") AS window_sums WHERE id = ANY(%s)",
+            [
+                list(statuses),
+                list(days),
+                settings.TIME_ZONE,
+                settings.TIME_ZONE,
+                [row["id"] for row in rows],
+            ],
+        )
+        return {
+            pk: opening[status, day] + running for pk, status, day, running in cursor.fetchall()
+        }
+
+
+def shift(changes: Mapping[tuple[int, int, date], Decimal]) -> None:
+    """Add rollup total changes, keyed by ``(status_id, cash_flow_type_id, day)``,
+    to the snapshots on and after their day"""
+    params = [
+        (total, cash_flow_type, status, day)
+        for (status, cash_flow_type, day), total in sorted(changes.items())
+        if total
+    ]
+    if not params:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {SNAPSHOTS} AS s SET balance = s.balance + %s * t.sign FROM {TYPES} t"  # noqa: S608
+            " WHERE t.id = %s AND s.status_id = %s AND s.day >= %s",
+            params,
+        )
+
+
+def shift_table(source: str) -> None:
+    """Add all rows of a table with ``CashFlow`` columns, e.g. an import staging
+    table, to the snapshots on and after their day"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH changes AS ("  # noqa: S608
+            " SELECT c.status_id, (c.created_at AT TIME ZONE %s)::date AS day,"
+            " SUM(c.amount_minor * t.sign) * 0.01 AS delta"
+            f" FROM {source} c JOIN {TYPES} t ON t.id = c.cash_flow_type_id GROUP BY 1, 2)"
+            f" UPDATE {SNAPSHOTS} AS s SET balance = s.balance + d.delta FROM ("
+            f" SELECT s.id, SUM(changes.delta) AS delta FROM {SNAPSHOTS} s"
+            " JOIN changes ON changes.status_id = s.status_id AND changes.day <= s.day"
+            " GROUP BY s.id) AS d WHERE s.id = d.id",
+            [settings.TIME_ZONE],
+        )
+
+
+def take(until: date | None = None) -> int:
+    """Snapshot the closing balances of the days after the last snapshot of each
+    status, up to ``until`` (yesterday by default); returns the number of new snapshots.
+
+    Writers are blocked meanwhile so no rollup change falls between the two tables.
+    """
+    until = until or timezone.localdate() - timedelta(days=1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {ROLLUP} IN SHARE MODE")
+        cursor.execute(
+            f"INSERT INTO {SNAPSHOTS} (day, status_id, balance)"  # noqa: S608
+            " SELECT d.day, d.status_id, COALESCE(last.balance, 0)"
+            " + SUM(d.delta) OVER (PARTITION BY d.status_id ORDER BY d.day) FROM ("
+            " SELECT r.day, r.status_id, SUM(r.total * t.sign) AS delta"
+            f" FROM {ROLLUP} r JOIN {TYPES} t ON t.id = r.cash_flow_type_id"
+            " WHERE r.day <= %s AND r.day > COALESCE("
+            f" (SELECT MAX(s.day) FROM {SNAPSHOTS} s WHERE s.status_id = r.status_id),"
+            " '-infinity'::date) GROUP BY 1, 2) AS d"
+            " LEFT JOIN LATERAL ("
+            f" SELECT s.balance FROM {SNAPSHOTS} s WHERE s.status_id = d.status_id"
+            " ORDER BY s.day DESC LIMIT 1) AS last ON TRUE",
+            [until],
+        )
+        return cursor.rowcount
+
+
+def rebuild(until: date | None = None) -> int:
+    """Recompute all snapshots from the rollup; returns the number of snapshots.
+
+    Balances of detached partitions are lost, as they are no longer in the rollup.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {ROLLUP} IN SHARE MODE")
+        cursor.execute(f"TRUNCATE {SNAPSHOTS}")
+        # Running balances of the cached list responses change
+        versions.bump_on_commit(versions.CASH_FLOWS)
+        return take(until)
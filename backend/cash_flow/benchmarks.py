@@ -0,0 +1,310 @@
+import json
+import re
+import statistics
+import time
+from collections.abc import Callable, Iterator, Mapping
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlencode
+
+from django.db.models import Max, Sum
+from django.http import HttpResponse
+from django.test import Client
+
+from .filters import SEARCH_RANK
+from .generator import WORDS
+from .models import CashFlowRollup, Subcategory
+from .views import CashFlowViewSet
+
+# Benchmark suite of the API: every filter of the cash flow list with every
+# ordering, the dictionary endpoints and the writes. Requests go through the
+# in-process test client, so the numbers cover middleware, view, SQL and
+# rendering but no network. The query count of a request is the one the
+# PerformanceMiddleware reports in the Server-Timing header.
+#
+# Filter values are derived from the data (the busiest status, category, ...)
+# so the suite runs against any dataset; for comparable numbers use the same
+# generate_cash_flows options on every run.
+
+HOST = "localhost"
+LIST_PATH = "/api/cash_flows/"
+BULK_PATH = "/api/cash_flows/bulk/"
+BULK_SIZE = 100
+PAGE_SIZE = 50
+_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+@dataclass(frozen=True)
+class Case:
+    """One benchmarked request.
+
+    ``path`` and ``body`` may be callables, evaluated (unmeasured) before each
+    request; ``done`` is called with each response.
+    """
+
+    name: str
+    method: str
+    path: str | Callable[[], str]
+    body: Any = None
+    done: Callable[[HttpResponse], None] | None = None
+
+
+@dataclass
+class Result:
+    """Latency percentiles (ms) and the largest query count of a case"""
+
+    requests: int
+    errors: int
+    queries: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @classmethod
+    def from_samples(cls, latencies: list[float], queries: list[int], errors: int) -> "Result":
+        """Summarize the measured requests"""
+        if len(latencies) > 1:
+            cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = latencies[0]
+        return cls(
+            requests=len(latencies),
+            errors=errors,
+            queries=max(queries, default=0),
+            p50_ms=round(p50 * 1000, 2),
+            p95_ms=round(p95 * 1000, 2),
+            p99_ms=round(p99 * 1000, 2),
+        )
+
+
+@dataclass
+class Baseline:
+    """Stored results of an earlier run and the size of its dataset"""
+
+    rows: int
+    results: dict[str, Result] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "Baseline":
+        """Read a baseline written by ``save``"""
+        data = json.loads(path.read_text())
+        return cls(
+            rows=data["rows"],
+            results={name: Result(**result) for name, result in data["results"].items()},
+        )
+
+    def save(self, path: Path) -> None:
+        """Write the baseline as JSON"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "rows": self.rows,
+            "results": {name: asdict(result) for name, result in self.results.items()},
+        }
+        path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+    def regressions(
+        self, results: Mapping[str, Result], tolerance: float, min_delta_ms: float
+    ) -> list[str]:
+        """Describe every result that is worse than the baseline.
+
+        A percentile regresses when it exceeds the baseline by more than
+        ``tolerance`` (a fraction) and by more than ``min_delta_ms``; any extra
+        query or error is a regression.
+        """
+        found = []
+        for name, result in results.items():
+            base = self.results.get(name)
+            if base is None:
+                continue
+            if result.queries > base.queries:
+                found.append(f"{name}: {result.queries} queries, baseline {base.queries}")
+            if result.errors > base.errors:
+                found.append(f"{name}: {result.errors} errors, baseline {base.errors}")
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                value, expected = getattr(result, metric), getattr(base, metric)
+                if value > expected * (1 + tolerance) and value - expected > min_delta_ms:
+                    found.append(f"{name}: {metric} {value}, baseline {expected}")
+        return found
+
+
+class Rows:
+    """Cash flows written by the benchmark; ``remove`` deletes them again"""
+
+    def __init__(self, client: Client, item: dict[str, Any]) -> None:
+        """Write rows like ``item`` through ``client``"""
+        self.client = client
+        self.item = item
+        self.ids: list[int] = []
+
+    def created(self, response: HttpResponse) -> None:
+        """Keep the row of a single create"""
+        if response.status_code == HTTPStatus.CREATED:
+            self.ids.append(response.json()["id"])
+
+    def bulk_created(self, response: HttpResponse) -> None:
+        """Keep the rows of a bulk create"""
+        if response.status_code == HTTPStatus.CREATED:
+            self.ids.extend(response.json()["ids"])
+
+    def any(self) -> int:
+        """Return the id of a written row"""
+        self.ensure(1)
+        return self.ids[-1]
+
+    def take(self, count: int) -> list[int]:
+        """Hand out ``count`` written rows, e.g. to be deleted"""
+        self.ensure(count)
+        taken, self.ids = self.ids[-count:], self.ids[:-count]
+        return taken
+
+    def ensure(self, count: int) -> None:
+        """Write rows until at least ``count`` are at hand"""
+        while len(self.ids) < count:
+            items = [self.item] * min(count - len(self.ids), BULK_SIZE)
+            self.bulk_created(self.client.post(BULK_PATH, {"items": items}, "application/json"))
+
+    def remove(self) -> None:
+        """Delete every written row that is still at hand"""
+        while self.ids:
+            ids = self.take(min(len(self.ids), BULK_SIZE))
+            self.client.delete(BULK_PATH, {"ids": ids}, "application/json")
+
+
+class Suite:
+    """The benchmark cases of the current dataset and their runner"""
+
+    def __init__(self, requests: int, warmup: int) -> None:
+        """Measure ``requests`` requests per case after ``warmup`` unmeasured ones"""
+        self.requests = requests
+        self.warmup = warmup
+        self.client = Client(HTTP_HOST=HOST)
+        self.filters = self.list_filters()
+
+    @staticmethod
+    def dataset_rows() -> int:
+        """Return the number of cash flows, from the rollup"""
+        return CashFlowRollup.objects.aggregate(rows=Sum("count"))["rows"] or 0
+
+    def run(self, selected: Callable[[str], bool]) -> Iterator[tuple[str, Result]]:
+        """Measure the selected cases one after the other.
+
+        The rows the write cases leave behind are deleted at the end, so the
+        dataset stays as it was (apart from the delta sync tombstones).
+        """
+        rows = self.rows()
+        try:
+            for case in [*self.read_cases(), *self.write_cases(rows)]:
+                if selected(case.name):
+                    yield case.name, self.measure(case)
+        finally:
+            if rows is not None:
+                rows.remove()
+
+    def read_cases(self) -> list[Case]:
+        """Return the dictionary endpoints and every filter of the list with every ordering"""
+        cases = [
+            Case(f"dictionaries {name}", "GET", f"/api/{name}/")
+            for name in ("statuses", "cash_flow_types", "categories", "subcategories")
+        ]
+        cases.append(Case("dictionaries tree", "GET", "/api/dictionaries/"))
+        orderings = [
+            prefix + name
+            for name in CashFlowViewSet.ordering_fields
+            if name != SEARCH_RANK
+            for prefix in ("", "-")
+        ]
+        for filter_name, params in self.filters.items():
+            for ordering in orderings:
+                query = urlencode({"page_size": PAGE_SIZE, "ordering": ordering, **params})
+                cases.append(Case(f"list {filter_name} {ordering}", "GET", f"{LIST_PATH}?{query}"))
+        return cases
+
+    def write_cases(self, rows: Rows | None) -> list[Case]:
+        """Return the single and bulk creates, updates and deletes"""
+        if rows is None:
+            return []
+        return [
+            Case("write create", "POST", LIST_PATH, rows.item, rows.created),
+            Case(
+                "write update",
+                "PATCH",
+                lambda: f"{LIST_PATH}{rows.any()}/",
+                {"amount": "200.00"},
+            ),
+            Case("write delete", "DELETE", lambda: f"{LIST_PATH}{rows.take(1)[0]}/"),
+            Case(
+                "write bulk create",
+                "POST",
+                BULK_PATH,
+                {"items": [rows.item] * BULK_SIZE},
+                rows.bulk_created,
+            ),
+            Case("write bulk delete", "DELETE", BULK_PATH, lambda: {"ids": rows.take(BULK_SIZE)}),
+        ]
+
+    def list_filters(self) -> dict[str, dict[str, str]]:
+        """Return the parameters of each ``CashFlowFilter`` filter, with the busiest values"""
+        filters: dict[str, dict[str, str]] = {"unfiltered": {}}
+        for name in ("status", "cash_flow_type", "category", "subcategory"):
+            busiest = (
+                CashFlowRollup.objects.values(name)
+                .annotate(rows=Sum("count"))
+                .order_by("-rows", name)
+                .first()
+            )
+            if busiest is not None:
+                filters[name] = {name: str(busiest[name])}
+        last_day = CashFlowRollup.objects.aggregate(day=Max("day"))["day"]
+        if last_day is not None:
+            month_ago = last_day - timedelta(days=30)
+            filters["created_at"] = {
+                "created_at_after": month_ago.isoformat(),
+                "created_at_before": last_day.isoformat(),
+            }
+            filters["updated_since"] = {"updated_since": f"{month_ago.isoformat()}T00:00:00Z"}
+        filters["search"] = {"search": WORDS[0]}
+        return filters
+
+    def rows(self) -> Rows | None:
+        """Return a pool of written rows in the busiest status and subcategory"""
+        if "status" not in self.filters or "subcategory" not in self.filters:
+            return None
+        subcategory = Subcategory.objects.select_related("category").get(
+            pk=self.filters["subcategory"]["subcategory"]
+        )
+        item = {
+            "status": int(self.filters["status"]["status"]),
+            "cash_flow_type": subcategory.category.cash_flow_type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "100.00",
+            "comment": "benchmark",
+        }
+        return Rows(self.client, item)
+
+    def measure(self, case: Case) -> Result:
+        """Send the warm-up and the measured requests of ``case``"""
+        latencies: list[float] = []
+        queries: list[int] = []
+        errors = 0
+        send = getattr(self.client, case.method.lower())
+        for iteration in range(-self.warmup, self.requests):
+            path = case.path() if callable(case.path) else case.path
+            body = case.body() if callable(case.body) else case.body
+            args = (path,) if body is None else (path, body, "application/json")
+            started = time.perf_counter()
+            response = send(*args)
+            elapsed = time.perf_counter() - started
+            if case.done is not None:
+                case.done(response)
+            if iteration < 0:
+                continue
+            latencies.append(elapsed)
+            match = _QUERIES.search(response.get("Server-Timing", ""))
+            queries.append(int(match.group(1)) if match else 0)
+            errors += response.status_code >= HTTPStatus.BAD_REQUEST
+        return Result.from_samples(latencies, queries, errors)
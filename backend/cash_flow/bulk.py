@@ -0,0 +1,191 @@
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.db import models, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import dictionaries, events, rollup, versions
+from .models import CashFlow, CashFlowTombstone, CashFlowType, Category, Status, Subcategory
+from .serializers import CashFlowBulkItemSerializer, hierarchy_error
+
+DICTIONARIES: dict[str, type[models.Model]] = {
+    "status": Status,
+    "cash_flow_type": CashFlowType,
+    "category": Category,
+    "subcategory": Subcategory,
+}
+VALUE_FIELDS = ("amount", "comment")
+DOES_NOT_EXIST = 'Invalid pk "{pk}" - object does not exist.'
+
+
+@dataclass
+class BulkResult:
+    """Ids of the written rows and errors of the rejected ones, by request index"""
+
+    ids: list[int] = field(default_factory=list)
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+    def reject(self, index: int, errors: Any) -> None:  # noqa: ANN401
+        """Record the errors of one request row"""
+        self.errors.append({"index": index, "errors": errors})
+
+
+def create(items: Sequence[Mapping[str, Any]], *, atomic: bool, batch_size: int) -> BulkResult:
+    """Validate all rows set-wise and insert the valid ones with ``bulk_create``.
+
+    In atomic mode nothing is written when any row is rejected.
+    """
+    result = BulkResult()
+    valid = _validate(items, result)
+    if atomic and result.errors:
+        return result
+
+    objs = [CashFlow(**_model_values(values)) for values in valid]
+    with transaction.atomic():
+        CashFlow.objects.bulk_create(objs, batch_size=batch_size)
+        rollup.apply_deltas(rollup.collect_deltas(added=map(rollup.instance_row, objs)))
+        events.cash_flows_saved(objs, created=True)
+        versions.bump_on_commit(versions.CASH_FLOWS)
+    result.ids = [obj.pk for obj in objs]
+    return result
+
+
+def update(items: Sequence[Mapping[str, Any]], *, atomic: bool, batch_size: int) -> BulkResult:
+    """Update rows by id with ``bulk_update``; submitted fields are merged into
+    the stored row before the hierarchy is checked"""
+    result = BulkResult()
+    with transaction.atomic():
+        existing = CashFlow.objects.select_for_update().in_bulk(_submitted_ids(items))
+        valid = _validate(items, result, existing)
+        if atomic and result.errors:
+            return result
+
+        objs = [existing[values["id"]] for values in valid]
+        previous = [rollup.instance_row(obj) for obj in objs]
+        now = timezone.now()
+        for obj, values in zip(objs, valid, strict=True):
+            for name, value in _model_values(values).items():
+                setattr(obj, name, value)
+            obj.updated_at = now
+        CashFlow.objects.bulk_update(
+            objs, [*DICTIONARIES, *VALUE_FIELDS, "updated_at"], batch_size=batch_size
+        )
+        rollup.apply_deltas(
+            rollup.collect_deltas(added=map(rollup.instance_row, objs), removed=previous)
+        )
+        events.cash_flows_saved(objs, created=False)
+        versions.bump_on_commit(versions.CASH_FLOWS)
+    result.ids = [obj.pk for obj in objs]
+    return result
+
+
+def delete(ids: Sequence[int], *, atomic: bool) -> BulkResult:
+    """Delete rows by id; unknown ids are reported per request index"""
+    result = BulkResult()
+    with transaction.atomic():
+        rows = {
+            row["id"]: row
+            for row in CashFlow.objects.select_for_update()
+            .filter(pk__in=ids)
+            .values("id", *rollup.ROW_FIELDS)
+        }
+        for index, pk in enumerate(ids):
+            if pk not in rows:
+                result.reject(index, {"id": [DOES_NOT_EXIST.format(pk=pk)]})
+        if atomic and result.errors:
+            return result
+
+        with rollup.deferred():
+            CashFlow.objects.filter(pk__in=rows).delete()
+        rollup.apply_deltas(rollup.collect_deltas(removed=rows.values()))
+        CashFlowTombstone.objects.bulk_create(CashFlowTombstone(cash_flow_id=pk) for pk in rows)
+        events.cash_flows_deleted(rows)
+        versions.bump_on_commit(versions.CASH_FLOWS)
+    result.ids = list(dict.fromkeys(pk for pk in ids if pk in rows))
+    return result
+
+
+def _submitted_ids(items: Sequence[Mapping[str, Any]]) -> list[int]:
+    # The ids of an update converted like the serializer converts them, so "5"
+    # finds row 5; ids it rejects are reported by the validation
+    id_field = CashFlowBulkItemSerializer().fields["id"]
+    ids = []
+    for item in items:
+        if isinstance(item, Mapping) and "id" in item:
+            try:
+                ids.append(id_field.to_internal_value(item["id"]))
+            except serializers.ValidationError:
+                continue
+    return ids
+
+
+def _validate(
+    items: Sequence[Mapping[str, Any]],
+    result: BulkResult,
+    existing: Mapping[int, CashFlow] | None = None,
+) -> list[dict[str, Any]]:
+    """Field-level validation per row, then dictionary existence and hierarchy
+    checks against the cached dictionary snapshot.
+
+    ``existing`` holds the stored rows of an update and is ``None`` for a create.
+    """
+    partial = existing is not None
+    rows: list[tuple[int, dict[str, Any]]] = []
+    seen: set[int] = set()
+    for index, item in enumerate(items):
+        serializer = CashFlowBulkItemSerializer(data=item, partial=partial)
+        if not serializer.is_valid():
+            result.reject(index, serializer.errors)
+            continue
+        values = dict(serializer.validated_data)
+        if partial:
+            pk = values.get("id")
+            if pk is None:
+                result.reject(index, {"id": ["This field is required."]})
+                continue
+            if pk in seen or pk not in existing:
+                message = "Duplicate id." if pk in seen else DOES_NOT_EXIST.format(pk=pk)
+                result.reject(index, {"id": [message]})
+                continue
+            seen.add(pk)
+            values = _stored_values(existing[pk]) | values
+        rows.append((index, values))
+
+    snapshot = dictionaries.get()
+    known = {name: snapshot.for_model(model) for name, model in DICTIONARIES.items()}
+    if any(values[name] not in known[name] for _, values in rows for name in DICTIONARIES):
+        # Rows created by another worker since the last check of the snapshot
+        snapshot = dictionaries.get(fresh=True)
+        known = {name: snapshot.for_model(model) for name, model in DICTIONARIES.items()}
+    valid = []
+    for index, values in rows:
+        errors = {
+            name: [DOES_NOT_EXIST.format(pk=values[name])]
+            for name in DICTIONARIES
+            if values[name] not in known[name]
+        } or hierarchy_error(
+            known["cash_flow_type"][values["cash_flow_type"]],
+            known["category"][values["category"]],
+            known["subcategory"][values["subcategory"]],
+        )
+        if errors:
+            result.reject(index, errors)
+        else:
+            valid.append(values)
+    return valid
+
+
+def _stored_values(obj: CashFlow) -> dict[str, Any]:
+    return {
+        **{name: getattr(obj, f"{name}_id") for name in DICTIONARIES},
+        **{name: getattr(obj, name) for name in VALUE_FIELDS},
+    }
+
+
+def _model_values(values: Mapping[str, Any]) -> dict[str, Any]:
+    return {
+        **{f"{name}_id": values[name] for name in DICTIONARIES},
+        **{name: values[name] for name in VALUE_FIELDS if name in values},
+    }
@@ -0,0 +1,152 @@
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+
+from . import versions
+from .models import CashFlowType, Category, Status, Subcategory
+
+
+@dataclass(frozen=True)
+class DictionarySnapshot:
+    """All dictionary rows at one version, ordered by name, with parent links resolved"""
+
+    version: int
+    statuses: dict[int, Status]
+    cash_flow_types: dict[int, CashFlowType]
+    categories: dict[int, Category]
+    subcategories: dict[int, Subcategory]
+
+    def for_model(self, model: type[models.Model]) -> dict[int, models.Model]:
+        """Rows of one dictionary model by id"""
+        return {
+            Status: self.statuses,
+            CashFlowType: self.cash_flow_types,
+            Category: self.categories,
+            Subcategory: self.subcategories,
+        }[model]
+
+    @cached_property
+    def tree(self) -> dict[str, Any]:
+        """Statuses and the type → category → subcategory hierarchy, ordered by name"""
+        subcategories: dict[int, list[dict[str, Any]]] = {}
+        for obj in self.subcategories.values():
+            subcategories.setdefault(obj.category_id, []).append({"id": obj.pk, "name": obj.name})
+        categories: dict[int, list[dict[str, Any]]] = {}
+        for obj in self.categories.values():
+            categories.setdefault(obj.cash_flow_type_id, []).append(
+                {"id": obj.pk, "name": obj.name, "subcategories": subcategories.get(obj.pk, [])}
+            )
+        return {
+            "version": self.version,
+            "statuses": [{"id": obj.pk, "name": obj.name} for obj in self.statuses.values()],
+            "cash_flow_types": [
+                {
+                    "id": obj.pk,
+                    "name": obj.name,
+                    "sign": obj.sign,
+                    "categories": categories.get(obj.pk, []),
+                }
+                for obj in self.cash_flow_types.values()
+            ],
+        }
+
+
+class DictionaryCache:
+    """Process-local cache of the dictionary hierarchy.
+
+    The cached snapshot is checked against the ``dictionaries`` data version at most
+    once per ``check_interval`` seconds, so every worker reloads shortly after a
+    dictionary change committed by any other worker. Changes made in this process
+    invalidate the cache on commit.
+
+    The version and the rows are read from the primary: a snapshot filled from a
+    lagging replica would be served by the whole process until the next change.
+    """
+
+    def __init__(self, check_interval: float) -> None:
+        """Start empty; the first ``get`` loads the snapshot"""
+        self.check_interval = check_interval
+        self._snapshot: DictionarySnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, *, fresh: bool = False) -> DictionarySnapshot:
+        """Return the current snapshot, reloading it when the data version moved;
+        ``fresh`` checks the version now instead of once per ``check_interval``"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if not fresh and snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        version = versions.get(versions.DICTIONARIES, using=DEFAULT_DB_ALIAS)
+        if snapshot is None or snapshot.version != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._snapshot = _load(version)
+        self._checked_at = now
+        return snapshot
+
+    async def aget(self) -> DictionarySnapshot:
+        """Async ``get``: a fresh snapshot is returned without leaving the event loop"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        return await sync_to_async(self.get)()
+
+    def invalidate(self) -> None:
+        """Drop the snapshot; the next ``get`` reloads it"""
+        self._snapshot = None
+
+
+cache = DictionaryCache(settings.DICTIONARY_CACHE_CHECK_INTERVAL)
+
+
+def get(*, fresh: bool = False) -> DictionarySnapshot:
+    """Return the current dictionary snapshot of this process; ``fresh`` checks
+    the version now, e.g. before rejecting an id missing from the snapshot"""
+    return cache.get(fresh=fresh)
+
+
+async def aget() -> DictionarySnapshot:
+    """Async variant of ``get``"""
+    return await cache.aget()
+
+
+def changed() -> None:
+    """Record a dictionary change: bump the shared version in the current
+    transaction and drop the local snapshot once it commits"""
+    versions.bump(versions.DICTIONARIES)
+    transaction.on_commit(cache.invalidate)
+
+
+def _load(version: int) -> DictionarySnapshot:
+    # The version is read before the rows, so a concurrent change can only make
+    # the snapshot newer than its version, never older; the next check reloads it.
+    cash_flow_types = _by_pk(CashFlowType)
+    categories = _by_pk(Category)
+    for category in categories.values():
+        if category.cash_flow_type_id in cash_flow_types:
+            category.cash_flow_type = cash_flow_types[category.cash_flow_type_id]
+    subcategories = _by_pk(Subcategory)
+    for subcategory in subcategories.values():
+        if subcategory.category_id in categories:
+            subcategory.category = categories[subcategory.category_id]
+    return DictionarySnapshot(
+        version=version,
+        statuses=_by_pk(Status),
+        cash_flow_types=cash_flow_types,
+        categories=categories,
+        subcategories=subcategories,
+    )
+
+
+def _by_pk(model: type[models.Model]) -> dict[int, Any]:
+    # All rows ordered by name, read from the primary
+    return {obj.pk: obj for obj in model.objects.using(DEFAULT_DB_ALIAS).order_by("name")}
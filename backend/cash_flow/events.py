@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Iterable
+from decimal import Decimal
+from typing import Any
+
+import orjson
+import psycopg
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+from . import dictionaries
+from .models import CashFlow
+from .serializers import cash_flow_representation
+
+logger = logging.getLogger("cash_flow.events")
+
+# Writers publish change events with pg_notify() in their own transaction, so
+# PostgreSQL delivers them to the listeners only when (and if) the write commits.
+# Every worker process keeps one LISTEN connection and fans the events out to
+# its connected clients (see EventHub); the clients patch what they display.
+#
+# Events are JSON objects with a "model" ("cash_flow" or "dictionaries") and an
+# "action". Cash flow events carry the "ids" and, when they fit into a NOTIFY
+# payload, the "rows" in the list representation. An "action": "changed" event
+# without ids tells the clients to reload, e.g. after an import.
+
+CHANNEL = "cash_flow_events"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD = 7999
+CASH_FLOW = "cash_flow"
+DICTIONARIES = "dictionaries"
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+CHANGED = "changed"
+# Sent by the hub itself when a client may have missed events
+RESYNC = orjson.dumps({"model": CASH_FLOW, "action": CHANGED}).decode()
+CENT = Decimal("0.01")
+
+
+def publish(event: dict[str, Any]) -> None:
+    """Queue ``event`` for the listeners; it is delivered when the current
+    transaction commits"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, _payload(event)])
+
+
+def cash_flows_saved(objs: Iterable[CashFlow], *, created: bool) -> None:
+    """Publish created or updated cash flows with their list representation"""
+    rows = [instance_representation(obj) for obj in objs]
+    if rows:
+        publish(
+            {
+                "model": CASH_FLOW,
+                "action": CREATED if created else UPDATED,
+                "ids": [row["id"] for row in rows],
+                "rows": rows,
+            }
+        )
+
+
+def cash_flows_deleted(ids: Iterable[int]) -> None:
+    """Publish deleted cash flow ids"""
+    if ids := list(ids):
+        publish({"model": CASH_FLOW, "action": DELETED, "ids": ids})
+
+
+def cash_flows_changed() -> None:
+    """Publish that cash flows changed in bulk, so clients reload what they show"""
+    publish({"model": CASH_FLOW, "action": CHANGED})
+
+
+def dictionaries_changed() -> None:
+    """Publish a dictionary change, so clients reload the dictionary tree"""
+    publish({"model": DICTIONARIES, "action": CHANGED})
+
+
+def instance_representation(obj: CashFlow) -> dict[str, Any]:
+    """List representation of a saved instance with the names from the
+    dictionary cache, without touching the related rows"""
+    snapshot = dictionaries.get()
+    names = {
+        "cash_flow_type_name": snapshot.cash_flow_types.get(obj.cash_flow_type_id),
+        "category_name": snapshot.categories.get(obj.category_id),
+        "subcategory_name": snapshot.subcategories.get(obj.subcategory_id),
+        "status_name": snapshot.statuses.get(obj.status_id),
+    }
+    return cash_flow_representation(
+        {
+            "id": obj.pk,
+            "status_id": obj.status_id,
+            "cash_flow_type_id": obj.cash_flow_type_id,
+            "category_id": obj.category_id,
+            "subcategory_id": obj.subcategory_id,
+            # As read back from the minor units column
+            "amount": Decimal(obj.amount).quantize(CENT),
+            "created_at": obj.created_at,
+            "updated_at": obj.updated_at,
+            "comment": obj.comment,
+        }
+        | {name: item.name if item is not None else "" for name, item in names.items()}
+    )
+
+
+def _payload(event: dict[str, Any]) -> str:
+    payload = orjson.dumps(event)
+    if len(payload) > MAX_PAYLOAD and "rows" in event:
+        # Clients fetch the rows they display by id
+        event = {key: value for key, value in event.items() if key != "rows"}
+        payload = orjson.dumps(event)
+    if len(payload) > MAX_PAYLOAD:
+        payload = orjson.dumps({"model": event["model"], "action": CHANGED})
+    return payload.decode()
+
+
+class EventHub:
+    """Fan-out of the change events to the clients of this worker process.
+
+    One LISTEN connection is opened with the first subscriber and closed with
+    the last one; it is reopened after connection errors. Every subscriber gets
+    a bounded queue of JSON payloads. A subscriber that falls behind, or that
+    may have missed events while the connection was down, gets its queue
+    replaced by a single ``RESYNC`` event.
+    """
+
+    def __init__(self, queue_size: int, retry_seconds: float) -> None:
+        """Start without subscribers or connection"""
+        self.queue_size = queue_size
+        self.retry_seconds = retry_seconds
+        self._subscribers: set[asyncio.Queue[str]] = set()
+        self._task: asyncio.Task[None] | None = None
+
+    def subscribe(self) -> asyncio.Queue[str]:
+        """Register a new subscriber queue, connecting the listener if needed"""
+        queue: asyncio.Queue[str] = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[str]) -> None:
+        """Drop a subscriber queue; the last one closes the listener"""
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def broadcast(self, payload: str) -> None:
+        """Put one payload into the queue of every subscriber"""
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                _replace(queue, RESYNC)
+
+    async def _listen(self) -> None:
+        params = connections[DEFAULT_DB_ALIAS].get_connection_params()
+        # Django's sync cursor factory and adapters are of no use here
+        params.pop("cursor_factory", None)
+        params.pop("context", None)
+        reconnecting = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(**params, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    if reconnecting:
+                        self.broadcast(RESYNC)
+                    async for notify in conn.notifies():
+                        self.broadcast(notify.payload)
+            except psycopg.Error:
+                logger.warning("Event listener connection failed", exc_info=True)
+            reconnecting = True
+            await asyncio.sleep(self.retry_seconds)
+
+
+def _replace(queue: asyncio.Queue[str], payload: str) -> None:
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+hub = EventHub(settings.CASH_FLOW_EVENTS_QUEUE_SIZE, settings.CASH_FLOW_EVENTS_RETRY_SECONDS)
+
+
+async def stream() -> AsyncIterator[bytes]:
+    """Server-sent events of this worker's hub, with a comment line every
+    ``CASH_FLOW_EVENTS_KEEPALIVE`` seconds to keep idle proxies from closing it"""
+    queue = hub.subscribe()
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), settings.CASH_FLOW_EVENTS_KEEPALIVE)
+            except TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield f"data: {payload}\n\n".encode()
+    finally:
+        hub.unsubscribe(queue)
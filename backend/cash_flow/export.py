@@ -0,0 +1,184 @@
+import csv
+import json
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+from itertools import islice
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import QuerySet
+
+from . import dictionaries
+from .models import CashFlow
+from .serializers import format_datetime
+
+# Same columns, in the same order, as CashFlowSerializer
+FIELDS = (
+    "id",
+    "status",
+    "cash_flow_type",
+    "cash_flow_type_name",
+    "category",
+    "category_name",
+    "subcategory",
+    "subcategory_name",
+    "amount",
+    "created_at",
+    "updated_at",
+    "comment",
+    "status_name",
+)
+COLUMNS = (
+    "id",
+    "status_id",
+    "cash_flow_type_id",
+    "category_id",
+    "subcategory_id",
+    "amount",
+    "created_at",
+    "updated_at",
+    "comment",
+)
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+CHUNK_BYTES = 64 * 1024
+JSON_OPTIONS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+class _Line:
+    """File-like sink for ``csv.writer`` that keeps only the last written line"""
+
+    value = ""
+
+    def write(self, value: str) -> None:
+        self.value = value
+
+
+class ExportEncoder:
+    """Encode value rows as CSV or NDJSON chunks of about ``CHUNK_BYTES``,
+    optionally gzip-compressed.
+
+    Dictionary names are taken from the dictionary cache, so the exported
+    queryset needs no joins.
+    """
+
+    def __init__(self, output: str, *, compress: bool) -> None:
+        """Prepare an encoder for ``output`` (``csv`` or ``ndjson``).
+
+        Must be created in synchronous code: it reads the dictionary snapshot.
+        """
+        self.output = output
+        self.compress = compress
+        self.snapshot = dictionaries.get()
+        self._compressor = zlib.compressobj(wbits=31) if compress else None
+        self._buffer: list[str] = []
+        self._size = 0
+        self._line = _Line()
+        self._csv = csv.writer(self._line)
+
+    @property
+    def filename(self) -> str:
+        """Name of the exported file"""
+        return f"cash_flows.{self.output}" + (".gz" if self.compress else "")
+
+    @property
+    def content_type(self) -> str:
+        """Content type of the exported file"""
+        return "application/gzip" if self.compress else CONTENT_TYPES[self.output]
+
+    def header(self) -> bytes | None:
+        """Return the CSV header row; NDJSON has none"""
+        if self.output != "csv":
+            return None
+        self._csv.writerow(FIELDS)
+        return self._pack([self._line.value])
+
+    def encode(self, row: Sequence[Any]) -> bytes | None:
+        """Buffer one row; return a chunk once enough data has accumulated"""
+        record = self._record(row)
+        if self.output == "csv":
+            self._csv.writerow(record)
+            line = self._line.value
+        else:
+            line = json.dumps(dict(zip(FIELDS, record, strict=True)), **JSON_OPTIONS) + "\n"
+        self._buffer.append(line)
+        self._size += len(line)
+        if self._size < CHUNK_BYTES:
+            return None
+        return self._flush()
+
+    def finish(self) -> bytes | None:
+        """Return the remaining buffered data"""
+        chunk = self._flush() or b""
+        if self._compressor is not None:
+            chunk += self._compressor.flush()
+        return chunk or None
+
+    def _flush(self) -> bytes | None:
+        lines, self._buffer, self._size = self._buffer, [], 0
+        return self._pack(lines) if lines else None
+
+    def _pack(self, lines: list[str]) -> bytes:
+        data = "".join(lines).encode()
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        return data
+
+    def _record(self, row: Sequence[Any]) -> tuple[Any, ...]:
+        pk, status, cash_flow_type, category, subcategory, amount, created, updated, comment = row
+        snapshot = self.snapshot
+        return (
+            pk,
+            status,
+            cash_flow_type,
+            _name(snapshot.cash_flow_types, cash_flow_type),
+            category,
+            _name(snapshot.categories, category),
+            subcategory,
+            _name(snapshot.subcategories, subcategory),
+            str(amount),
+            format_datetime(created),
+            format_datetime(updated),
+            comment,
+            _name(snapshot.statuses, status),
+        )
+
+
+def stream(queryset: QuerySet[CashFlow], encoder: ExportEncoder) -> Iterator[bytes]:
+    """Stream the queryset through a server-side cursor"""
+    if header := encoder.header():
+        yield header
+    rows = queryset.values_list(*COLUMNS).iterator(chunk_size=settings.CASH_FLOW_EXPORT_CHUNK_SIZE)
+    for row in rows:
+        if chunk := encoder.encode(row):
+            yield chunk
+    if chunk := encoder.finish():
+        yield chunk
+
+
+async def astream(queryset: QuerySet[CashFlow], encoder: ExportEncoder) -> AsyncIterator[bytes]:
+    """Stream the queryset through a server-side cursor without blocking the event loop.
+
+    ASGI servers consume synchronous streaming responses by buffering them whole,
+    so under ASGI the export must be an async iterator. Each cursor chunk is
+    fetched in one hop to the request's sync thread.
+    """
+    chunk_size = settings.CASH_FLOW_EXPORT_CHUNK_SIZE
+    rows = queryset.values_list(*COLUMNS).iterator(chunk_size=chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    if header := encoder.header():
+        yield header
+    while batch := await fetch():
+        for row in batch:
+            if chunk := encoder.encode(row):
+                yield chunk
+    if chunk := encoder.finish():
+        yield chunk
+
+
+def _name(rows: dict[int, Any], pk: int) -> str:
+    obj = rows.get(pk)
+    return obj.name if obj is not None else ""
@@ -1,11 +1,122 @@
-from django_filters.rest_framework import DateFromToRangeFilter, FilterSet
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q, QuerySet
+from django_filters.rest_framework import (
+    CharFilter,
+    DateFromToRangeFilter,
+    FilterSet,
+    IsoDateTimeFilter,
+    NumberFilter,
+)
+from rest_framework.filters import OrderingFilter
+from rest_framework.request import Request
+from rest_framework.views import APIView
 
-from .models import CashFlow
+from .models import SEARCH_CONFIGS, CashFlow, CashFlowRollup
+
+SEARCH_RANK = "search_rank"
+TIEBREAKER = "id"
+# Public orderings by dictionary name and the CashFlow columns that serve them
+SORT_KEYS = {
+    "status__name": "status_name",
+    "cash_flow_type__name": "cash_flow_type_name",
+    "category__name": "category_name",
+    "subcategory__name": "subcategory_name",
+}
 
 
 class CashFlowFilter(FilterSet):
+    # Compared against the bare column (BETWEEN/>=/<=), so PostgreSQL prunes the
+    # monthly partitions outside the range at plan time
     created_at = DateFromToRangeFilter()
+    search = CharFilter(method="filter_search", label="Search in comments")
+    updated_since = IsoDateTimeFilter(field_name="updated_at", lookup_expr="gte")
+    # Inclusive bounds in the API's decimal format, served by the (amount, id) index
+    amount_min = NumberFilter(field_name="amount", lookup_expr="gte", decimal_places=2)
+    amount_max = NumberFilter(field_name="amount", lookup_expr="lte", decimal_places=2)
 
     class Meta:
         model = CashFlow
+        fields = [
+            "status",
+            "cash_flow_type",
+            "subcategory",
+            "category",
+            "created_at",
+            "search",
+            "updated_since",
+            "amount_min",
+            "amount_max",
+        ]
+
+    def filter_search(self, queryset: QuerySet, name: str, value: str) -> QuerySet:  # noqa: ARG002
+        """Match comments by full-text query or, for typos and word fragments, by
+        trigram word similarity, and annotate the relevance as ``search_rank``.
+
+        Both conditions are served by the GIN indexes of the comment.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        query = SearchQuery(value, config=SEARCH_CONFIGS[0], search_type="websearch")
+        for config in SEARCH_CONFIGS[1:]:
+            query |= SearchQuery(value, config=config, search_type="websearch")
+        return queryset.filter(
+            Q(search_vector=query) | Q(comment__trigram_word_similar=value)
+        ).annotate(
+            **{
+                SEARCH_RANK: SearchRank(F("search_vector"), query)
+                + TrigramWordSimilarity(value, "comment")
+            }
+        )
+
+
+class CashFlowOrderingFilter(OrderingFilter):
+    """``OrderingFilter`` that ranks search results by relevance and sorts by
+    dictionary name through the denormalized name columns.
+
+    Without an explicit ``ordering`` a searched list is sorted by ``search_rank``
+    first; the rank is not a valid ordering when there is no search. Every
+    ordering ends with ``id``, in the direction of its last term, so pages are
+    stable and match the ``(key, id)`` indexes of ``CashFlow``.
+    """
+
+    def get_ordering(self, request: Request, queryset: QuerySet, view: APIView) -> list[str]:
+        """Put the relevance first when searching with the default ordering, sort
+        by the name columns and end with the tiebreaker"""
+        ordering = super().get_ordering(request, queryset, view)
+        if SEARCH_RANK in queryset.query.annotations and not request.query_params.get(
+            self.ordering_param
+        ):
+            ordering = [f"-{SEARCH_RANK}", *ordering]
+        ordering = [_sort_key(term) for term in ordering]
+        if ordering and TIEBREAKER not in {term.lstrip("-") for term in ordering}:
+            ordering.append(f"-{TIEBREAKER}" if ordering[-1].startswith("-") else TIEBREAKER)
+        return ordering
+
+    def remove_invalid_fields(
+        self,
+        queryset: QuerySet,
+        fields: list[str],
+        view: APIView,
+        request: Request,
+    ) -> list[str]:
+        """Drop ``search_rank`` unless the queryset is searched"""
+        fields = super().remove_invalid_fields(queryset, fields, view, request)
+        if SEARCH_RANK in queryset.query.annotations:
+            return fields
+        return [term for term in fields if term.lstrip("-") != SEARCH_RANK]
+
+
+class CashFlowRollupFilter(FilterSet):
+    """The parameters of ``CashFlowFilter`` applied to the daily rollup"""
+
+    created_at = DateFromToRangeFilter(field_name="day")
+
+    class Meta:
+        model = CashFlowRollup
         fields = ["status", "cash_flow_type", "subcategory", "category", "created_at"]
+
+
+def _sort_key(term: str) -> str:
+    field = term.lstrip("-")
+    return term.replace(field, SORT_KEYS[field]) if field in SORT_KEYS else term
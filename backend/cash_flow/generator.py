@@ -0,0 +1,241 @@
+import math
+import random
+import time
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import balance, dictionaries, events, partitions, rollup, versions
+from .models import (
+    MAX_AMOUNT,
+    BalanceSnapshot,
+    CashFlow,
+    CashFlowRollup,
+    CashFlowType,
+    Category,
+    Status,
+    Subcategory,
+)
+
+# Synthetic cash flows for load tests and benchmarks. Rows are drawn from a seeded
+# random generator, so the same options give the same dataset:
+# - statuses, categories and the subcategories of a category follow a Zipf-like
+#   distribution, a few of them hold most rows;
+# - created_at spreads over several years with a growing volume towards today;
+# - amounts are log-normal, incomes larger than expenses;
+# - part of the rows have a comment made of WORDS.
+# Rows are streamed with COPY straight into the partitioned table, one
+# transaction per batch; the rollup and the balance snapshots are rebuilt once
+# at the end instead of being maintained per row.
+
+WORDS = (
+    "аренда",
+    "офис",
+    "зарплата",
+    "налог",
+    "реклама",
+    "сервер",
+    "хостинг",
+    "поставщик",
+    "клиент",
+    "возврат",
+    "премия",
+    "консультация",
+    "invoice",
+    "subscription",
+    "cloud",
+    "license",
+    "marketing",
+    "payroll",
+    "refund",
+    "travel",
+)
+COLUMNS = (
+    "created_at",
+    "updated_at",
+    "status_id",
+    "cash_flow_type_id",
+    "category_id",
+    "subcategory_id",
+    "amount_minor",
+    "comment",
+)
+# Parameters of the log-normal amounts (of the amount in rubles) by type sign
+AMOUNT_DISTRIBUTION = {
+    CashFlowType.Sign.INCOME: (9.5, 1.3),
+    CashFlowType.Sign.EXPENSE: (8.0, 1.5),
+}
+
+type Leaf = tuple[int, int, int]  # cash flow type, category and subcategory ids
+
+
+@dataclass
+class GenerateReport:
+    """Number of generated rows and the time it took"""
+
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Generated rows per second"""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def ensure_dictionaries(categories: int, subcategories: int) -> None:
+    """Top up every cash flow type to ``categories`` categories and every category
+    to ``subcategories`` subcategories with generated names"""
+    with transaction.atomic():
+        new_categories = [
+            Category(name=f"Категория {cash_flow_type.pk}.{number}", cash_flow_type=cash_flow_type)
+            for cash_flow_type in CashFlowType.objects.annotate(size=Count("categories"))
+            for number in range(cash_flow_type.size + 1, categories + 1)
+        ]
+        Category.objects.bulk_create(new_categories, ignore_conflicts=True)
+        new_subcategories = [
+            Subcategory(name=f"Подкатегория {category.pk}.{number}", category=category)
+            for category in Category.objects.annotate(size=Count("subcategories"))
+            for number in range(category.size + 1, subcategories + 1)
+        ]
+        Subcategory.objects.bulk_create(new_subcategories, ignore_conflicts=True)
+        if new_categories or new_subcategories:
+            # bulk_create sends no signals
+            dictionaries.changed()
+            events.dictionaries_changed()
+
+
+def zipf_weights(size: int, skew: float) -> list[float]:
+    """Weights of ``size`` ranks, the ``n``-th one proportional to ``1 / n ** skew``"""
+    return [1 / rank**skew for rank in range(1, size + 1)]
+
+
+class CashFlowGenerator:
+    """Generate and load synthetic cash flows over the existing dictionaries"""
+
+    def __init__(
+        self,
+        *,
+        years: float = 3,
+        skew: float = 1.2,
+        comment_ratio: float = 0.6,
+        seed: int = 0,
+        until: datetime | None = None,
+    ) -> None:
+        """Configure the date spread, the skew and the share of rows with a comment"""
+        self.random = random.Random(seed)  # noqa: S311
+        self.until = until or timezone.now()
+        self.since = self.until - timedelta(days=365.25 * years)
+        self.comment_ratio = comment_ratio
+        self.statuses = list(Status.objects.order_by("pk").values_list("pk", flat=True))
+        self.status_weights = list(accumulate(zipf_weights(len(self.statuses), skew)))
+        self.leaves, self.leaf_weights = self._leaves(skew)
+        self.signs = dict(CashFlowType.objects.values_list("pk", "sign"))
+        if not self.statuses or not self.leaves:
+            error = "Statuses and subcategories are required to generate cash flows."
+            raise ValueError(error)
+
+    def run(self, rows: int, batch_size: int) -> GenerateReport:
+        """Load ``rows`` cash flows in batches of ``batch_size``, then rebuild the
+        rollup and the balance snapshots"""
+        report = GenerateReport()
+        started = time.monotonic()
+        self._create_partitions()
+        table = CashFlow._meta.db_table  # noqa: SLF001
+        while report.rows < rows:
+            size = min(batch_size, rows - report.rows)
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Losing the last batches on a crash is fine for synthetic data
+                cursor.execute("SET LOCAL synchronous_commit = off")
+                with cursor.cursor.copy(f"COPY {table} ({', '.join(COLUMNS)}) FROM STDIN") as copy:
+                    for row in self.rows(size):
+                        copy.write_row(row)
+            report.rows += size
+        with connection.cursor() as cursor:
+            # Fresh statistics, also for the row estimate of the list count
+            cursor.execute(f"ANALYZE {table}")
+        rollup.rebuild()
+        balance.rebuild()
+        events.cash_flows_changed()
+        report.seconds = time.monotonic() - started
+        return report
+
+    def rows(self, size: int) -> Iterator[tuple[Any, ...]]:
+        """Return ``size`` random rows of ``COLUMNS``"""
+        leaves = self.random.choices(self.leaves, cum_weights=self.leaf_weights, k=size)
+        statuses = self.random.choices(self.statuses, cum_weights=self.status_weights, k=size)
+        span = (self.until - self.since).total_seconds()
+        for (cash_flow_type, category, subcategory), status in zip(leaves, statuses, strict=True):
+            # The density grows linearly towards ``until``
+            created_at = self.since + timedelta(seconds=span * math.sqrt(self.random.random()))
+            mu, sigma = AMOUNT_DISTRIBUTION[self.signs[cash_flow_type]]
+            amount = min(max(self.random.lognormvariate(mu, sigma), 0.01), float(MAX_AMOUNT))
+            yield (
+                created_at,
+                created_at,
+                status,
+                cash_flow_type,
+                category,
+                subcategory,
+                round(amount * 100),
+                self._comment(),
+            )
+
+    def _comment(self) -> str:
+        if self.random.random() >= self.comment_ratio:
+            return ""
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(1, 5)))
+
+    def _leaves(self, skew: float) -> tuple[list[Leaf], list[float]]:
+        # A subcategory's weight is its category's weight split by the Zipf
+        # weights of the subcategories within the category
+        children: dict[int, list[int]] = {}
+        for pk, category in Subcategory.objects.order_by("pk").values_list("pk", "category"):
+            children.setdefault(category, []).append(pk)
+        categories = [
+            (pk, cash_flow_type)
+            for pk, cash_flow_type in Category.objects.order_by("pk").values_list(
+                "pk", "cash_flow_type"
+            )
+            if pk in children
+        ]
+        leaves: list[Leaf] = []
+        weights: list[float] = []
+        for (category, cash_flow_type), weight in zip(
+            categories, zipf_weights(len(categories), skew), strict=True
+        ):
+            shares = zipf_weights(len(children[category]), skew)
+            total = sum(shares)
+            for subcategory, share in zip(children[category], shares, strict=True):
+                leaves.append((cash_flow_type, category, subcategory))
+                weights.append(weight * share / total)
+        return leaves, list(accumulate(weights))
+
+    def _create_partitions(self) -> None:
+        existing = {partition.start for partition in partitions.partitions()}
+        start = partitions.month_start(timezone.localdate(self.since))
+        while start <= self.until:
+            if start not in existing:
+                partitions.create(start)
+            start = partitions.next_month(start)
+
+
+def truncate() -> None:
+    """Delete every cash flow with its rollup and balance snapshots.
+
+    No tombstones are left, so delta sync clients keep the deleted rows; meant
+    for benchmark databases only.
+    """
+    tables: Sequence[str] = [
+        model._meta.db_table  # noqa: SLF001
+        for model in (CashFlow, CashFlowRollup, BalanceSnapshot)
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(tables)}")
+        events.cash_flows_changed()
+        versions.bump_on_commit(versions.CASH_FLOWS)
@@ -0,0 +1,257 @@
+import csv
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import dictionaries, events, rollup, versions
+from .models import MAX_AMOUNT, CashFlow, Category, Subcategory, to_minor_units
+
+REQUIRED_COLUMNS = ("status", "cash_flow_type", "category", "subcategory", "amount")
+OPTIONAL_COLUMNS = ("created_at", "comment")
+STAGING_TABLE = "cash_flow_import_staging"
+STAGING_COLUMNS = (
+    "created_at",
+    "status_id",
+    "cash_flow_type_id",
+    "category_id",
+    "subcategory_id",
+    "amount_minor",
+    "comment",
+)
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file cannot be imported at all"""
+
+
+class RowError(ValueError):
+    """One line of the file is rejected"""
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import: counters, throughput and the first rejected lines"""
+
+    rows: int = 0
+    imported: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    rejects: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        """Processed lines per second"""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def reject(self, line: int, reason: str, max_rejects: int) -> None:
+        """Count a rejected line and keep its reason while under ``max_rejects``"""
+        self.rejected += 1
+        if len(self.rejects) < max_rejects:
+            self.rejects.append({"line": line, "error": reason})
+
+    def as_dict(self) -> dict[str, Any]:
+        """JSON-friendly representation"""
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "rejects": self.rejects,
+        }
+
+
+class CashFlowImporter:
+    """Load cash flows from CSV through PostgreSQL ``COPY``.
+
+    The file is read as a stream. Each line has dictionary names (not ids), which
+    are resolved against the dictionary cache; missing categories and subcategories
+    can be created on the fly. Valid lines are collected into batches that are
+    copied into a temporary staging table and inserted into ``CashFlow`` with one
+    ``INSERT ... SELECT``; each batch commits on its own.
+    """
+
+    def __init__(
+        self,
+        *,
+        create_missing: bool = False,
+        batch_size: int | None = None,
+        max_rejects: int = 1000,
+    ) -> None:
+        """Configure dictionary auto-creation, batch size and the number of kept rejects"""
+        self.create_missing = create_missing
+        self.batch_size = batch_size or settings.CASH_FLOW_IMPORT_BATCH_SIZE
+        self.max_rejects = max_rejects
+        snapshot = dictionaries.get()
+        self.statuses = {obj.name: obj.pk for obj in snapshot.statuses.values()}
+        self.cash_flow_types = {obj.name: obj.pk for obj in snapshot.cash_flow_types.values()}
+        self.categories = {
+            obj.name: (obj.pk, obj.cash_flow_type_id) for obj in snapshot.categories.values()
+        }
+        self.subcategories = {
+            obj.name: (obj.pk, obj.category_id) for obj in snapshot.subcategories.values()
+        }
+
+    def run(self, lines: Iterable[str]) -> ImportReport:
+        """Import CSV text lines (with a header row) and report the outcome"""
+        report = ImportReport()
+        started = time.monotonic()
+        reader = csv.DictReader(lines)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            message = f"Missing columns: {', '.join(missing)}."
+            raise ImportFormatError(message)
+
+        self._create_staging_table()
+        batch: list[tuple[Any, ...]] = []
+        batch_lines: list[int] = []
+        for record in reader:
+            report.rows += 1
+            try:
+                batch.append(self.parse(record))
+            except RowError as exc:
+                report.reject(reader.line_num, str(exc), self.max_rejects)
+                continue
+            batch_lines.append(reader.line_num)
+            if len(batch) >= self.batch_size:
+                self._flush(batch, batch_lines, report)
+                batch, batch_lines = [], []
+        if batch:
+            self._flush(batch, batch_lines, report)
+
+        report.seconds = time.monotonic() - started
+        return report
+
+    def parse(self, record: dict[str, str | None]) -> tuple[Any, ...]:
+        """Validate one CSV record and turn it into a staging row"""
+        values = {key: (value or "").strip() for key, value in record.items() if key}
+        status = self.statuses.get(values["status"])
+        if status is None:
+            error = f'Unknown status "{values["status"]}".'
+            raise RowError(error)
+        cash_flow_type = self.cash_flow_types.get(values["cash_flow_type"])
+        if cash_flow_type is None:
+            error = f'Unknown cash flow type "{values["cash_flow_type"]}".'
+            raise RowError(error)
+        category = self._category(values["category"], cash_flow_type)
+        subcategory = self._subcategory(values["subcategory"], category)
+        return (
+            _parse_created_at(values.get("created_at", "")),
+            status,
+            cash_flow_type,
+            category,
+            subcategory,
+            to_minor_units(_parse_amount(values["amount"])),
+            values.get("comment", ""),
+        )
+
+    def _category(self, name: str, cash_flow_type: int) -> int:
+        if not name:
+            error = "Category is required."
+            raise RowError(error)
+        if name not in self.categories:
+            if not self.create_missing:
+                error = f'Unknown category "{name}".'
+                raise RowError(error)
+            category = Category.objects.create(name=name, cash_flow_type_id=cash_flow_type)
+            self.categories[name] = (category.pk, cash_flow_type)
+        pk, parent = self.categories[name]
+        if parent != cash_flow_type:
+            error = "Category does not belong to the selected cash flow type."
+            raise RowError(error)
+        return pk
+
+    def _subcategory(self, name: str, category: int) -> int:
+        if not name:
+            error = "Subcategory is required."
+            raise RowError(error)
+        if name not in self.subcategories:
+            if not self.create_missing:
+                error = f'Unknown subcategory "{name}".'
+                raise RowError(error)
+            subcategory = Subcategory.objects.create(name=name, category_id=category)
+            self.subcategories[name] = (subcategory.pk, category)
+        pk, parent = self.subcategories[name]
+        if parent != category:
+            error = "Subcategory does not belong to the selected category."
+            raise RowError(error)
+        return pk
+
+    def _create_staging_table(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ("
+                " created_at timestamp with time zone NOT NULL,"
+                " status_id bigint NOT NULL,"
+                " cash_flow_type_id bigint NOT NULL,"
+                " category_id bigint NOT NULL,"
+                " subcategory_id bigint NOT NULL,"
+                " amount_minor bigint NOT NULL,"
+                " comment text NOT NULL"
+                ")"
+            )
+
+    def _flush(self, batch: list[tuple[Any, ...]], lines: list[int], report: ImportReport) -> None:
+        source = CashFlow._meta.db_table  # noqa: SLF001
+        columns = ", ".join(STAGING_COLUMNS)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+                with cursor.cursor.copy(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN") as copy:
+                    for row in batch:
+                        copy.write_row(row)
+                cursor.execute(
+                    f"INSERT INTO {source} ({columns}) SELECT {columns} FROM {STAGING_TABLE}"  # noqa: S608
+                )
+                rollup.add_table(STAGING_TABLE)
+                events.cash_flows_changed()
+                versions.bump_on_commit(versions.CASH_FLOWS)
+        except DatabaseError as exc:
+            for line in lines:
+                report.reject(line, f"Batch failed: {exc}".strip(), self.max_rejects)
+            return
+        report.imported += len(batch)
+
+
+def _parse_amount(value: str) -> Decimal:
+    try:
+        amount = Decimal(value.replace(",", "."))
+    except InvalidOperation as exc:
+        error = f'Invalid amount "{value}".'
+        raise RowError(error) from exc
+    if not amount.is_finite() or amount != amount.quantize(Decimal("0.01")):
+        error = f'Invalid amount "{value}".'
+        raise RowError(error)
+    if amount <= 0:
+        error = "Amount must be positive."
+        raise RowError(error)
+    if amount > MAX_AMOUNT:
+        error = f"Amount must not exceed {MAX_AMOUNT}."
+        raise RowError(error)
+    return amount
+
+
+def _parse_created_at(value: str) -> datetime:
+    if not value:
+        return timezone.now()
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None and (day := parse_date(value)) is not None:
+            parsed = datetime.combine(day, datetime.min.time())
+    except ValueError as exc:
+        error = f'Invalid created_at "{value}".'
+        raise RowError(error) from exc
+    if parsed is None:
+        error = f'Invalid created_at "{value}".'
+        raise RowError(error)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
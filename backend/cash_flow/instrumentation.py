@@ -0,0 +1,252 @@
+import bisect
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+# Request latency buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestStats:
+    """Timings and SQL statements of one request"""
+
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    sql_seconds: float = 0.0
+    statements: Counter[str] = field(default_factory=Counter)
+    view_started: float | None = None
+    view_finished: float | None = None
+    render_finished: float | None = None
+    serialize_seconds: float = 0.0
+    serialize_depth: int = 0
+
+    @property
+    def total_seconds(self) -> float:
+        """Time since the request started"""
+        return time.perf_counter() - self.started
+
+    @property
+    def view_seconds(self) -> float:
+        """Time spent in the view, up to the returned (unrendered) response; it
+        includes the SQL and the serialization time"""
+        if self.view_started is None:
+            return 0.0
+        return (self.view_finished or time.perf_counter()) - self.view_started
+
+    @property
+    def render_seconds(self) -> float:
+        """Time spent rendering the response data to JSON or MessagePack"""
+        if self.view_finished is None or self.render_finished is None:
+            return 0.0
+        return self.render_finished - self.view_finished
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """Return the SQL templates executed at least ``threshold`` times, most frequent first"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def collect() -> Iterator[RequestStats]:
+    """Record the SQL of the current context into a new ``RequestStats``"""
+    stats = RequestStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+def current() -> RequestStats | None:
+    """Stats of the request being handled in this context, if any"""
+    return _stats.get()
+
+
+@contextmanager
+def serializing() -> Iterator[None]:
+    """Count the enclosed time as serialization of the current request's data,
+    e.g. a serializer's ``to_representation``; nested use is counted once"""
+    stats = _stats.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    stats.serialize_depth += 1
+    try:
+        yield
+    finally:
+        stats.serialize_depth -= 1
+        if not stats.serialize_depth:
+            stats.serialize_seconds += time.perf_counter() - started
+
+
+def execute_wrapper(
+    execute: Callable[..., Any],
+    sql: str,
+    params: Any,  # noqa: ANN401
+    many: bool,  # noqa: FBT001
+    context: dict[str, Any],
+) -> Any:  # noqa: ANN401
+    """Database execute wrapper: count and time statements of the current request"""
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_seconds += time.perf_counter() - started
+        stats.queries += 1
+        if not many:
+            stats.statements[sql] += 1
+
+
+def install(connection: BaseDatabaseWrapper) -> None:
+    """Add the execute wrapper to a database connection once"""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram"""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        """Start empty with the given upper bounds"""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one observation"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def cumulative(self) -> Iterator[tuple[str, int]]:
+        """``(le, count)`` pairs including ``+Inf``"""
+        running = 0
+        for bound, count in zip((*map(str, self.buckets), "+Inf"), self.counts, strict=True):
+            running += count
+            yield bound, running
+
+
+class Metrics:
+    """Process-local request metrics rendered in the Prometheus text format.
+
+    Every worker process keeps its own numbers; Prometheus sums them per instance.
+    """
+
+    def __init__(self) -> None:
+        """Start with no observations"""
+        self._lock = threading.Lock()
+        self._latency: dict[tuple[str, str, str], Histogram] = {}
+        self._queries: Counter[tuple[str, str]] = Counter()
+        self._sql_seconds: dict[tuple[str, str], float] = {}
+        self._n_plus_one: Counter[tuple[str, str]] = Counter()
+        self._cache: Counter[tuple[str, str]] = Counter()
+
+    def observe(
+        self,
+        method: str,
+        view: str,
+        status: int,
+        stats: RequestStats,
+        n_plus_one: int,
+    ) -> None:
+        """Record one finished request"""
+        seconds = stats.total_seconds
+        with self._lock:
+            key = (method, view, str(status))
+            if key not in self._latency:
+                self._latency[key] = Histogram(BUCKETS)
+            self._latency[key].observe(seconds)
+            self._queries[method, view] += stats.queries
+            self._sql_seconds[method, view] = (
+                self._sql_seconds.get((method, view), 0.0) + stats.sql_seconds
+            )
+            if n_plus_one:
+                self._n_plus_one[method, view] += n_plus_one
+
+    def observe_cache(self, view: str, *, hit: bool) -> None:
+        """Record one response cache lookup"""
+        with self._lock:
+            self._cache[view, "hit" if hit else "miss"] += 1
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by endpoint.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, view, status), histogram in sorted(self._latency.items()):
+                labels = f'method="{method}",view="{view}",status="{status}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}'
+                    )
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram.total}")
+                lines.append(
+                    f"http_request_duration_seconds_count{{{labels}}} {sum(histogram.counts)}"
+                )
+            lines += _counter(
+                "http_request_db_queries_total",
+                "SQL statements executed by endpoint.",
+                self._queries,
+            )
+            lines += _counter(
+                "http_request_db_seconds_total",
+                "Time spent in SQL by endpoint.",
+                self._sql_seconds,
+            )
+            lines += _counter(
+                "http_request_n_plus_one_total",
+                "Repeated SQL statements flagged as N+1 patterns by endpoint.",
+                self._n_plus_one,
+            )
+            lines += [
+                (
+                    "# HELP http_response_cache_requests_total"
+                    " Response cache lookups by endpoint and result."
+                ),
+                "# TYPE http_response_cache_requests_total counter",
+            ]
+            lines += [
+                f'http_response_cache_requests_total{{view="{view}",result="{result}"}} {count}'
+                for (view, result), count in sorted(self._cache.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _counter(name: str, description: str, values: dict[tuple[str, str], float]) -> list[str]:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+    lines += [
+        f'{name}{{method="{method}",view="{view}"}} {value}'
+        for (method, view), value in sorted(values.items())
+    ]
+    return lines
+
+
+metrics = Metrics()
+
+
+def server_timing(stats: RequestStats) -> str:
+    """``Server-Timing`` header value of a finished request"""
+    return ", ".join(
+        (
+            f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f"serialize;dur={stats.serialize_seconds * 1000:.1f}",
+            f"view;dur={stats.view_seconds * 1000:.1f}",
+            f"render;dur={stats.render_seconds * 1000:.1f}",
+            f"total;dur={stats.total_seconds * 1000:.1f}",
+        )
+    )
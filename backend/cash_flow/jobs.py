@@ -0,0 +1,290 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import IO, Any
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import versions
+from .models import Job
+
+logger = logging.getLogger("cash_flow.jobs")
+
+# Background jobs. Exports, reports and maintenance that outgrow a request are
+# queued as Job rows and run by the run_jobs worker command. Workers claim queued
+# jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of worker processes
+# and threads share the queue without waiting on each other. A failed attempt is
+# retried after an exponential backoff until max_attempts; a running job whose
+# worker stopped sending heartbeats is taken back. Result files are written
+# under MEDIA_ROOT/jobs/.
+#
+# The fingerprint of a job is its kind, its parameters and the data versions at
+# submission. Submitting a job equal to a pending one, or to a finished one whose
+# result is still kept, returns that job instead of running it again.
+
+# Handler of each kind: called with the job and a Progress, returns the name of
+# the result file (relative to MEDIA_ROOT) or None
+HANDLERS = {
+    Job.Kind.EXPORT: "cash_flow.tasks.export_cash_flows",
+    Job.Kind.PIVOT: "cash_flow.tasks.pivot_report",
+    Job.Kind.ROLLUP_REBUILD: "cash_flow.tasks.rebuild_rollup",
+    Job.Kind.MERGE: "cash_flow.tasks.merge_dictionary",
+    Job.Kind.RENAME: "cash_flow.tasks.refresh_dictionary_names",
+    Job.Kind.BALANCE_REBUILD: "cash_flow.tasks.rebuild_balances",
+}
+RESULT_DIR = "jobs"
+# Seconds between the heartbeats of the running jobs and the progress updates
+HEARTBEAT_SECONDS = 10.0
+
+type Handler = Callable[[Job, "Progress"], str | None]
+
+
+def fingerprint(kind: str, params: Mapping[str, Any]) -> str:
+    """Return the fingerprint of a job of ``kind`` submitted now"""
+    data_versions = versions.get_many([versions.CASH_FLOWS, versions.DICTIONARIES])
+    payload = json.dumps([kind, params, data_versions], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def submit(kind: str, params: Mapping[str, Any]) -> tuple[Job, bool]:
+    """Queue a job; return it and whether it is new.
+
+    An equal job that is queued, running or succeeded with its result file still
+    present is returned instead of a new one.
+    """
+    key = fingerprint(kind, params)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Equal submissions wait for each other, so only one of them queues a job
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", [key])
+        existing = (
+            Job.objects.filter(fingerprint=key).exclude(state=Job.State.FAILED).order_by("-id")
+        ).first()
+        if existing is not None and _reusable(existing):
+            return existing, False
+        job = Job.objects.create(
+            kind=kind,
+            params=dict(params),
+            fingerprint=key,
+            max_attempts=settings.CASH_FLOW_JOB_MAX_ATTEMPTS,
+        )
+    return job, True
+
+
+def claim(worker: str) -> Job | None:
+    """Take the next due queued job for ``worker``, or return None"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(state=Job.State.QUEUED, run_after__lte=now)
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.state = Job.State.RUNNING
+        job.attempts += 1
+        job.worker = worker
+        job.started_at = job.heartbeat_at = now
+        job.error = ""
+        job.save(
+            update_fields=["state", "attempts", "worker", "started_at", "heartbeat_at", "error"]
+        )
+    return job
+
+
+def execute(job: Job) -> None:
+    """Run a claimed job and record its outcome"""
+    handler: Handler = import_string(HANDLERS[job.kind])
+    try:
+        result = handler(job, Progress(job))
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        _failed(job, f"{type(exc).__name__}: {exc}")
+        return
+    _attempt(job).update(
+        state=Job.State.SUCCEEDED,
+        processed=job.processed,
+        total=job.total,
+        result=result or "",
+        finished_at=timezone.now(),
+    )
+
+
+def heartbeat(worker: str) -> None:
+    """Mark the running jobs of the worker threads of ``worker`` as alive"""
+    Job.objects.filter(state=Job.State.RUNNING, worker__startswith=f"{worker}/").update(
+        heartbeat_at=timezone.now()
+    )
+
+
+def recover() -> int:
+    """Queue again (or fail) the running jobs without a recent heartbeat; returns
+    their number"""
+    stale = timezone.now() - timedelta(seconds=settings.CASH_FLOW_JOB_STALE_SECONDS)
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                state=Job.State.RUNNING, heartbeat_at__lt=stale
+            )
+        )
+        for job in jobs:
+            _failed(job, f"Worker {job.worker} stopped responding.")
+    return len(jobs)
+
+
+def purge() -> int:
+    """Delete the jobs finished more than ``CASH_FLOW_JOB_RETENTION_DAYS`` ago with
+    their result files; returns their number"""
+    cutoff = timezone.now() - timedelta(days=settings.CASH_FLOW_JOB_RETENTION_DAYS)
+    jobs = Job.objects.filter(finished_at__lt=cutoff)
+    for pk in jobs.values_list("pk", flat=True):
+        shutil.rmtree(Path(settings.MEDIA_ROOT) / RESULT_DIR / str(pk), ignore_errors=True)
+    deleted, _ = jobs.delete()
+    return deleted
+
+
+@contextmanager
+def result_file(job: Job, filename: str) -> Iterator[tuple[str, IO[bytes]]]:
+    """Open the result file of ``job`` for writing; yield its name and the file.
+
+    The file only gets its name once it is complete, so a download never sees a
+    partial result.
+    """
+    name = f"{RESULT_DIR}/{job.pk}/{filename}"
+    path = Path(settings.MEDIA_ROOT) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f".{path.name}.part")
+    try:
+        with partial.open("wb") as file:
+            yield name, file
+        partial.replace(path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+class Progress:
+    """Progress reporter of a running job; writes at most once per heartbeat"""
+
+    def __init__(self, job: Job) -> None:
+        """Report the progress of ``job``"""
+        self.job = job
+        self._written = 0.0
+
+    def __call__(self, processed: int, total: int | None = None, *, force: bool = False) -> None:
+        """Record ``processed`` items out of ``total`` (unknown when None)"""
+        self.job.processed = processed
+        if total is not None:
+            self.job.total = total
+        now = time.monotonic()
+        if not force and now - self._written < HEARTBEAT_SECONDS:
+            return
+        self._written = now
+        Job.objects.filter(pk=self.job.pk).update(
+            processed=self.job.processed,
+            total=self.job.total,
+            heartbeat_at=timezone.now(),
+        )
+
+
+class Worker:
+    """Job worker: ``concurrency`` threads claiming and running jobs.
+
+    ``burst`` workers stop once the queue is empty; others poll it every
+    ``poll_interval`` seconds until ``stop`` is called.
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float, *, burst: bool = False) -> None:
+        """Configure the worker threads"""
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stopping = threading.Event()
+
+    def run(self) -> None:
+        """Run the worker threads; the calling thread sends the heartbeats and takes
+        back the jobs of lost workers"""
+        threads = [
+            threading.Thread(target=self._work, name=f"{self.name}/{number}", daemon=True)
+            for number in range(1, self.concurrency + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                self._maintain()
+                self.stopping.wait(HEARTBEAT_SECONDS)
+                threads = [thread for thread in threads if thread.is_alive()]
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+    def stop(self) -> None:
+        """Let the running jobs finish, then stop"""
+        self.stopping.set()
+
+    def _maintain(self) -> None:
+        close_old_connections()
+        heartbeat(self.name)
+        if recovered := recover():
+            logger.warning("Took back %s jobs of lost workers", recovered)
+        purge()
+
+    def _work(self) -> None:
+        name = threading.current_thread().name
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    job = claim(name)
+                except DatabaseError:
+                    # E.g. a database restart; the connection is replaced next round
+                    logger.exception("Worker %s could not claim a job", name)
+                    connection.close()
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                if job is None:
+                    if self.burst:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                logger.info("Job %s (%s) started by %s", job.pk, job.kind, name)
+                execute(job)
+        finally:
+            connection.close()
+
+
+def _reusable(job: Job) -> bool:
+    if job.state != Job.State.SUCCEEDED or not job.result:
+        return True
+    return job.result.storage.exists(job.result.name)
+
+
+def _failed(job: Job, error: str) -> None:
+    if job.attempts < job.max_attempts:
+        delay = settings.CASH_FLOW_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        run_after = timezone.now() + timedelta(seconds=delay)
+        changes = {"state": Job.State.QUEUED, "run_after": run_after}
+    else:
+        changes = {"state": Job.State.FAILED, "finished_at": timezone.now()}
+    _attempt(job).update(error=error, **changes)
+
+
+def _attempt(job: Job) -> QuerySet[Job]:
+    # The job while still in this attempt: not taken back and claimed again since
+    return Job.objects.filter(pk=job.pk, state=Job.State.RUNNING, attempts=job.attempts)
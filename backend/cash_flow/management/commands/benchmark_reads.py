@@ -0,0 +1,65 @@
+import asyncio
+import statistics
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.test import AsyncClient, override_settings
+
+
+class Command(BaseCommand):
+    """Compare the sync and the native async read path of the API"""
+
+    help = (
+        "Send concurrent GET requests through the in-process ASGI handler, once with "
+        "CASH_FLOW_ASYNC_READS off and once on, and report throughput and latency."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the load parameters"""
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Request path; repeatable (default: cash flow list and statuses)",
+        )
+        parser.add_argument("--requests", type=int, default=500, help="Requests per path and mode")
+        parser.add_argument("--concurrency", type=int, default=100, help="Requests in flight")
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Run both modes for every path and print one line per run"""
+        paths = options["paths"] or ["/api/cash_flows/?page_size=50", "/api/statuses/"]
+        for path in paths:
+            for async_reads in (False, True):
+                with override_settings(CASH_FLOW_ASYNC_READS=async_reads):
+                    seconds, latencies, errors = asyncio.run(
+                        _run(path, options["requests"], options["concurrency"])
+                    )
+                latencies.sort()
+                self.stdout.write(
+                    f"{'async' if async_reads else 'sync '} {path}: "
+                    f"{len(latencies) / seconds:.0f} req/s, "
+                    f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                    f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, "
+                    f"max {latencies[-1] * 1000:.1f} ms, errors {errors}"
+                )
+
+
+async def _run(path: str, requests: int, concurrency: int) -> tuple[float, list[float], int]:
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one() -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400  # noqa: PLR2004
+
+    await client.get(path)  # warm up caches and connections
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - started, latencies, errors
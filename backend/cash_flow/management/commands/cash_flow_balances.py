@@ -0,0 +1,45 @@
+from datetime import date
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from cash_flow import balance
+
+
+class Command(BaseCommand):
+    """Take the daily balance snapshots"""
+
+    help = (
+        "Snapshot the closing balance of every status for the days since the last "
+        "snapshot, up to yesterday. Run it daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the snapshot options"""
+        parser.add_argument(
+            "--until",
+            metavar="YYYY-MM-DD",
+            help="Last day to snapshot instead of yesterday",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop all snapshots and recompute them from the daily rollup",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Take (or rebuild) the snapshots and report their number"""
+        until = None
+        if options["until"]:
+            try:
+                until = date.fromisoformat(options["until"])
+            except ValueError as exc:
+                message = "--until must look like YYYY-MM-DD."
+                raise CommandError(message) from exc
+
+        if options["rebuild"]:
+            rows = balance.rebuild(until)
+            self.stdout.write(self.style.SUCCESS(f"Balance snapshots rebuilt: {rows} rows."))
+        else:
+            rows = balance.take(until)
+            self.stdout.write(self.style.SUCCESS(f"Balance snapshots taken: {rows} rows."))
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from cash_flow import partitions
+
+
+class Command(BaseCommand):
+    """Maintain the monthly partitions of the cash flow table"""
+
+    help = (
+        "Create the monthly cash_flow_cashflow partitions ahead of time and optionally "
+        "detach (and archive) old ones. Run it daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the maintenance options"""
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.CASH_FLOW_PARTITION_MONTHS_AHEAD,
+            help="Number of future months to create partitions for",
+        )
+        parser.add_argument(
+            "--detach-before",
+            metavar="YYYY-MM",
+            help="Detach the partitions of the months before this one",
+        )
+        parser.add_argument(
+            "--archive-schema",
+            help="Move detached partitions into this schema instead of leaving them in place",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Create the missing partitions, then detach the old ones"""
+        before = None
+        if options["detach_before"]:
+            try:
+                before = datetime.strptime(options["detach_before"], "%Y-%m")  # noqa: DTZ007
+            except ValueError as exc:
+                message = "--detach-before must look like YYYY-MM."
+                raise CommandError(message) from exc
+
+        for name in partitions.ensure(options["months_ahead"]):
+            self.stdout.write(f"Created {name}")
+        if before is not None:
+            detached = partitions.detach(partitions.month_start(before), options["archive_schema"])
+            for name in detached:
+                self.stdout.write(f"Detached {name}")
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date."))
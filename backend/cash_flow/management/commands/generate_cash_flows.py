@@ -0,0 +1,80 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from cash_flow import generator
+
+
+class Command(BaseCommand):
+    """Load a synthetic cash flow dataset"""
+
+    help = (
+        "Generate realistic cash flows (skewed dictionaries, a multi-year date spread) "
+        "and load them with COPY; the same options and seed give the same dataset."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the dataset options"""
+        parser.add_argument("--rows", type=int, default=100_000, help="Number of cash flows")
+        parser.add_argument("--years", type=float, default=3, help="Years of history up to now")
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.2,
+            help="Zipf exponent of the status, category and subcategory distributions",
+        )
+        parser.add_argument(
+            "--comment-ratio",
+            type=float,
+            default=0.6,
+            help="Share of rows with a comment",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--categories",
+            type=int,
+            default=0,
+            help="Top up every cash flow type to this number of categories",
+        )
+        parser.add_argument(
+            "--subcategories",
+            type=int,
+            default=0,
+            help="Top up every category to this number of subcategories",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100_000,
+            help="Rows per COPY and transaction",
+        )
+        parser.add_argument(
+            "--truncate",
+            action="store_true",
+            help="Delete all cash flows first (benchmark databases only)",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Generate the dataset and report the load throughput"""
+        if options["rows"] < 0 or options["batch_size"] < 1:
+            message = "--rows must not be negative and --batch-size must be positive."
+            raise CommandError(message)
+        if options["truncate"]:
+            generator.truncate()
+        generator.ensure_dictionaries(options["categories"], options["subcategories"])
+        try:
+            cash_flow_generator = generator.CashFlowGenerator(
+                years=options["years"],
+                skew=options["skew"],
+                comment_ratio=options["comment_ratio"],
+                seed=options["seed"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        report = cash_flow_generator.run(options["rows"], options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {report.rows} cash flows in {report.seconds:.1f} s "
+                f"({report.rows_per_second:.0f} rows/s)."
+            )
+        )
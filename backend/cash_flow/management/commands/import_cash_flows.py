@@ -0,0 +1,52 @@
+import gzip
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from cash_flow.importer import CashFlowImporter, ImportFormatError
+
+
+class Command(BaseCommand):
+    """Import cash flows from a CSV file through PostgreSQL COPY"""
+
+    help = (
+        "Import cash flows from a CSV file (optionally gzip-compressed) with the columns "
+        "created_at, status, cash_flow_type, category, subcategory, amount, comment. "
+        "Dictionaries are referenced by name."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the file path and import options"""
+        parser.add_argument("path", type=Path, help="CSV file; a .gz suffix means gzip")
+        parser.add_argument(
+            "--create-missing",
+            action="store_true",
+            help="Create unknown categories and subcategories instead of rejecting the line",
+        )
+        parser.add_argument("--batch-size", type=int, help="Rows per COPY batch and transaction")
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Run the import and print the report"""
+        path: Path = options["path"]
+        importer = CashFlowImporter(
+            create_missing=options["create_missing"],
+            batch_size=options["batch_size"],
+        )
+        opener = gzip.open if path.suffix == ".gz" else open
+        try:
+            with opener(path, "rt", newline="", encoding="utf-8") as lines:
+                report = importer.run(lines)
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc)) from exc
+
+        for reject in report.rejects:
+            self.stderr.write(f"line {reject['line']}: {reject['error']}")
+        if report.rejected > len(report.rejects):
+            self.stderr.write(f"... {report.rejected - len(report.rejects)} more rejected lines")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.imported} of {report.rows} rows in {report.seconds:.2f}s "
+                f"({report.rows_per_second:.0f} rows/s), rejected {report.rejected}."
+            )
+        )
@@ -0,0 +1,57 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from cash_flow.merge import MODELS, DictionaryMerge, MergeError
+
+
+class Command(BaseCommand):
+    """Merge one dictionary row into another"""
+
+    help = (
+        "Move the cash flows of a status, type, category or subcategory to another row of "
+        "the same dictionary in batches, then delete it. Children of a merged type or "
+        "category move to the target. An interrupted merge is finished by running it again."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the rows and the batching options"""
+        parser.add_argument("model", choices=list(MODELS), help="Dictionary of both rows")
+        parser.add_argument("source", type=int, help="Id of the row to merge and delete")
+        parser.add_argument("target", type=int, help="Id of the row that receives its cash flows")
+        parser.add_argument("--batch-size", type=int, help="Cash flows moved per transaction")
+        parser.add_argument("--pause", type=float, help="Seconds to pause between two batches")
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Run the merge, printing its progress at most once a second"""
+        try:
+            merge = DictionaryMerge(
+                options["model"],
+                options["source"],
+                options["target"],
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+            )
+        except MergeError as exc:
+            raise CommandError(str(exc)) from exc
+        started = time.monotonic()
+        printed = 0.0
+
+        def progress(moved: int, total: int) -> None:
+            nonlocal printed
+            now = time.monotonic()
+            if moved and now - printed < 1:
+                return
+            printed = now
+            rate = moved / (now - started) if now > started else 0.0
+            self.stdout.write(f"Moved {moved} of {total} cash flows ({rate:.0f} rows/s)")
+
+        report = merge.run(progress)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Merged {options['model']} {options['source']} into {options['target']}: "
+                f"{report.rows} cash flows moved in {report.seconds:.2f}s "
+                f"({report.rows_per_second:.0f} rows/s)."
+            )
+        )
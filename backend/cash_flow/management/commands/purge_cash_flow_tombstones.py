@@ -0,0 +1,23 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cash_flow import sync
+
+
+class Command(BaseCommand):
+    """Purge the delete records of the delta sync"""
+
+    help = (
+        "Delete the cash flow tombstones older than CASH_FLOW_TOMBSTONE_DAYS; sync tokens "
+        "older than that are answered with 410. Run it daily, e.g. from cron."
+    )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Purge and report the number of purged tombstones"""
+        rows = sync.purge_tombstones()
+        days = settings.CASH_FLOW_TOMBSTONE_DAYS
+        self.stdout.write(
+            self.style.SUCCESS(f"Tombstones older than {days} days purged: {rows} rows.")
+        )
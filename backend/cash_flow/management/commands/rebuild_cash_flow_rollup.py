@@ -0,0 +1,16 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from cash_flow import rollup
+
+
+class Command(BaseCommand):
+    """Rebuild the daily cash flow rollup from scratch"""
+
+    help = "Recompute the daily cash flow rollup from the cash_flow_cashflow table."
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Run the rebuild and report the number of rollup rows"""
+        rows = rollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rollup rebuilt: {rows} rows."))
@@ -0,0 +1,102 @@
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.test import override_settings
+
+from cash_flow.benchmarks import Baseline, Suite
+
+
+class Command(BaseCommand):
+    """Benchmark the API and compare the results with a stored baseline"""
+
+    help = (
+        "Time every filter and ordering of the cash flow list, the writes and the "
+        "dictionary endpoints; report query counts and p50/p95/p99 latencies and fail "
+        "on regressions against the baseline. Load a dataset with generate_cash_flows first."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the run and comparison options"""
+        parser.add_argument("--requests", type=int, default=30, help="Measured requests per case")
+        parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per case")
+        parser.add_argument(
+            "--only",
+            action="append",
+            default=[],
+            help="Run the cases whose name contains this text; repeatable",
+        )
+        parser.add_argument(
+            "--baseline",
+            type=Path,
+            default=settings.CASH_FLOW_BENCHMARK_BASELINE,
+            help="Baseline file",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Store the results as the new baseline instead of comparing",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed latency growth over the baseline, as a fraction",
+        )
+        parser.add_argument(
+            "--min-delta-ms",
+            type=float,
+            default=2.0,
+            help="Latency growth below this is never a regression",
+        )
+        parser.add_argument(
+            "--response-cache",
+            action="store_true",
+            help="Keep the response cache on; by default every request reaches the database",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Run the selected cases, then save or compare the baseline"""
+        if options["requests"] < 1 or options["warmup"] < 0:
+            message = "--requests must be positive and --warmup must not be negative."
+            raise CommandError(message)
+        path: Path = options["baseline"]
+        baseline = None
+        if not options["save_baseline"] and path.exists():
+            baseline = Baseline.load(path)
+
+        cache = settings.CASH_FLOW_RESPONSE_CACHE if options["response_cache"] else ""
+        with override_settings(CASH_FLOW_RESPONSE_CACHE=cache):
+            suite = Suite(options["requests"], options["warmup"])
+            current = Baseline(rows=suite.dataset_rows())
+            self.stdout.write(f"Dataset: {current.rows} cash flows")
+            for name, result in suite.run(
+                lambda name: not options["only"] or any(text in name for text in options["only"])
+            ):
+                current.results[name] = result
+                self.stdout.write(
+                    f"{name}: p50 {result.p50_ms} ms, p95 {result.p95_ms} ms, "
+                    f"p99 {result.p99_ms} ms, {result.queries} queries, {result.errors} errors"
+                )
+
+        if options["save_baseline"]:
+            current.save(path)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {path}."))
+            return
+        if baseline is None:
+            self.stdout.write(f"No baseline at {path}; store one with --save-baseline.")
+            return
+        if baseline.rows != current.rows:
+            self.stderr.write(
+                f"The baseline was taken with {baseline.rows} cash flows; numbers may differ."
+            )
+        regressions = baseline.regressions(
+            current.results, options["tolerance"], options["min_delta_ms"]
+        )
+        for regression in regressions:
+            self.stderr.write(f"Regression: {regression}")
+        if regressions:
+            message = f"{len(regressions)} regressions against {path}."
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}."))
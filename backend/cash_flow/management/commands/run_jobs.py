@@ -0,0 +1,56 @@
+import signal
+from types import FrameType
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from cash_flow import jobs
+
+
+class Command(BaseCommand):
+    """Run the background job worker"""
+
+    help = (
+        "Claim and run queued jobs (exports, pivot reports, rollup rebuilds). Start as many "
+        "workers as needed; SIGINT or SIGTERM lets the running jobs finish, then stops."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """Declare the worker options"""
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.CASH_FLOW_JOB_CONCURRENCY,
+            help="Jobs run at the same time by this worker",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds between two looks at an empty queue",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Stop once the queue is empty",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ARG002
+        """Run the worker until it is stopped or, with --burst, the queue is empty"""
+        if options["concurrency"] < 1:
+            message = "--concurrency must be positive."
+            raise CommandError(message)
+        worker = jobs.Worker(
+            options["concurrency"], options["poll_interval"], burst=options["burst"]
+        )
+
+        def stop(signum: int, frame: FrameType | None) -> None:  # noqa: ARG001
+            self.stdout.write("Stopping after the running jobs...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        self.stdout.write(f"Worker {worker.name} running {worker.concurrency} jobs at a time.")
+        worker.run()
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker.name} stopped."))
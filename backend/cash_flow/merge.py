@@ -0,0 +1,150 @@
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Model
+from django.utils import timezone
+
+from . import dictionaries, events, rollup, versions
+from .models import CashFlow, CashFlowType, Category, Status, Subcategory
+
+# Merging dictionary rows. Cash flows reference the dictionaries with PROTECT,
+# so a row still in use cannot be deleted; merging it into another row moves its
+# cash flows there first. The rows are moved in batches of their own transaction
+# (SELECT ... FOR UPDATE of a batch, UPDATE, rollup and balance deltas), with a
+# pause between batches, so a large merge neither holds long locks nor starves
+# other writers, autovacuum and the replicas. Every step is idempotent: a merge
+# that stopped half-way is finished by running it again.
+#
+# The hierarchy stays consistent: the children of a merged type or category are
+# attached to the target first, and moved cash flows take the category and type
+# of their new subcategory or category.
+
+# Merged models by the name used in the API, the command and the job parameters
+MODELS: dict[str, type[Model]] = {
+    "status": Status,
+    "cash_flow_type": CashFlowType,
+    "category": Category,
+    "subcategory": Subcategory,
+}
+
+type ProgressCallback = Callable[[int, int], None]
+
+
+class MergeError(Exception):
+    """The rows cannot be merged"""
+
+
+@dataclass
+class MergeReport:
+    """Outcome of a merge: moved cash flows and throughput"""
+
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """Moved cash flows per second"""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class DictionaryMerge:
+    """Move the cash flows of the ``source`` row of a dictionary to ``target``,
+    then delete ``source``"""
+
+    def __init__(
+        self,
+        model_name: str,
+        source: int,
+        target: int,
+        *,
+        batch_size: int | None = None,
+        pause: float | None = None,
+    ) -> None:
+        """Look up both rows; raise MergeError when they cannot be merged"""
+        if model_name not in MODELS:
+            error = f"Unknown dictionary {model_name!r}."
+            raise MergeError(error)
+        if source == target:
+            error = "A row cannot be merged into itself."
+            raise MergeError(error)
+        model = MODELS[model_name]
+        rows = model.objects.in_bulk([source, target])
+        if source not in rows or target not in rows:
+            error = f"No {model_name} {source if source not in rows else target}."
+            raise MergeError(error)
+        self.model_name = model_name
+        self.column = f"{model_name}_id"
+        self.source = rows[source]
+        self.target = rows[target]
+        self.batch_size = batch_size or settings.CASH_FLOW_MERGE_BATCH_SIZE
+        self.pause = settings.CASH_FLOW_MERGE_PAUSE if pause is None else pause
+
+    def run(self, progress: ProgressCallback | None = None) -> MergeReport:
+        """Merge, calling ``progress(moved, total)`` after every batch"""
+        report = MergeReport()
+        started = time.monotonic()
+        self._adopt_children()
+        total = CashFlow.objects.filter(**{self.column: self.source.pk}).count()
+        if progress:
+            progress(0, total)
+        while moved := self._move_batch():
+            report.rows += moved
+            report.seconds = time.monotonic() - started
+            if progress:
+                # Rows added to the source meanwhile are moved as well
+                progress(report.rows, max(total, report.rows))
+            time.sleep(self.pause)
+        self.source.delete()
+        if report.rows:
+            events.cash_flows_changed()
+        report.seconds = time.monotonic() - started
+        return report
+
+    def _adopt_children(self) -> None:
+        # Attach the categories of a merged type, or the subcategories of a merged
+        # category, to the target
+        if isinstance(self.source, CashFlowType):
+            children = Category.objects.filter(cash_flow_type=self.source)
+            changes = {"cash_flow_type": self.target}
+        elif isinstance(self.source, Category):
+            children = Subcategory.objects.filter(category=self.source)
+            changes = {"category": self.target}
+        else:
+            return
+        with transaction.atomic():
+            if children.update(**changes):
+                dictionaries.changed()
+                events.dictionaries_changed()
+
+    def _assignments(self) -> dict[str, int]:
+        # The new references of a moved cash flow: the target and its parents
+        values = {self.column: self.target.pk}
+        if isinstance(self.target, Subcategory):
+            category = Category.objects.get(pk=self.target.category_id)
+            values["category_id"] = category.pk
+            values["cash_flow_type_id"] = category.cash_flow_type_id
+        elif isinstance(self.target, Category):
+            values["cash_flow_type_id"] = self.target.cash_flow_type_id
+        return values
+
+    def _move_batch(self) -> int:
+        # Move the next batch in its own transaction; returns the number of rows
+        values = self._assignments()
+        with transaction.atomic():
+            removed = list(
+                CashFlow.objects.select_for_update()
+                .filter(**{self.column: self.source.pk})
+                .values("id", *rollup.ROW_FIELDS)[: self.batch_size]
+            )
+            if not removed:
+                return 0
+            CashFlow.objects.filter(pk__in=[row["id"] for row in removed]).update(
+                **values, updated_at=timezone.now()
+            )
+            added = [{**row, **values} for row in removed]
+            rollup.apply_deltas(rollup.collect_deltas(added=added, removed=removed))
+            versions.bump_on_commit(versions.CASH_FLOWS)
+        return len(removed)
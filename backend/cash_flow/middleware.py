@@ -0,0 +1,169 @@
+import json
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from http import HTTPStatus
+from typing import Any
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase
+from rest_framework.permissions import SAFE_METHODS
+
+from . import instrumentation, replicas
+
+logger = logging.getLogger("cash_flow.performance")
+
+
+class PerformanceMiddleware:
+    """Per-request SQL count, SQL time, serialization time, view time and render time.
+
+    The numbers go to a ``Server-Timing`` header, to the ``/metrics`` histograms
+    and, for a ``CASH_FLOW_PERF_LOG_SAMPLE_RATE`` share of requests, to a JSON log
+    line. SQL templates executed ``CASH_FLOW_N_PLUS_ONE_THRESHOLD`` or more times
+    in one request are logged as N+1 patterns. Place it first in ``MIDDLEWARE``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        """Wrap the next handler, sync or async"""
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase | Awaitable[HttpResponseBase]:
+        """Handle the request while collecting its stats"""
+        if self.is_async:
+            return self.__acall__(request)
+        with instrumentation.collect() as stats:
+            response = self.get_response(request)
+            self.finish(request, response, stats)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        """Async variant of ``__call__``"""
+        with instrumentation.collect() as stats:
+            response = await self.get_response(request)
+            self.finish(request, response, stats)
+        return response
+
+    def process_view(self, *args: Any) -> None:  # noqa: ARG002
+        """Mark the start of the view"""
+        if stats := instrumentation.current():
+            stats.view_started = time.perf_counter()
+
+    def process_template_response(
+        self,
+        request: HttpRequest,  # noqa: ARG002
+        response: HttpResponseBase,
+    ) -> HttpResponseBase:
+        """Mark the end of the view; the response is rendered next"""
+        if stats := instrumentation.current():
+            stats.view_finished = time.perf_counter()
+            response.add_post_render_callback(lambda _: _rendered(stats))
+        return response
+
+    def finish(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        stats: instrumentation.RequestStats,
+    ) -> None:
+        """Report the stats of a handled request"""
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        repeated = stats.repeated_statements(settings.CASH_FLOW_N_PLUS_ONE_THRESHOLD)
+        for sql, count in repeated:
+            logger.warning(
+                json.dumps(
+                    {
+                        "event": "n_plus_one",
+                        "method": request.method,
+                        "path": request.path,
+                        "view": view,
+                        "count": count,
+                        "sql": sql,
+                    }
+                )
+            )
+        instrumentation.metrics.observe(
+            request.method, view, response.status_code, stats, len(repeated)
+        )
+        response["Server-Timing"] = instrumentation.server_timing(stats)
+        if random.random() < settings.CASH_FLOW_PERF_LOG_SAMPLE_RATE:  # noqa: S311
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "request",
+                        "method": request.method,
+                        "path": request.path,
+                        "view": view,
+                        "status": response.status_code,
+                        "queries": stats.queries,
+                        "sql_ms": round(stats.sql_seconds * 1000, 1),
+                        "serialize_ms": round(stats.serialize_seconds * 1000, 1),
+                        "view_ms": round(stats.view_seconds * 1000, 1),
+                        "render_ms": round(stats.render_seconds * 1000, 1),
+                        "total_ms": round(stats.total_seconds * 1000, 1),
+                    }
+                )
+            )
+
+
+class PrimaryStickinessMiddleware:
+    """Keep a client's reads on the primary database right after its writes.
+
+    A successful unsafe request (POST, PUT, PATCH, DELETE) sets a cookie that
+    lives ``CASH_FLOW_REPLICA_STICKY_SECONDS``; while the client sends it back,
+    its requests read from the primary (see replicas.py), so it reads its own
+    writes whatever the replication lag.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        """Wrap the next handler, sync or async"""
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponseBase | Awaitable[HttpResponseBase]:
+        """Handle the request within its read routing"""
+        if self.is_async:
+            return self.__acall__(request)
+        with replicas.request_scope(sticky=replicas.STICKY_COOKIE in request.COOKIES):
+            response = self.get_response(request)
+        self.finish(request, response)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        """Async variant of ``__call__``"""
+        with replicas.request_scope(sticky=replicas.STICKY_COOKIE in request.COOKIES):
+            response = await self.get_response(request)
+        self.finish(request, response)
+        return response
+
+    def finish(self, request: HttpRequest, response: HttpResponseBase) -> None:
+        """Mark the client of a successful write as sticky"""
+        if (
+            settings.CASH_FLOW_READ_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < HTTPStatus.BAD_REQUEST
+        ):
+            response.set_cookie(
+                replicas.STICKY_COOKIE,
+                "1",
+                max_age=settings.CASH_FLOW_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+
+
+def _rendered(stats: instrumentation.RequestStats) -> None:
+    stats.render_finished = time.perf_counter()
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_rollup(apps, schema_editor):
+    schema_editor.execute(
+        "INSERT INTO cash_flow_cashflowrollup"
+        " (day, status_id, cash_flow_type_id, category_id, subcategory_id, total, count)"
+        " SELECT (created_at AT TIME ZONE %s)::date,"
+        " status_id, cash_flow_type_id, category_id, subcategory_id, SUM(amount), COUNT(*)"
+        " FROM cash_flow_cashflow GROUP BY 1, 2, 3, 4, 5",
+        [settings.TIME_ZONE],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0002_create_initial_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('count', models.IntegerField(default=0)),
+                ('cash_flow_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cash_flow.cashflowtype')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cash_flow.category')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cash_flow.status')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cash_flow.subcategory')),
+            ],
+            options={
+                'verbose_name': 'Cash flow rollup',
+                'verbose_name_plural': 'Cash flow rollups',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'cash_flow_type', 'category', 'subcategory'), name='cash_flow_rollup_key')],
+            },
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:02
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = "cash_flow_cashflow"
+STAGING = "cash_flow_cashflow_new"
+# Partitions are created up to this many months ahead; the cash_flow_partitions
+# management command keeps extending them
+MONTHS_AHEAD = 3
+COLUMNS = "id, amount, created_at, comment, cash_flow_type_id, category_id, status_id, subcategory_id"
+COLUMN_DEFINITIONS = (
+    "amount numeric(10, 2) NOT NULL,"
+    " created_at timestamp with time zone NOT NULL,"
+    " comment text NOT NULL,"
+    " cash_flow_type_id bigint NOT NULL,"
+    " category_id bigint NOT NULL,"
+    " status_id bigint NOT NULL,"
+    " subcategory_id bigint NOT NULL,"
+    " CONSTRAINT amount_must_be_positive CHECK (amount > 0)"
+)
+FOREIGN_KEYS = {
+    "cash_flow_type_id": "cash_flow_cashflowtype",
+    "category_id": "cash_flow_category",
+    "status_id": "cash_flow_status",
+    "subcategory_id": "cash_flow_subcategory",
+}
+
+
+def add_foreign_keys_and_indexes(schema_editor):
+    for column, target in FOREIGN_KEYS.items():
+        schema_editor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{column}_fk FOREIGN KEY ({column})"
+            f" REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        schema_editor.execute(f"CREATE INDEX {TABLE}_{column}_idx ON {TABLE} ({column})")
+    schema_editor.execute(f"CREATE INDEX cash_flow_c_created_6da423_idx ON {TABLE} (created_at)")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=ZoneInfo(settings.TIME_ZONE))
+
+
+def next_month(value):
+    return month_start(datetime(value.year + value.month // 12, value.month % 12 + 1, 1))
+
+
+def partition_table(apps, schema_editor):
+    schema_editor.execute(f"LOCK TABLE {TABLE} IN EXCLUSIVE MODE")
+    schema_editor.execute(
+        f"CREATE TABLE {STAGING} (id bigint NOT NULL, {COLUMN_DEFINITIONS},"
+        " PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"
+    )
+    schema_editor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {STAGING} DEFAULT")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(created_at) FROM {TABLE}")
+        first = cursor.fetchone()[0]
+    now = timezone.localtime()
+    start = month_start(timezone.localtime(first) if first else now)
+    last = month_start(now)
+    for _ in range(MONTHS_AHEAD):
+        last = next_month(last)
+    while start <= last:
+        end = next_month(start)
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE}_p{start:%Y_%m} PARTITION OF {STAGING}"
+            f" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        start = end
+
+    schema_editor.execute(f"INSERT INTO {STAGING} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}")
+    schema_editor.execute(f"DROP TABLE {TABLE}")
+    schema_editor.execute(f"ALTER TABLE {STAGING} RENAME TO {TABLE}")
+    schema_editor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {STAGING}_pkey TO {TABLE}_pkey")
+    schema_editor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    schema_editor.execute(
+        f"SELECT setval('{TABLE}_id_seq', COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {TABLE}"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')"
+    )
+    add_foreign_keys_and_indexes(schema_editor)
+
+
+def merge_partitions(apps, schema_editor):
+    schema_editor.execute(f"LOCK TABLE {TABLE} IN EXCLUSIVE MODE")
+    schema_editor.execute(
+        f"CREATE TABLE {STAGING} (id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,"
+        f" {COLUMN_DEFINITIONS})"
+    )
+    schema_editor.execute(f"INSERT INTO {STAGING} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}")
+    schema_editor.execute(f"DROP TABLE {TABLE}")
+    schema_editor.execute(f"ALTER TABLE {STAGING} RENAME TO {TABLE}")
+    schema_editor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {STAGING}_pkey TO {TABLE}_pkey")
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 1),"
+        f" MAX(id) IS NOT NULL) FROM {TABLE}"
+    )
+    add_foreign_keys_and_indexes(schema_editor)
+
+
+# Range-partitions cash_flow_cashflow by month of created_at. The model state does
+# not change: Django keeps treating id as the primary key, while the database key is
+# (id, created_at) as partitioning requires.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0004_data_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, merge_partitions),
+    ]
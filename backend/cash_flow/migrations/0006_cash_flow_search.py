@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0005_partition_cash_flow'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='cashflow',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('comment', config='russian'), '||', django.contrib.postgres.search.SearchVector('comment', config='english'), django.contrib.postgres.search.SearchConfig('russian')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='cash_flow_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('comment', name='gin_trgm_ops'), name='cash_flow_comment_trgm_idx'),
+        ),
+    ]
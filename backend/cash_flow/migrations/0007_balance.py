@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.migrations.state import Apps
+
+
+def mark_expense_types(apps: Apps, schema_editor):
+    CashFlowType = apps.get_model('cash_flow', 'CashFlowType')
+    CashFlowType.objects.filter(name='Списание').update(sign=-1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0006_cash_flow_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashflowtype',
+            name='sign',
+            field=models.SmallIntegerField(choices=[(1, 'Income'), (-1, 'Expense')], default=1),
+        ),
+        migrations.RunPython(mark_expense_types, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cash_flow.status')),
+            ],
+            options={
+                'verbose_name': 'Balance snapshot',
+                'verbose_name_plural': 'Balance snapshots',
+                'constraints': [models.UniqueConstraint(fields=('status', 'day'), name='balance_snapshot_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:55
+
+import django.db.models.functions.datetime
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.migrations.state import Apps
+
+
+def backfill_updated_at(apps: Apps, schema_editor):
+    CashFlow = apps.get_model('cash_flow', 'CashFlow')
+    CashFlow.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0007_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cash_flow_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cash flow tombstone',
+                'verbose_name_plural': 'Cash flow tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='cashflow',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['updated_at', 'id'], name='cash_flow_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflowtombstone',
+            index=models.Index(fields=['deleted_at', 'cash_flow_id'], name='cash_flow_tombstone_idx'),
+        ),
+    ]
@@ -0,0 +1,170 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = "cash_flow_cashflow"
+DICTIONARIES = {
+    "status": "cash_flow_status",
+    "cash_flow_type": "cash_flow_cashflowtype",
+    "category": "cash_flow_category",
+    "subcategory": "cash_flow_subcategory",
+}
+RELATED_MODELS = {
+    "status": "cash_flow.status",
+    "cash_flow_type": "cash_flow.cashflowtype",
+    "category": "cash_flow.category",
+    "subcategory": "cash_flow.subcategory",
+}
+
+
+# The <dictionary>_name columns copy the names of the referenced dictionary rows.
+# A BEFORE trigger on the (partitioned) cash flow table looks them up on every
+# insert and update, whatever the writer: ORM, bulk writes, the COPY of the
+# import. An AFTER trigger on every dictionary table rewrites the copies of a
+# renamed row in the same transaction. Partitions attached later inherit the
+# trigger of the parent table.
+def create_triggers(apps, schema_editor):
+    lookups = "\n".join(
+        f"    NEW.{name}_name := COALESCE((SELECT name FROM {table} WHERE id = NEW.{name}_id), '');"
+        for name, table in DICTIONARIES.items()
+    )
+    schema_editor.execute(
+        "CREATE FUNCTION cash_flow_set_names() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        f"BEGIN\n{lookups}\n    RETURN NEW;\nEND\n$$"
+    )
+    schema_editor.execute(
+        "CREATE FUNCTION cash_flow_dictionary_renamed() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        "BEGIN\n"
+        f"    EXECUTE format('UPDATE {TABLE} SET %I = $1 WHERE %I = $2',"
+        " TG_ARGV[0] || '_name', TG_ARGV[0] || '_id') USING NEW.name, NEW.id;\n"
+        "    RETURN NULL;\n"
+        "END\n$$"
+    )
+    # Fill the existing rows in one pass before the per-row trigger exists
+    schema_editor.execute(f"LOCK TABLE {TABLE} IN SHARE ROW EXCLUSIVE MODE")
+    schema_editor.execute(
+        f"UPDATE {TABLE} AS c SET "
+        + ", ".join(f"{name}_name = {name}.name" for name in DICTIONARIES)
+        + " FROM "
+        + ", ".join(f"{table} AS {name}" for name, table in DICTIONARIES.items())
+        + " WHERE "
+        + " AND ".join(f"{name}.id = c.{name}_id" for name in DICTIONARIES)
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER cash_flow_set_names BEFORE INSERT OR UPDATE ON {TABLE}"
+        " FOR EACH ROW EXECUTE FUNCTION cash_flow_set_names()"
+    )
+    for name, table in DICTIONARIES.items():
+        schema_editor.execute(
+            f"CREATE TRIGGER cash_flow_renamed AFTER UPDATE OF name ON {table}"
+            " FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)"
+            f" EXECUTE FUNCTION cash_flow_dictionary_renamed('{name}')"
+        )
+
+
+def drop_triggers(apps, schema_editor):
+    for table in DICTIONARIES.values():
+        schema_editor.execute(f"DROP TRIGGER cash_flow_renamed ON {table}")
+    schema_editor.execute(f"DROP TRIGGER cash_flow_set_names ON {TABLE}")
+    schema_editor.execute("DROP FUNCTION cash_flow_dictionary_renamed()")
+    schema_editor.execute("DROP FUNCTION cash_flow_set_names()")
+
+
+def drop_foreign_key_index(name):
+    # Migration 0005 created the foreign key indexes by hand; the composite
+    # (dictionary, created_at, id) indexes below take over their lookups
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[
+            migrations.RunSQL(
+                f"DROP INDEX {TABLE}_{name}_id_idx",
+                f"CREATE INDEX {TABLE}_{name}_id_idx ON {TABLE} ({name}_id)",
+            ),
+        ],
+        state_operations=[
+            migrations.AlterField(
+                model_name='cashflow',
+                name=name,
+                field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=RELATED_MODELS[name]),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0008_cash_flow_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashflow',
+            name='cash_flow_type_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='cashflow',
+            name='category_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='cashflow',
+            name='status_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='cashflow',
+            name='subcategory_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+        drop_foreign_key_index('cash_flow_type'),
+        drop_foreign_key_index('category'),
+        drop_foreign_key_index('status'),
+        drop_foreign_key_index('subcategory'),
+        migrations.RemoveIndex(
+            model_name='cashflow',
+            name='cash_flow_c_created_6da423_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['created_at', 'id'], name='cash_flow_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['amount', 'id'], name='cash_flow_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['status_name', 'id'], name='cash_flow_status_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['cash_flow_type_name', 'id'], name='cash_flow_type_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['category_name', 'id'], name='cash_flow_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['subcategory_name', 'id'], name='cash_flow_subcategory_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='cash_flow_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['cash_flow_type', 'created_at', 'id'], name='cash_flow_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='cash_flow_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['subcategory', 'created_at', 'id'], name='cash_flow_subcat_created_idx'),
+        ),
+    ]
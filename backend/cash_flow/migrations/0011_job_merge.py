@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('export', 'Export'), ('pivot', 'Pivot report'), ('rollup_rebuild', 'Rollup rebuild'), ('merge', 'Dictionary merge')], max_length=20),
+        ),
+    ]
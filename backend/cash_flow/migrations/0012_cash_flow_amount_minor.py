@@ -0,0 +1,71 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+TABLE = "cash_flow_cashflow"
+
+# Cash flow amounts move from numeric(10, 2) to a BIGINT of minor units in three
+# steps that keep the table online:
+# 0012 (expand) adds the nullable amount_minor column and a trigger that keeps
+#      both columns in sync, whichever one a writer sets;
+# 0013 (backfill) fills amount_minor in small batches, then adds its NOT NULL,
+#      check constraint and index without long locks, and switches the model;
+# 0014 (contract) drops the numeric column and the trigger.
+# Adding or dropping a column and the trigger only touch the catalog. To upgrade
+# several instances without downtime, run `migrate cash_flow 0013`, roll out the
+# new code, then run `migrate`.
+SYNC_FUNCTION = (
+    "CREATE FUNCTION cash_flow_sync_amount() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+    "BEGIN\n"
+    "    IF NEW.amount_minor IS NOT NULL\n"
+    "            AND (TG_OP = 'INSERT' OR NEW.amount_minor IS DISTINCT FROM OLD.amount_minor) THEN\n"
+    "        -- Written in minor units: keep the numeric amount for the old code,\n"
+    "        -- as far as numeric(10, 2) holds it\n"
+    "        NEW.amount := CASE WHEN NEW.amount_minor < 10000000000 THEN NEW.amount_minor / 100.0 END;\n"
+    "    ELSIF NEW.amount IS NOT NULL THEN\n"
+    "        NEW.amount_minor := round(NEW.amount * 100);\n"
+    "    END IF;\n"
+    "    RETURN NEW;\n"
+    "END\n$$"
+)
+
+
+def add_amount_minor(apps, schema_editor):
+    schema_editor.execute(f"ALTER TABLE {TABLE} ADD COLUMN amount_minor bigint")
+    # Rows written in minor units may exceed numeric(10, 2)
+    schema_editor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN amount DROP NOT NULL")
+    schema_editor.execute(SYNC_FUNCTION)
+    schema_editor.execute(
+        f"CREATE TRIGGER cash_flow_sync_amount BEFORE INSERT OR UPDATE ON {TABLE}"
+        " FOR EACH ROW EXECUTE FUNCTION cash_flow_sync_amount()"
+    )
+
+
+def drop_amount_minor(apps, schema_editor):
+    schema_editor.execute(f"DROP TRIGGER cash_flow_sync_amount ON {TABLE}")
+    schema_editor.execute("DROP FUNCTION cash_flow_sync_amount()")
+    schema_editor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN amount SET NOT NULL")
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP COLUMN amount_minor")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0011_job_merge'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_amount_minor, drop_amount_minor),
+        # Wider totals for the larger amounts; raising the precision of a
+        # numeric column does not rewrite the table
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=20),
+        ),
+        migrations.AlterField(
+            model_name='cashflowrollup',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=20),
+        ),
+    ]
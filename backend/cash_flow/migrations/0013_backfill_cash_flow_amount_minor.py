@@ -0,0 +1,139 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:29
+
+import cash_flow.models
+from django.db import migrations, models
+
+TABLE = "cash_flow_cashflow"
+INDEX = "cash_flow_amount_minor_idx"
+# Rows filled per transaction; each batch locks only its own rows
+BATCH_SIZE = 10000
+
+
+# Every statement commits on its own (the migration is not atomic), so the
+# backfill never holds locks for long and a failed run can simply be repeated.
+def backfill(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(id), max(id) FROM {TABLE}")
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        for start in range(low, high + 1, BATCH_SIZE):
+            # The id prefix of the (id, created_at) primary key finds the batch
+            cursor.execute(
+                f"UPDATE {TABLE} SET amount_minor = round(amount * 100)"
+                " WHERE id >= %s AND id < %s AND amount_minor IS NULL",
+                [start, start + BATCH_SIZE],
+            )
+
+
+def constraint_exists(cursor, name):
+    cursor.execute(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s",
+        [TABLE, name],
+    )
+    return cursor.fetchone() is not None
+
+
+def add_constraints(apps, schema_editor):
+    # NOT VALID constraints are added without a scan; VALIDATE scans under a lock
+    # that lets reads and writes go on. SET NOT NULL then relies on the validated
+    # check instead of scanning again.
+    with schema_editor.connection.cursor() as cursor:
+        if not constraint_exists(cursor, "amount_minor_not_null"):
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT amount_minor_not_null"
+                " CHECK (amount_minor IS NOT NULL) NOT VALID"
+            )
+        cursor.execute(f"ALTER TABLE {TABLE} VALIDATE CONSTRAINT amount_minor_not_null")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN amount_minor SET NOT NULL")
+        cursor.execute(f"ALTER TABLE {TABLE} DROP CONSTRAINT amount_minor_not_null")
+        # The model's constraint name moves to the new column
+        if not constraint_exists(cursor, "amount_numeric_must_be_positive"):
+            cursor.execute(
+                f"ALTER TABLE {TABLE} RENAME CONSTRAINT amount_must_be_positive"
+                " TO amount_numeric_must_be_positive"
+            )
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT amount_must_be_positive"
+                " CHECK (amount_minor > 0) NOT VALID"
+            )
+        cursor.execute(f"ALTER TABLE {TABLE} VALIDATE CONSTRAINT amount_must_be_positive")
+
+
+def drop_constraints(apps, schema_editor):
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP CONSTRAINT amount_must_be_positive")
+    schema_editor.execute(
+        f"ALTER TABLE {TABLE} RENAME CONSTRAINT amount_numeric_must_be_positive"
+        " TO amount_must_be_positive"
+    )
+    schema_editor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN amount_minor DROP NOT NULL")
+
+
+def add_index(apps, schema_editor):
+    # CREATE INDEX CONCURRENTLY does not work on a partitioned table: the parent
+    # index is created invalid and empty, each partition's index concurrently,
+    # and the parent index becomes valid once all of them are attached.
+    # Partitions created later get the index from the parent.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY {TABLE} (amount_minor, id)")
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = %s::regclass ORDER BY 1",
+            [TABLE],
+        )
+        for (partition,) in cursor.fetchall():
+            name = f"{partition}_amount_minor_idx"
+            # An index left invalid by an interrupted run is built again
+            cursor.execute(
+                "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid",
+                [name],
+            )
+            if cursor.fetchone():
+                cursor.execute(f"DROP INDEX CONCURRENTLY {name}")
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {partition} (amount_minor, id)"
+            )
+            cursor.execute(
+                "SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass", [name]
+            )
+            if not cursor.fetchone():
+                cursor.execute(f"ALTER INDEX {INDEX} ATTACH PARTITION {name}")
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX {INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cash_flow', '0012_cash_flow_amount_minor'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_constraints, drop_constraints),
+                migrations.RunPython(add_index, drop_index),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='cashflow',
+                    name='amount',
+                    field=cash_flow.models.MinorUnitsField(db_column='amount_minor'),
+                ),
+                # The numeric column's index goes with the column in 0014
+                migrations.RemoveIndex(
+                    model_name='cashflow',
+                    name='cash_flow_amount_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='cashflow',
+                    index=models.Index(fields=['amount', 'id'], name='cash_flow_amount_minor_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:30
+
+from django.db import migrations
+
+TABLE = "cash_flow_cashflow"
+SYNC_FUNCTION = (
+    "CREATE FUNCTION cash_flow_sync_amount() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+    "BEGIN\n"
+    "    IF NEW.amount_minor IS NOT NULL\n"
+    "            AND (TG_OP = 'INSERT' OR NEW.amount_minor IS DISTINCT FROM OLD.amount_minor) THEN\n"
+    "        NEW.amount := CASE WHEN NEW.amount_minor < 10000000000 THEN NEW.amount_minor / 100.0 END;\n"
+    "    ELSIF NEW.amount IS NOT NULL THEN\n"
+    "        NEW.amount_minor := round(NEW.amount * 100);\n"
+    "    END IF;\n"
+    "    RETURN NEW;\n"
+    "END\n$$"
+)
+
+
+# The contract step of the move to minor units (see 0012): once no instance reads
+# the numeric column any more, drop it with its index, its check constraint and
+# the trigger that kept it in sync. Dropping a column only marks it in the
+# catalog; the space is reclaimed as rows are rewritten.
+def drop_numeric_amount(apps, schema_editor):
+    schema_editor.execute(f"DROP TRIGGER cash_flow_sync_amount ON {TABLE}")
+    schema_editor.execute("DROP FUNCTION cash_flow_sync_amount()")
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP COLUMN amount")
+
+
+def restore_numeric_amount(apps, schema_editor):
+    schema_editor.execute(f"ALTER TABLE {TABLE} ADD COLUMN amount numeric(10, 2)")
+    schema_editor.execute(SYNC_FUNCTION)
+    schema_editor.execute(
+        f"CREATE TRIGGER cash_flow_sync_amount BEFORE INSERT OR UPDATE ON {TABLE}"
+        " FOR EACH ROW EXECUTE FUNCTION cash_flow_sync_amount()"
+    )
+    schema_editor.execute(
+        f"UPDATE {TABLE} SET amount = amount_minor / 100.0 WHERE amount_minor < 10000000000"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT amount_numeric_must_be_positive CHECK (amount > 0)"
+    )
+    schema_editor.execute(f"CREATE INDEX cash_flow_amount_idx ON {TABLE} (amount, id)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0013_backfill_cash_flow_amount_minor'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_numeric_amount, restore_numeric_amount),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+TABLE = "cash_flow_cashflow"
+DICTIONARIES = {
+    "status": "cash_flow_status",
+    "cash_flow_type": "cash_flow_cashflowtype",
+    "category": "cash_flow_category",
+    "subcategory": "cash_flow_subcategory",
+}
+REFERENCES = ", ".join(f"{name}_id" for name in DICTIONARIES)
+
+
+# A rename rewrote the name copies of every referencing cash flow in one UPDATE
+# inside its own transaction. The copies of a renamed row are now rewritten in
+# batches by a job (see renames.py), so the trigger on the dictionary tables goes.
+# The lookup trigger on the cash flows only runs when a reference is written,
+# so the batches that set the names themselves skip its four lookups per row.
+def use_rename_jobs(apps, schema_editor):
+    for table in DICTIONARIES.values():
+        schema_editor.execute(f"DROP TRIGGER cash_flow_renamed ON {table}")
+    schema_editor.execute("DROP FUNCTION cash_flow_dictionary_renamed()")
+    schema_editor.execute(f"DROP TRIGGER cash_flow_set_names ON {TABLE}")
+    schema_editor.execute(
+        f"CREATE TRIGGER cash_flow_set_names BEFORE INSERT OR UPDATE OF {REFERENCES} ON {TABLE}"
+        " FOR EACH ROW EXECUTE FUNCTION cash_flow_set_names()"
+    )
+
+
+def use_rename_triggers(apps, schema_editor):
+    schema_editor.execute(f"DROP TRIGGER cash_flow_set_names ON {TABLE}")
+    schema_editor.execute(
+        f"CREATE TRIGGER cash_flow_set_names BEFORE INSERT OR UPDATE ON {TABLE}"
+        " FOR EACH ROW EXECUTE FUNCTION cash_flow_set_names()"
+    )
+    schema_editor.execute(
+        "CREATE FUNCTION cash_flow_dictionary_renamed() RETURNS trigger LANGUAGE plpgsql AS $$\n"
+        "BEGIN\n"
+        f"    EXECUTE format('UPDATE {TABLE} SET %I = $1 WHERE %I = $2',"
+        " TG_ARGV[0] || '_name', TG_ARGV[0] || '_id') USING NEW.name, NEW.id;\n"
+        "    RETURN NULL;\n"
+        "END\n$$"
+    )
+    for name, table in DICTIONARIES.items():
+        schema_editor.execute(
+            f"CREATE TRIGGER cash_flow_renamed AFTER UPDATE OF name ON {table}"
+            " FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)"
+            f" EXECUTE FUNCTION cash_flow_dictionary_renamed('{name}')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0014_drop_cash_flow_amount_numeric'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_rename_jobs, use_rename_triggers),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('export', 'Export'), ('pivot', 'Pivot report'), ('rollup_rebuild', 'Rollup rebuild'), ('merge', 'Dictionary merge'), ('rename', 'Dictionary rename')], max_length=20),
+        ),
+    ]
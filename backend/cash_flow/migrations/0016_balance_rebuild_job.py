@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:40
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+SNAPSHOTS = "cash_flow_balancesnapshot"
+ROLLUP = "cash_flow_cashflowrollup"
+TYPES = "cash_flow_cashflowtype"
+
+
+# 0007 created the snapshot table empty, so until the first cash_flow_balances run
+# every balance summed the whole rollup history. Take the snapshots up to yesterday
+# here, the way balance.take() does; the daily command carries on from them.
+def take_balance_snapshots(apps, schema_editor):
+    until = timezone.localdate() - timedelta(days=1)
+    schema_editor.execute(f"LOCK TABLE {ROLLUP} IN SHARE MODE")
+    schema_editor.execute(
+        f"INSERT INTO {SNAPSHOTS} (day, status_id, balance)"
+        " SELECT d.day, d.status_id, COALESCE(last.balance, 0)"
+        " + SUM(d.delta) OVER (PARTITION BY d.status_id ORDER BY d.day) FROM ("
+        " SELECT r.day, r.status_id, SUM(r.total * t.sign) AS delta"
+        f" FROM {ROLLUP} r JOIN {TYPES} t ON t.id = r.cash_flow_type_id"
+        " WHERE r.day <= %s AND r.day > COALESCE("
+        f" (SELECT MAX(s.day) FROM {SNAPSHOTS} s WHERE s.status_id = r.status_id),"
+        " '-infinity'::date) GROUP BY 1, 2) AS d"
+        " LEFT JOIN LATERAL ("
+        f" SELECT s.balance FROM {SNAPSHOTS} s WHERE s.status_id = d.status_id"
+        " ORDER BY s.day DESC LIMIT 1) AS last ON TRUE",
+        [until],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cash_flow', '0015_dictionary_rename_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(take_balance_snapshots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('export', 'Export'), ('pivot', 'Pivot report'), ('rollup_rebuild', 'Rollup rebuild'), ('merge', 'Dictionary merge'), ('rename', 'Dictionary rename'), ('balance_rebuild', 'Balance rebuild')], max_length=20),
+        ),
+    ]
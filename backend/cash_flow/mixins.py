@@ -0,0 +1,88 @@
+from collections.abc import Callable
+from functools import update_wrapper
+from typing import Any
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpRequest
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from . import replicas
+
+
+class AsyncReadMixin:
+    """Serve the read actions of a viewset natively async under ASGI.
+
+    ``as_view`` returns a coroutine view: ``list`` and ``retrieve`` are dispatched
+    to ``alist``/``aretrieve`` on the event loop, every other action runs the
+    regular synchronous view in a thread, as Django does for sync views. The
+    async path is switched off with ``CASH_FLOW_ASYNC_READS = False``.
+
+    Authentication of the read actions is lazy (see ``perform_authentication``),
+    so ``initial`` and the rest of their DRF request cycle run without database
+    access.
+    """
+
+    async_actions = frozenset({"list", "retrieve"})
+
+    @classmethod
+    def as_view(cls, actions: dict[str, str] | None = None, **initkwargs: Any) -> Callable:
+        """Wrap the DRF view into a coroutine view when it maps a read action"""
+        view = super().as_view(actions, **initkwargs)
+        if not cls.async_actions.intersection(view.actions.values()):
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request: HttpRequest, *args: Any, **kwargs: Any) -> Response:
+            action = view.actions.get(request.method.lower())
+            if action not in cls.async_actions or not settings.CASH_FLOW_ASYNC_READS:
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**view.initkwargs)
+            self.action_map = view.actions
+            for method, name in view.actions.items():
+                setattr(self, method, getattr(self, name))
+            self.request = request
+            return await self.adispatch(request, *args, **kwargs)
+
+        update_wrapper(async_view, view)
+        return markcoroutinefunction(async_view)
+
+    async def adispatch(self, request: HttpRequest, *args: Any, **kwargs: Any) -> Response:
+        """Async counterpart of ``APIView.dispatch`` for the read actions"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            self.initial(request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:  # noqa: BLE001
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def perform_authentication(self, request: Request) -> None:
+        """Authenticate the read actions lazily, on the first access to
+        ``request.user``; the other actions authenticate up front"""
+        if self.action not in self.async_actions:
+            super().perform_authentication(request)
+
+
+class ReplicaReadMixin:
+    """Read from a replica database in the ``replica_actions`` of the view.
+
+    Actions are viewset actions, or lowercase HTTP methods for plain API views.
+    See replicas.py for when the reads stay on the primary anyway.
+    """
+
+    replica_actions: frozenset[str] = frozenset()
+
+    def initial(self, request: Request, *args: Any, **kwargs: Any) -> None:
+        """Switch the request's reads to a replica before the handler runs"""
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, "action", request.method.lower())
+        if action in self.replica_actions:
+            replicas.use_replica()
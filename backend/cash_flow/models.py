@@ -1,4 +1,73 @@
-from django.db import models
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from django import forms
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+
+# Text search configurations of the comment index: the comments are mostly Russian
+# with English words mixed in
+SEARCH_CONFIGS = ("russian", "english")
+# Digits of a cash flow amount, two of them after the point, and the largest amount
+AMOUNT_MAX_DIGITS = 15
+MAX_AMOUNT = Decimal("9999999999999.99")
+# Digits of the sums of amounts: rollup totals and balances
+TOTAL_MAX_DIGITS = 20
+
+
+def to_minor_units(amount: Decimal | int | str) -> int:
+    """Return an amount as a whole number of minor units (kopecks)"""
+    return int(Decimal(str(amount)).scaleb(2).to_integral_value())
+
+
+def from_minor_units(value: Decimal | int) -> Decimal:
+    """Return a number of minor units as an amount with two decimal places"""
+    return Decimal(value).scaleb(-2)
+
+
+class MinorUnitsField(models.BigIntegerField):
+    """Amount of money stored as a BIGINT number of minor units.
+
+    Python code, forms and lookups see Decimals with two decimal places, as with
+    a ``DecimalField``; the database sums integers, which is much faster than
+    numeric arithmetic, and an amount is not capped by a numeric precision.
+    Raw SQL reads the column in minor units.
+    """
+
+    def from_db_value(self, value: Any, expression: Any, connection: Any) -> Decimal | None:  # noqa: ANN401, ARG002
+        """Convert minor units, also a SUM of them, to an amount"""
+        return None if value is None else from_minor_units(value)
+
+    def to_python(self, value: Any) -> Decimal | None:  # noqa: ANN401
+        """Return the amount as a Decimal"""
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value))
+        except InvalidOperation as exc:
+            raise ValidationError(
+                self.error_messages["invalid"], code="invalid", params={"value": value}
+            ) from exc
+
+    def get_prep_value(self, value: Any) -> int | None:  # noqa: ANN401
+        """Convert an amount to minor units"""
+        value = super(models.IntegerField, self).get_prep_value(value)
+        return None if value is None else to_minor_units(value)
+
+    def formfield(self, **kwargs: Any) -> forms.Field:
+        """Edit the amount as a decimal number"""
+        return super(models.IntegerField, self).formfield(
+            **{
+                "form_class": forms.DecimalField,
+                "max_digits": AMOUNT_MAX_DIGITS,
+                "decimal_places": 2,
+                **kwargs,
+            }
+        )
 
 
 class Status(models.Model):
@@ -17,7 +86,14 @@ class Status(models.Model):
 class CashFlowType(models.Model):
     """Тип движения денежных средств"""
 
+    class Sign(models.IntegerChoices):
+        """Направление движения: как сумма входит в остаток"""
+
+        INCOME = 1, "Income"
+        EXPENSE = -1, "Expense"
+
     name = models.CharField(max_length=100, unique=True)
+    sign = models.SmallIntegerField(choices=Sign, default=Sign.INCOME)
 
     class Meta:
         verbose_name = "Cash flow type"
@@ -69,29 +145,74 @@ class CashFlow(models.Model):
     status = models.ForeignKey(
         Status,
         on_delete=models.PROTECT,
+        db_index=False,
     )
     cash_flow_type = models.ForeignKey(
         CashFlowType,
         on_delete=models.PROTECT,
+        db_index=False,
     )
     category = models.ForeignKey(
         Category,
         on_delete=models.PROTECT,
+        db_index=False,
     )
     subcategory = models.ForeignKey(
         Subcategory,
         on_delete=models.PROTECT,
+        db_index=False,
     )
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Minor units in amount_minor (migrations 0012-0014 moved the amounts there
+    # from the numeric(10, 2) amount column)
+    amount = MinorUnitsField(db_column="amount_minor")
     created_at = models.DateTimeField(auto_now_add=True)
+    # The database default covers the raw INSERTs of the CSV import
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
     comment = models.TextField(blank=True, default="")
+    # Copies of the dictionary names, so orderings by name are served by indexes.
+    # A database trigger sets them on every write and on every dictionary rename
+    # (see migration 0009); the values assigned here are ignored.
+    status_name = models.CharField(max_length=100, default="", editable=False)
+    cash_flow_type_name = models.CharField(max_length=100, default="", editable=False)
+    category_name = models.CharField(max_length=100, default="", editable=False)
+    subcategory_name = models.CharField(max_length=100, default="", editable=False)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("comment", config=SEARCH_CONFIGS[0])
+        + SearchVector("comment", config=SEARCH_CONFIGS[1]),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         verbose_name = "Cash flow"
         verbose_name_plural = "Cash flows"
         ordering = ["-created_at"]
+        # Every ordering of the list ends with id (see CashFlowOrderingFilter): the
+        # (key, id) indexes serve unfiltered and date range listings in any
+        # ordering, the (dictionary, created_at, id) ones a dictionary filter in
+        # date ordering. They also back the foreign key lookups.
         indexes = [
-            models.Index(fields=["created_at"]),
+            models.Index(fields=["created_at", "id"], name="cash_flow_created_at_idx"),
+            models.Index(fields=["amount", "id"], name="cash_flow_amount_minor_idx"),
+            models.Index(fields=["status_name", "id"], name="cash_flow_status_name_idx"),
+            models.Index(fields=["cash_flow_type_name", "id"], name="cash_flow_type_name_idx"),
+            models.Index(fields=["category_name", "id"], name="cash_flow_category_name_idx"),
+            models.Index(fields=["subcategory_name", "id"], name="cash_flow_subcategory_name_idx"),
+            models.Index(
+                fields=["status", "created_at", "id"], name="cash_flow_status_created_idx"
+            ),
+            models.Index(
+                fields=["cash_flow_type", "created_at", "id"], name="cash_flow_type_created_idx"
+            ),
+            models.Index(
+                fields=["category", "created_at", "id"], name="cash_flow_category_created_idx"
+            ),
+            models.Index(
+                fields=["subcategory", "created_at", "id"], name="cash_flow_subcat_created_idx"
+            ),
+            models.Index(fields=["updated_at", "id"], name="cash_flow_updated_at_idx"),
+            GinIndex(fields=["search_vector"], name="cash_flow_search_vector_idx"),
+            GinIndex(OpClass("comment", name="gin_trgm_ops"), name="cash_flow_comment_trgm_idx"),
         ]
         constraints = [
             models.CheckConstraint(
@@ -105,3 +226,157 @@ class CashFlow(models.Model):
             f"{self.amount} | {self.cash_flow_type} | {self.category}"
             f" | {self.subcategory} | {self.status} | {self.created_at}"
         )
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """Save the row and its rollup changes (see signals.py) in one transaction"""
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+
+class DataVersion(models.Model):
+    """Счётчик версии данных для согласованной инвалидации кэшей между процессами"""
+
+    key = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Data version"
+        verbose_name_plural = "Data versions"
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.version}"
+
+
+class CashFlowRollup(models.Model):
+    """Дневные итоги движения денежных средств"""
+
+    day = models.DateField()
+    status = models.ForeignKey(
+        Status,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    cash_flow_type = models.ForeignKey(
+        CashFlowType,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    subcategory = models.ForeignKey(
+        Subcategory,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    total = models.DecimalField(max_digits=TOTAL_MAX_DIGITS, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Cash flow rollup"
+        verbose_name_plural = "Cash flow rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "status", "cash_flow_type", "category", "subcategory"],
+                name="cash_flow_rollup_key",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} | {self.total} ({self.count})"
+
+
+class BalanceSnapshot(models.Model):
+    """Остаток по статусу на конец дня"""
+
+    day = models.DateField()
+    status = models.ForeignKey(
+        Status,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    balance = models.DecimalField(max_digits=TOTAL_MAX_DIGITS, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Balance snapshot"
+        verbose_name_plural = "Balance snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=["status", "day"], name="balance_snapshot_key"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} | {self.status_id}: {self.balance}"
+
+
+class CashFlowTombstone(models.Model):
+    """Удалённое движение денежных средств для инкрементальной синхронизации"""
+
+    cash_flow_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Cash flow tombstone"
+        verbose_name_plural = "Cash flow tombstones"
+        indexes = [
+            models.Index(fields=["deleted_at", "cash_flow_id"], name="cash_flow_tombstone_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.cash_flow_id} | {self.deleted_at}"
+
+
+class Job(models.Model):
+    """Фоновая задача: экспорт, отчёт или обслуживание данных (см. jobs.py)"""
+
+    class Kind(models.TextChoices):
+        """Что делает задача"""
+
+        EXPORT = "export", "Export"
+        PIVOT = "pivot", "Pivot report"
+        ROLLUP_REBUILD = "rollup_rebuild", "Rollup rebuild"
+        MERGE = "merge", "Dictionary merge"
+        RENAME = "rename", "Dictionary rename"
+        BALANCE_REBUILD = "balance_rebuild", "Balance rebuild"
+
+    class State(models.TextChoices):
+        """Состояние задачи в очереди"""
+
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        SUCCEEDED = "succeeded", "Succeeded"
+        FAILED = "failed", "Failed"
+
+    kind = models.CharField(max_length=20, choices=Kind)
+    params = models.JSONField(default=dict, blank=True)
+    # Kind, parameters and data versions at submission; equal jobs share results
+    fingerprint = models.CharField(max_length=64)
+    state = models.CharField(max_length=10, choices=State, default=State.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    processed = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    result = models.FileField(upload_to="jobs/", blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(
+                fields=["run_after", "id"],
+                condition=models.Q(state="queued"),
+                name="cash_flow_job_queue_idx",
+            ),
+            models.Index(fields=["fingerprint"], name="cash_flow_job_fingerprint_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.pk}: {self.state}"
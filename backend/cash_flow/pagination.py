@@ -0,0 +1,393 @@
+import base64
+import binascii
+import json
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+
+class StandardResultsSetPagination(pagination.PageNumberPagination):
+    """Page number pagination with a client-selectable page size"""
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose ``count`` avoids a full ``COUNT(*)``.
+
+    Unfiltered querysets use the planner estimate from ``pg_class.reltuples``;
+    filtered ones count at most ``cap`` rows. ``count_exact`` tells whether the
+    count is exact. Small tables and ``exact=True`` are counted exactly.
+    """
+
+    def __init__(
+        self,
+        object_list: QuerySet,
+        per_page: int,
+        *,
+        cap: int,
+        exact: bool = False,
+    ) -> None:
+        """Paginate ``object_list``; counts above ``cap`` are estimated or capped"""
+        super().__init__(object_list, per_page)
+        self.cap = cap
+        self.exact = exact
+        self.count_exact = True
+
+    def page(self, number: Any) -> Page:  # noqa: ANN401
+        """Return the page, raising the count cap so the requested page stays reachable"""
+        if isinstance(number, int) or (isinstance(number, str) and number.isdigit()):
+            self.cap = max(self.cap, int(number) * self.per_page + 1)
+        return super().page(number)
+
+    @cached_property
+    def count(self) -> int:
+        """Exact, estimated or capped number of rows"""
+        queryset = self.object_list
+        if self.exact:
+            return super().count
+        if not queryset.query.has_filters():
+            estimate = _estimated_rows(queryset)
+            if estimate > self.cap:
+                self.count_exact = False
+                return estimate
+            return super().count
+        count = queryset.order_by()[: self.cap + 1].count()
+        if count > self.cap:
+            self.count_exact = False
+            return self.cap
+        return count
+
+    async def aprepare(self, number: Any) -> None:  # noqa: ANN401
+        """Compute ``count`` with the async ORM ahead of ``page(number)``"""
+        if isinstance(number, int) or (isinstance(number, str) and number.isdigit()):
+            self.cap = max(self.cap, int(number) * self.per_page + 1)
+        if "count" not in self.__dict__:
+            self.__dict__["count"] = await self._acount()
+
+    async def _acount(self) -> int:
+        queryset = self.object_list
+        if self.exact:
+            return await queryset.acount()
+        if not queryset.query.has_filters():
+            estimate = await sync_to_async(_estimated_rows)(queryset)
+            if estimate > self.cap:
+                self.count_exact = False
+                return estimate
+            return await queryset.acount()
+        count = await queryset.order_by()[: self.cap + 1].acount()
+        if count > self.cap:
+            self.count_exact = False
+            return self.cap
+        return count
+
+
+class EstimatedCountPagination(StandardResultsSetPagination):
+    """Page number pagination with estimated or capped counts.
+
+    The response has ``count_exact: false`` when the count is an estimate
+    (unfiltered listing) or a lower bound (filtered listing capped at
+    ``CASH_FLOW_COUNT_CAP`` rows). ``?exact_count=true`` requests an exact count.
+    """
+
+    exact_count_query_param = "exact_count"
+
+    def django_paginator_class(self, queryset: QuerySet, page_size: int) -> Paginator:
+        """Build the paginator for the current request"""
+        value = self.request.query_params.get(self.exact_count_query_param, "")
+        return EstimatedCountPaginator(
+            queryset,
+            page_size,
+            cap=settings.CASH_FLOW_COUNT_CAP,
+            exact=value.lower() in {"1", "true", "yes"},
+        )
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,  # noqa: ARG002
+    ) -> list[Any] | None:
+        """Async counterpart of ``paginate_queryset``: count and page rows are
+        fetched with the async ORM"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        number = request.query_params.get(self.page_query_param) or 1
+        await paginator.aprepare(number)
+        if number in self.last_page_strings:
+            number = paginator.num_pages
+        try:
+            self.page = paginator.page(number)
+        except InvalidPage as exc:
+            message = self.invalid_page_message.format(page_number=number, message=str(exc))
+            raise NotFound(message) from exc
+        return [obj async for obj in self.page.object_list]
+
+    def get_paginated_response(self, data: Any) -> Response:  # noqa: ANN401
+        """Page response with the ``count_exact`` flag"""
+        response = super().get_paginated_response(data)
+        response.data["count_exact"] = self.page.paginator.count_exact
+        return response
+
+    def get_paginated_response_schema(self, schema: Mapping[str, Any]) -> dict[str, Any]:
+        """OpenAPI schema of the paginated response"""
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_exact"] = {"type": "boolean", "example": True}
+        return response_schema
+
+    def get_schema_operation_parameters(self, view: APIView) -> list[dict[str, Any]]:
+        """Document the ``exact_count`` query parameter"""
+        return [
+            *super().get_schema_operation_parameters(view),
+            {
+                "name": self.exact_count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Return an exact count instead of an estimate.",
+                "schema": {"type": "boolean"},
+            },
+        ]
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Cursor pagination over the composite key ``(*ordering, id)``.
+
+    The cursor stores the ordering values of the boundary row instead of an
+    offset, so pages stay stable while new rows are inserted and no
+    ``COUNT(*)``/``OFFSET`` queries are needed.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = StandardResultsSetPagination.page_size
+    page_size_query_param = StandardResultsSetPagination.page_size_query_param
+    max_page_size = StandardResultsSetPagination.max_page_size
+    tiebreaker = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,  # noqa: ARG002
+    ) -> list[Any]:
+        """Return one page of rows that follow (or precede) the cursor position"""
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,  # noqa: ARG002
+    ) -> list[Any]:
+        """Async counterpart of ``paginate_queryset``"""
+        return self._set_page([row async for row in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset: QuerySet, request: Request) -> QuerySet:
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        cursor = self.decode_cursor(request)
+        self.cursor = cursor
+        reverse = bool(cursor and cursor["reverse"])
+        ordering = [_invert(term) for term in self.ordering] if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(_after_position(ordering, cursor["position"]))
+        return queryset[: self.page_size + 1]
+
+    def _set_page(self, rows: list[Any]) -> list[Any]:
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+
+        if self.cursor is not None and self.cursor["reverse"]:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_page_size(self, request: Request) -> int:
+        """Take the page size from the query string, bounded by ``max_page_size``"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset: QuerySet) -> list[str]:
+        """Ordering applied by the filter backends, made total with the tiebreaker"""
+        ordering = [
+            term.replace("pk", self.tiebreaker) if term.lstrip("-") == "pk" else term
+            for term in (queryset.query.order_by or queryset.model._meta.ordering)  # noqa: SLF001
+        ]
+        if not all(isinstance(term, str) for term in ordering):
+            message = "KeysetPagination supports field name orderings only."
+            raise TypeError(message)
+        if self.tiebreaker not in {term.lstrip("-") for term in ordering}:
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append(f"-{self.tiebreaker}" if descending else self.tiebreaker)
+        return ordering
+
+    def get_paginated_response(self, data: Any) -> Response:  # noqa: ANN401
+        """Wrap the page into the ``next``/``previous``/``results`` envelope"""
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema: Mapping[str, Any]) -> dict[str, Any]:
+        """OpenAPI schema of the paginated response"""
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self) -> str | None:
+        """Link to the page after the last row of the current one"""
+        if not self.has_next:
+            return None
+        position = self._boundary_position(self.page[-1] if self.page else None)
+        return self.encode_cursor(position, reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        """Link to the page before the first row of the current one"""
+        if not self.has_previous:
+            return None
+        position = self._boundary_position(self.page[0] if self.page else None)
+        return self.encode_cursor(position, reverse=True)
+
+    def encode_cursor(self, position: Sequence[Any], *, reverse: bool) -> str:
+        """Build an absolute URL carrying an opaque cursor"""
+        payload = {"o": self.ordering, "p": [_dump_value(value) for value in position]}
+        if reverse:
+            payload["r"] = 1
+        raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+        token = base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request: Request) -> dict[str, Any] | None:
+        """Parse the cursor query parameter; ``None`` means the first page"""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            ordering, position = payload["o"], payload["p"]
+            reverse = bool(payload.get("r"))
+        except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if (
+            ordering != self.ordering
+            or not isinstance(position, list)
+            or len(position) != len(ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return {"position": position, "reverse": reverse}
+
+    def get_schema_operation_parameters(self, view: APIView) -> list[dict[str, Any]]:  # noqa: ARG002
+        """OpenAPI parameters understood by the paginator"""
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def _boundary_position(self, row: Model | Mapping[str, Any] | None) -> list[Any]:
+        if row is None:
+            # Empty page: keep pointing at the position we were asked for
+            return list(self.cursor["position"]) if self.cursor else []
+        return [_row_value(row, term.lstrip("-")) for term in self.ordering]
+
+
+def _invert(term: str) -> str:
+    return term[1:] if term.startswith("-") else f"-{term}"
+
+
+def _after_position(ordering: Sequence[str], position: Sequence[Any]) -> Q:
+    """Rows strictly after ``position`` in ``ordering``, as a row-value comparison
+    expanded to ``a > x OR (a = x AND b > y) ...``"""
+    fields = [term.lstrip("-") for term in ordering]
+    condition = Q()
+    for index, term in enumerate(ordering):
+        lookup = "lt" if term.startswith("-") else "gt"
+        clause = Q(**{f"{fields[index]}__{lookup}": position[index]})
+        for field, value in zip(fields[:index], position[:index], strict=True):
+            clause &= Q(**{field: value})
+        condition |= clause
+    # The redundant bound on the leading key lets PostgreSQL use an index range scan
+    leading = "lte" if ordering[0].startswith("-") else "gte"
+    return Q(**{f"{fields[0]}__{leading}": position[0]}) & condition
+
+
+def _row_value(row: Model | Mapping[str, Any], field: str) -> Any:  # noqa: ANN401
+    if isinstance(row, Mapping):
+        return row[field] if field in row else row[field.replace("__", "_")]
+    value = row
+    for attr in field.split("__"):
+        value = getattr(value, attr)
+    return value
+
+
+def _dump_value(value: Any) -> Any:  # noqa: ANN401
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _estimated_rows(queryset: QuerySet) -> int:
+    # Partitioned tables keep their statistics in the partitions; reltuples is -1
+    # for a table that was never vacuumed or analyzed
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint FROM pg_class c"
+            " WHERE c.oid IN"
+            " (SELECT inhrelid FROM pg_inherits WHERE inhparent = %(table)s::regclass)"
+            " OR (c.oid = %(table)s::regclass AND c.relkind <> 'p')",
+            {"table": queryset.model._meta.db_table},  # noqa: SLF001
+        )
+        return cursor.fetchone()[0]
@@ -0,0 +1,146 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import rollup, versions
+from .models import CashFlow
+
+TABLE = CashFlow._meta.db_table  # noqa: SLF001
+DEFAULT_PARTITION = f"{TABLE}_default"
+# Generated columns are computed by the target partition and cannot be inserted
+COLUMNS = ", ".join(
+    field.column
+    for field in CashFlow._meta.concrete_fields  # noqa: SLF001
+    if not field.generated
+)
+_BOUND = re.compile(r"FOR VALUES FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+@dataclass(frozen=True)
+class Partition:
+    """One monthly partition of ``CashFlow``: rows with ``start <= created_at < end``"""
+
+    name: str
+    start: datetime
+    end: datetime
+
+
+def month_start(value: date) -> datetime:
+    """Start of the month of ``value`` in the project time zone"""
+    return datetime(value.year, value.month, 1, tzinfo=ZoneInfo(settings.TIME_ZONE))
+
+
+def next_month(value: datetime) -> datetime:
+    """Start of the month after ``value``"""
+    return month_start(date(value.year + value.month // 12, value.month % 12 + 1, 1))
+
+
+def partition_name(start: datetime) -> str:
+    """Table name of the partition starting at ``start``"""
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def partitions() -> list[Partition]:
+    """Monthly partitions attached to ``CashFlow``, oldest first; the default
+    partition is not listed"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i"
+            " JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    result = []
+    for name, bound in rows:
+        if match := _BOUND.search(bound):
+            start, end = (parse_datetime(value) for value in match.groups())
+            result.append(Partition(name, start, end))
+    return sorted(result, key=lambda partition: partition.start)
+
+
+def ensure(months_ahead: int) -> list[str]:
+    """Create the partitions of the current and the next ``months_ahead`` months,
+    plus one for every month that has rows in the default partition.
+
+    Returns the names of the created partitions.
+    """
+    existing = {partition.start for partition in partitions()}
+    months = set()
+    start = month_start(timezone.localdate())
+    for _ in range(months_ahead + 1):
+        months.add(start)
+        start = next_month(start)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE %s)"  # noqa: S608
+            f" FROM {DEFAULT_PARTITION}",
+            [settings.TIME_ZONE],
+        )
+        months.update(month_start(row[0]) for row in cursor.fetchall())
+
+    created = []
+    for start in sorted(months - existing):
+        create(start)
+        created.append(partition_name(start))
+    return created
+
+
+def create(start: datetime) -> None:
+    """Create and attach the partition of the month starting at ``start``.
+
+    Rows of that month already in the default partition are moved into it; the
+    default partition is locked meanwhile so no new ones arrive before the attach.
+    """
+    end = next_month(start)
+    name = partition_name(start)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            f"CREATE TABLE {name} (LIKE {TABLE}"
+            " INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"
+        )
+        # Lets ATTACH PARTITION skip validating the bounds with a full scan
+        cursor.execute(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds"
+            " CHECK (created_at >= %s AND created_at < %s)",
+            [start, end],
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION}"  # noqa: S608
+            f" WHERE created_at >= %s AND created_at < %s RETURNING {COLUMNS})"
+            f" INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved",
+            [start, end],
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}")
+        cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds")
+
+
+def detach(before: datetime, archive_schema: str | None = None) -> list[str]:
+    """Detach the partitions that end on or before ``before``.
+
+    Their rows leave ``CashFlow`` and the rollup; the tables are kept, moved to
+    ``archive_schema`` when given. Returns the names of the detached partitions.
+    """
+    detached = []
+    for partition in partitions():
+        if partition.end > before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Writers are blocked so the rollup loses exactly the detached rows
+            cursor.execute(f"LOCK TABLE {TABLE} IN SHARE MODE")
+            rollup.remove_table(partition.name)
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name}")
+            versions.bump_on_commit(versions.CASH_FLOWS)
+            if archive_schema:
+                schema = connection.ops.quote_name(archive_schema)
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                cursor.execute(f"ALTER TABLE {partition.name} SET SCHEMA {schema}")
+        detached.append(partition.name)
+    return detached
@@ -0,0 +1,103 @@
+from collections.abc import Sequence
+from datetime import date
+from typing import Any
+
+from django.db import connections
+from django.db.models import DateField, F, QuerySet
+from django.db.models.functions import Cast, Trunc
+
+from . import dictionaries
+from .models import CashFlowRollup
+from .serializers import PERIODS
+
+NAMES = {
+    "status": "statuses",
+    "cash_flow_type": "cash_flow_types",
+    "category": "categories",
+    "subcategory": "subcategories",
+}
+
+
+def pivot(queryset: QuerySet[CashFlowRollup], rows: Sequence[str], columns: str) -> dict[str, Any]:
+    """Pivot the (filtered) daily rollup into a columnar report.
+
+    ``rows`` is a hierarchy of dictionary dimensions, outermost first; ``columns``
+    is a period (``day``/``week``/``month``/``year``), a dictionary dimension or
+    empty. Every subtotal is computed by one ``GROUP BY ROLLUP (rows), ROLLUP (column)``
+    query. Report rows come depth first with each subtotal above its children,
+    the grand total first; ``depth`` is the number of row dimensions set on a row.
+    Each of the ``rows`` arrays, ``depth``, ``values`` and ``total`` holds one
+    element per report row; ``values`` is aligned with ``column_keys``.
+    """
+    aliases = [f"row_{index}" for index in range(len(rows))]
+    selected: dict[str, Any] = {alias: F(name) for alias, name in zip(aliases, rows, strict=True)}
+    if columns in PERIODS:
+        # Cast back to a date: the outer raw query gets no field converters
+        selected["column_key"] = Cast(Trunc("day", columns), DateField())
+    elif columns:
+        selected["column_key"] = F(columns)
+    inner = queryset.values(**selected, amount_total=F("total"))
+    inner_sql, params = inner.query.sql_with_params()
+
+    grouped = ", ".join(aliases)
+    column = "column_key" if columns else "NULL"
+    group_by = f"ROLLUP ({grouped})" + (", ROLLUP (column_key)" if columns else "")
+    order_by = ", ".join(f"GROUPING({alias}) DESC, {alias}" for alias in aliases)
+    if columns:
+        order_by += ", GROUPING(column_key), column_key"
+    sql = (
+        f"SELECT {grouped}, {column}, GROUPING({grouped}),"  # noqa: S608
+        f" {'GROUPING(column_key)' if columns else '1'}, SUM(amount_total)"
+        f" FROM ({inner_sql}) AS source GROUP BY {group_by} ORDER BY {order_by}"
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        result = cursor.fetchall()
+    return _layout(result, rows, columns)
+
+
+def _layout(result: Sequence[Sequence[Any]], rows: Sequence[str], columns: str) -> dict[str, Any]:
+    snapshot = dictionaries.get()
+    column_keys = sorted({row[len(rows)] for row in result if not row[len(rows) + 2]})
+    positions = {key: index for index, key in enumerate(column_keys)}
+    report: dict[str, Any] = {
+        "rows": list(rows),
+        "columns": columns,
+        "column_keys": [_key(key) for key in column_keys],
+        "column_labels": [
+            _label(snapshot, columns, key) if columns in NAMES else _key(key) for key in column_keys
+        ],
+        "depth": [],
+        "keys": {name: [] for name in rows},
+        "labels": {name: [] for name in rows},
+        "values": [],
+        "total": [],
+    }
+    current = None
+    for row in result:
+        *keys, column_key, grouping, column_grouping, total = row
+        depth = len(rows) - grouping.bit_count()
+        if (depth, keys) != current:
+            current = (depth, keys)
+            report["depth"].append(depth)
+            for name, key in zip(rows, keys, strict=True):
+                report["keys"][name].append(key)
+                report["labels"][name].append(_label(snapshot, name, key))
+            report["values"].append([None] * len(column_keys))
+            report["total"].append(None)
+        if column_grouping:
+            report["total"][-1] = str(total)
+        else:
+            report["values"][-1][positions[column_key]] = str(total)
+    return report
+
+
+def _key(value: Any) -> Any:  # noqa: ANN401
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _label(snapshot: dictionaries.DictionarySnapshot, dimension: str, pk: int | None) -> str | None:
+    if pk is None:
+        return None
+    obj = getattr(snapshot, NAMES[dimension]).get(pk)
+    return obj.name if obj is not None else ""
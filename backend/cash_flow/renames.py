@@ -0,0 +1,79 @@
+import time
+from collections.abc import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Model
+from django.utils import timezone
+
+from . import events, jobs, versions
+from .merge import MODELS
+from .models import CashFlow, Job
+
+# Renaming a dictionary row. The cash flows carry copies of the dictionary names
+# so orderings by name are served by indexes (see migration 0009). A rename does
+# not rewrite the copies in its own transaction: it queues a job that rewrites
+# them in batches of their own transaction, with a pause between batches, like a
+# merge (see merge.py). Every batch moves updated_at of its rows, so the delta
+# sync sends them again, and bumps the cash flow data version. Until the job is
+# done, the rows not yet rewritten are listed and sorted by the old name.
+
+type ProgressCallback = Callable[[int, int], None]
+
+
+def model_name(model: type[Model]) -> str:
+    """Name of a dictionary model in the job parameters"""
+    return next(name for name, dictionary in MODELS.items() if dictionary is model)
+
+
+def submit(model: type[Model], pk: int) -> Job:
+    """Queue the rewrite of the name copies of a renamed row"""
+    job, _ = jobs.submit(Job.Kind.RENAME, {"model": model_name(model), "id": str(pk)})
+    return job
+
+
+def refresh(
+    name: str,
+    pk: int,
+    *,
+    batch_size: int | None = None,
+    pause: float | None = None,
+    progress: ProgressCallback | None = None,
+) -> int:
+    """Copy the current name of row ``pk`` of dictionary ``name`` to its cash flows,
+    calling ``progress(updated, total)`` after every batch; returns the number of
+    updated rows. Running it again after an interruption finishes the work."""
+    model = MODELS[name]
+    batch_size = batch_size or settings.CASH_FLOW_MERGE_BATCH_SIZE
+    pause = settings.CASH_FLOW_MERGE_PAUSE if pause is None else pause
+    stale = {f"{name}_id": pk}
+    current = model.objects.filter(pk=pk).values_list("name", flat=True).first()
+    if current is None:
+        return 0
+    total = CashFlow.objects.filter(**stale).exclude(**{f"{name}_name": current}).count()
+    updated = 0
+    if progress:
+        progress(0, total)
+    while True:
+        with transaction.atomic():
+            # The latest name: a row renamed again meanwhile gets its newest name
+            current = model.objects.filter(pk=pk).values_list("name", flat=True).first()
+            ids = list(
+                CashFlow.objects.select_for_update()
+                .filter(**stale)
+                .exclude(**{f"{name}_name": current})
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if current is None or not ids:
+                break
+            CashFlow.objects.filter(pk__in=ids).update(
+                **{f"{name}_name": current}, updated_at=timezone.now()
+            )
+            versions.bump_on_commit(versions.CASH_FLOWS)
+        updated += len(ids)
+        if progress:
+            progress(updated, max(total, updated))
+        time.sleep(pause)
+    if updated:
+        events.cash_flows_changed()
+    return updated
@@ -0,0 +1,94 @@
+import math
+import re
+from collections.abc import Mapping
+from decimal import Decimal
+from typing import Any
+
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# JSONRenderer escapes these for JavaScript (ECMA-262 line terminators)
+_LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+# orjson writes floats below 1e-4 as 0.0000..., the json module as 1e-05
+_SMALL_FLOAT = re.compile(rb"[\[:,]-?0\.0000")
+_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` backed by orjson.
+
+    The output is byte for byte the one of DRF's compact, unicode ``JSONRenderer``:
+    dates and times go through DRF's encoder, and the values orjson writes
+    differently (integers beyond 64 bits, non-finite or tiny floats) are left to
+    it, as is indented output (``Accept: application/json; indent=4``).
+    """
+
+    def render(
+        self,
+        data: Any,  # noqa: ANN401
+        accepted_media_type: str | None = None,
+        renderer_context: Mapping[str, Any] | None = None,
+    ) -> bytes:
+        """Render ``data`` into JSON bytes"""
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) or not (
+            self.compact and self.ensure_ascii is False
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # orjson writes NaN and infinities as null where JSONRenderer refuses them
+        if (b"null" in ret and _has_non_finite(data)) or _SMALL_FLOAT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        for raw, escaped in _LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+def _has_non_finite(data: Any) -> bool:  # noqa: ANN401
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Mapping):
+            stack.extend(value.values())
+        elif isinstance(value, list | tuple):
+            stack.extend(value)
+        elif (isinstance(value, float) and not math.isfinite(value)) or (
+            isinstance(value, Decimal) and not value.is_finite()
+        ):
+            return True
+    return False
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack output for internal consumers (``Accept: application/msgpack``
+    or ``?format=msgpack``).
+
+    Values that JSON renders through DRF's encoder (decimals, lazy strings, ...)
+    are packed as the same JSON-compatible values.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    encoder_class = JSONRenderer.encoder_class
+
+    def render(
+        self,
+        data: Any,  # noqa: ANN401
+        accepted_media_type: str | None = None,  # noqa: ARG002
+        renderer_context: Mapping[str, Any] | None = None,  # noqa: ARG002
+    ) -> bytes:
+        """Render ``data`` into MessagePack bytes"""
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=self.encoder_class().default)
@@ -0,0 +1,89 @@
+import random
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model
+
+# Read replicas. The primary (the default alias) takes every write and, unless a
+# view opts in, every read. Views list the actions that may read from a replica
+# (ReplicaReadMixin); ReplicaRouter then sends the reads of such a request to one
+# of CASH_FLOW_READ_REPLICAS, picked per request. Reads stay on the primary
+# - inside a transaction on the primary, which may hold the rows it reads;
+# - for CASH_FLOW_REPLICA_STICKY_SECONDS after a client's write: the
+#   PrimaryStickinessMiddleware marks the client with STICKY_COOKIE, so it reads
+#   its own writes whatever the replication lag.
+# Replicas are streaming replicas of the primary, so migrations run on the
+# primary only.
+
+STICKY_COOKIE = "cash_flow_primary"
+
+
+@dataclass
+class Routing:
+    """Read routing of the current request"""
+
+    sticky: bool = False
+    replica: str | None = None
+
+
+_routing: ContextVar[Routing | None] = ContextVar("cash_flow_routing", default=None)
+
+
+@contextmanager
+def request_scope(*, sticky: bool) -> Iterator[Routing]:
+    """Route the reads of the enclosed request; ``sticky`` keeps them on the primary.
+
+    The routing object is shared with the threads the request hands work to, as
+    they run in copies of the request's context.
+    """
+    routing = Routing(sticky=sticky)
+    token = _routing.set(routing)
+    try:
+        yield routing
+    finally:
+        _routing.reset(token)
+
+
+def use_replica() -> None:
+    """Send the following reads of the current request to a replica, unless the
+    client sticks to the primary or no replica is configured"""
+    routing = _routing.get()
+    if routing is None or routing.sticky or routing.replica is not None:
+        return
+    if settings.CASH_FLOW_READ_REPLICAS:
+        routing.replica = random.choice(settings.CASH_FLOW_READ_REPLICAS)  # noqa: S311
+
+
+def read_alias() -> str:
+    """Return the database alias of the current request's reads"""
+    routing = _routing.get()
+    if routing is None or routing.replica is None:
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return routing.replica
+
+
+class ReplicaRouter:
+    """Database router of the primary and its read replicas"""
+
+    def db_for_read(self, model: type[Model], **hints: Any) -> str:  # noqa: ARG002
+        """Return the replica of the request, or the primary"""
+        return read_alias()
+
+    def db_for_write(self, model: type[Model], **hints: Any) -> str:  # noqa: ARG002
+        """Return the primary"""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints: Any) -> bool:  # noqa: ARG002
+        """Allow any relation: every database holds the same rows"""
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints: Any) -> bool:  # noqa: ARG002
+        """Migrate the primary only; replicas follow it"""
+        return db == DEFAULT_DB_ALIAS
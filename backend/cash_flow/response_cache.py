@@ -0,0 +1,92 @@
+import hashlib
+from collections.abc import Callable, Sequence
+from functools import wraps
+from typing import Any
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import instrumentation
+
+# Responses of the list endpoints are cached under the normalized request URL and
+# the data versions the view depends on (see versions.py). A write bumps a
+# version, so the entries of older versions are never read again and expire
+# after CASH_FLOW_RESPONSE_CACHE_TIMEOUT; no entry is ever deleted explicitly.
+# The cache is one of CACHES: the process-local locmem cache of a single worker,
+# or a shared backend (e.g. Redis) for several workers.
+
+HEADER = "X-Cache"
+
+
+def cached(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Cache the 200 responses of a (sync or async) viewset method.
+
+    The view provides its data versions with ``get_cache_versions`` and
+    ``aget_cache_versions``.
+    """
+    if iscoroutinefunction(method):
+
+        @wraps(method)
+        async def async_wrapper(
+            view: APIView, request: Request, *args: Any, **kwargs: Any
+        ) -> Response:
+            cache = get_cache()
+            if cache is None:
+                return await method(view, request, *args, **kwargs)
+            key = cache_key(request, await view.aget_cache_versions())
+            data = await cache.aget(key)
+            if data is not None:
+                return _mark(request, Response(data), hit=True)
+            response = await method(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                await cache.aset(key, response.data, settings.CASH_FLOW_RESPONSE_CACHE_TIMEOUT)
+            return _mark(request, response, hit=False)
+
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(view: APIView, request: Request, *args: Any, **kwargs: Any) -> Response:
+        cache = get_cache()
+        if cache is None:
+            return method(view, request, *args, **kwargs)
+        key = cache_key(request, view.get_cache_versions())
+        data = cache.get(key)
+        if data is not None:
+            return _mark(request, Response(data), hit=True)
+        response = method(view, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.CASH_FLOW_RESPONSE_CACHE_TIMEOUT)
+        return _mark(request, response, hit=False)
+
+    return wrapper
+
+
+def get_cache() -> BaseCache | None:
+    """Return the configured cache, or ``None`` when response caching is off"""
+    alias = settings.CASH_FLOW_RESPONSE_CACHE
+    return caches[alias] if alias else None
+
+
+def cache_key(request: Request, versions: Sequence[int]) -> str:
+    """Key of the response to ``request`` at the given data versions.
+
+    Query parameters are sorted, so their order in the URL does not matter.
+    Scheme and host are part of the key, as pagination links are absolute.
+    """
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f"{request.scheme}://{request.get_host()}{request.path}?{query}"
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return f"cash_flow:response:{'.'.join(map(str, versions))}:{digest}"
+
+
+def _mark(request: Request, response: Response, *, hit: bool) -> Response:
+    match = request.resolver_match
+    instrumentation.metrics.observe_cache(match.view_name if match else "unmatched", hit=hit)
+    response[HEADER] = "HIT" if hit else "MISS"
+    return response
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from decimal import Decimal
+from typing import Any
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import balance
+from .models import CashFlow, CashFlowRollup, from_minor_units, to_minor_units
+
+KEY_FIELDS = ("status_id", "cash_flow_type_id", "category_id", "subcategory_id")
+ROW_FIELDS = ("created_at", "amount", *KEY_FIELDS)
+
+type RollupKey = tuple[date, int, int, int, int]
+type RollupDeltas = dict[RollupKey, list[Any]]
+
+_deferred: ContextVar[bool] = ContextVar("rollup_deferred", default=False)
+
+
+@contextmanager
+def deferred() -> Iterator[None]:
+    """Skip per-row rollup maintenance in signals.
+
+    For set-based writes that apply one aggregated ``apply_deltas`` call themselves.
+    """
+    token = _deferred.set(True)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+
+
+def is_deferred() -> bool:
+    """Whether per-row rollup maintenance is currently skipped"""
+    return _deferred.get()
+
+
+def rollup_key(row: Mapping[str, Any]) -> RollupKey:
+    """Rollup key of a cash flow given as a mapping of ``ROW_FIELDS``"""
+    return (timezone.localdate(row["created_at"]), *(row[field] for field in KEY_FIELDS))
+
+
+def instance_row(instance: CashFlow) -> dict[str, Any]:
+    """``ROW_FIELDS`` of a model instance"""
+    return {field: getattr(instance, field) for field in ROW_FIELDS}
+
+
+def collect_deltas(
+    added: Iterable[Mapping[str, Any]] = (),
+    removed: Iterable[Mapping[str, Any]] = (),
+) -> RollupDeltas:
+    """Sum added and removed rows into per-key ``[total, count]`` deltas"""
+    deltas: RollupDeltas = defaultdict(lambda: [Decimal(0), 0])
+    for sign, rows in ((1, added), (-1, removed)):
+        for row in rows:
+            delta = deltas[rollup_key(row)]
+            # The amount as stored; a model may still hold the str or float it was given
+            delta[0] += sign * from_minor_units(to_minor_units(row["amount"]))
+            delta[1] += sign
+    return deltas
+
+
+def apply_deltas(deltas: RollupDeltas) -> None:
+    """Add the deltas to the rollup and the balance snapshots in the current transaction.
+
+    Keys are upserted in sorted order so concurrent writers lock rollup rows in
+    the same order and cannot deadlock; keys whose count drops to zero are removed.
+    """
+    params = [
+        (*key, total, count) for key, (total, count) in sorted(deltas.items()) if total or count
+    ]
+    if not params:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            _upsert_sql(f"VALUES ({', '.join(['%s'] * len(params[0]))})"),
+            params,
+        )
+        emptied_days = {key[0] for key, (_, count) in deltas.items() if count < 0}
+        if emptied_days:
+            CashFlowRollup.objects.filter(day__in=emptied_days, count__lte=0).delete()
+        changes: dict[tuple[int, int, date], Decimal] = defaultdict(Decimal)
+        for (day, status, cash_flow_type, *_), (total, _) in deltas.items():
+            changes[status, cash_flow_type, day] += total
+        balance.shift(changes)
+
+
+def add_table(source: str) -> None:
+    """Add all rows of a table with ``CashFlow`` columns, e.g. an import staging
+    table, to the rollup and the balance snapshots"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _upsert_sql(f"{_aggregate_sql(source)} ORDER BY 1, {', '.join(KEY_FIELDS)}"),
+            [settings.TIME_ZONE],
+        )
+    balance.shift_table(source)
+
+
+def remove_table(source: str) -> None:
+    """Subtract all rows of a table with ``CashFlow`` columns, e.g. a detached
+    partition, from the rollup; the balance snapshots keep them"""
+    keys = ", ".join(KEY_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _upsert_sql(
+                f"SELECT day, {keys}, -total, -count FROM ({_aggregate_sql(source)}) AS removed"  # noqa: S608
+                f" ORDER BY 1, {keys}"
+            ),
+            [settings.TIME_ZONE],
+        )
+    CashFlowRollup.objects.filter(count__lte=0).delete()
+
+
+def rebuild() -> int:
+    """Recompute the whole rollup from ``CashFlow``; returns the number of rollup rows.
+
+    Writers are blocked for the duration so no change slips between the scan and the swap.
+    """
+    table = CashFlowRollup._meta.db_table  # noqa: SLF001
+    source = CashFlow._meta.db_table  # noqa: SLF001
+    columns = ", ".join(("day", *KEY_FIELDS))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {source} IN SHARE MODE")
+        cursor.execute(f"TRUNCATE {table}")
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}, total, count) {_aggregate_sql(source)}",
+            [settings.TIME_ZONE],
+        )
+        return cursor.rowcount
+
+
+def _aggregate_sql(source: str) -> str:
+    # One parameter: the time zone that defines day boundaries. Amounts are summed
+    # as integer minor units and converted once per rollup row.
+    keys = ", ".join(KEY_FIELDS)
+    return (
+        f"SELECT (created_at AT TIME ZONE %s)::date AS day, {keys},"  # noqa: S608
+        f" SUM(amount_minor) * 0.01 AS total, COUNT(*) AS count FROM {source} GROUP BY 1, {keys}"
+    )
+
+
+def _upsert_sql(rows_sql: str) -> str:
+    table = CashFlowRollup._meta.db_table  # noqa: SLF001
+    columns = ", ".join(("day", *KEY_FIELDS))
+    return (
+        f"INSERT INTO {table} ({columns}, total, count) {rows_sql}"
+        f" ON CONFLICT ({columns}) DO UPDATE"
+        f" SET total = {table}.total + EXCLUDED.total,"
+        f" count = {table}.count + EXCLUDED.count"
+    )
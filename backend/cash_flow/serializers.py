@@ -1,12 +1,60 @@
 from collections.abc import Mapping
+from datetime import datetime
 from typing import Any
 
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
-from .models import CashFlow, CashFlowType, Category, Status, Subcategory
+from . import dictionaries, instrumentation, merge
+from .filters import CashFlowFilter, CashFlowRollupFilter
+from .models import (
+    AMOUNT_MAX_DIGITS,
+    TOTAL_MAX_DIGITS,
+    CashFlow,
+    CashFlowType,
+    Category,
+    Job,
+    Status,
+    Subcategory,
+)
 
 
-class StatusSerializer(serializers.ModelSerializer):
+class DictionaryField(serializers.PrimaryKeyRelatedField):
+    """Primary key of a dictionary row resolved through the dictionary cache"""
+
+    def to_internal_value(self, data: Any) -> Any:  # noqa: ANN401
+        """Look the id up in the current dictionary snapshot, reloading it once
+        for an unknown id"""
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        model = self.get_queryset().model
+        obj = dictionaries.get().for_model(model).get(pk)
+        if obj is None:
+            # The row may have been created by another worker since the last check
+            obj = dictionaries.get(fresh=True).for_model(model).get(pk)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class TimedSerializerMixin:
+    """Report the time of ``to_representation`` as the ``serialize`` timing of the
+    request (see instrumentation.py)"""
+
+    def to_representation(self, instance: Any) -> Any:  # noqa: ANN401
+        """Represent the instance while timing it"""
+        with instrumentation.serializing():
+            return super().to_representation(instance)
+
+
+class StatusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Status model"""
 
     class Meta:
@@ -15,19 +63,19 @@ class StatusSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class CashFlowTypeSerializer(serializers.ModelSerializer):
+class CashFlowTypeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for CashFlowType model"""
 
     class Meta:
         model = CashFlowType
-        fields = ["id", "name"]
+        fields = ["id", "name", "sign"]
         read_only_fields = ("id",)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Category model"""
 
-    cash_flow_type = serializers.PrimaryKeyRelatedField(queryset=CashFlowType.objects.all())
+    cash_flow_type = DictionaryField(queryset=CashFlowType.objects.all())
     cash_flow_type_name = serializers.CharField(source="cash_flow_type.name", read_only=True)
 
     class Meta:
@@ -36,10 +84,10 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class SubcategorySerializer(serializers.ModelSerializer):
+class SubcategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Subcategory model"""
 
-    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
+    category = DictionaryField(queryset=Category.objects.all())
     category_name = serializers.CharField(source="category.name", read_only=True)
 
     class Meta:
@@ -48,13 +96,32 @@ class SubcategorySerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class CashFlowSerializer(serializers.ModelSerializer):
+def hierarchy_error(
+    cash_flow_type: CashFlowType | None,
+    category: Category | None,
+    subcategory: Subcategory | None,
+) -> dict[str, str] | None:
+    """Check that the subcategory belongs to the category and the category
+    belongs to the cash flow type; missing values are not checked"""
+
+    if subcategory and category and subcategory.category_id != category.id:
+        return {"subcategory": "Subcategory does not belong to the selected category."}
+
+    if cash_flow_type and category and category.cash_flow_type_id != cash_flow_type.id:
+        return {"category": "Category does not belong to the selected cash flow type."}
+
+    return None
+
+
+class CashFlowSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for CashFlow model"""
 
-    subcategory = serializers.PrimaryKeyRelatedField(queryset=Subcategory.objects.all())
-    cash_flow_type = serializers.PrimaryKeyRelatedField(queryset=CashFlowType.objects.all())
-    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
-    status = serializers.PrimaryKeyRelatedField(queryset=Status.objects.all())
+    subcategory = DictionaryField(queryset=Subcategory.objects.all())
+    cash_flow_type = DictionaryField(queryset=CashFlowType.objects.all())
+    category = DictionaryField(queryset=Category.objects.all())
+    status = DictionaryField(queryset=Status.objects.all())
+    # Stored in minor units; the API keeps the decimal string
+    amount = serializers.DecimalField(max_digits=AMOUNT_MAX_DIGITS, decimal_places=2)
 
     cash_flow_type_name = serializers.CharField(source="cash_flow_type.name", read_only=True)
     category_name = serializers.CharField(source="category.name", read_only=True)
@@ -74,12 +141,14 @@ class CashFlowSerializer(serializers.ModelSerializer):
             "subcategory_name",
             "amount",
             "created_at",
+            "updated_at",
             "comment",
             "status_name",
         ]
         read_only_fields = (
             "id",
             "created_at",
+            "updated_at",
             "cash_flow_type_name",
             "category_name",
             "subcategory_name",
@@ -90,19 +159,88 @@ class CashFlowSerializer(serializers.ModelSerializer):
         """Ensure the subcategory belongs to the selected category and
         the category belongs to the selected cash flow type"""
 
-        cash_flow_type = data.get("cash_flow_type")
-        category = data.get("category")
-        subcategory = data.get("subcategory")
-
-        if subcategory and category and subcategory.category_id != category.id:
-            error = {"subcategory": "Subcategory does not belong to the selected category."}
+        error = hierarchy_error(
+            data.get("cash_flow_type"), data.get("category"), data.get("subcategory")
+        )
+        if error:
             raise serializers.ValidationError(error)
 
-        if cash_flow_type and category and category.cash_flow_type_id != cash_flow_type.id:
-            error = {"category": "Category does not belong to the selected cash flow type."}
+        return data
+
+    def validate_amount(self, value: float) -> float:
+        """Ensure the amount is positive"""
+        if value <= 0:
+            error = {"amount": "Amount must be positive"}
             raise serializers.ValidationError(error)
+        return value
 
-        return data
+
+# Columns of the list fast path; the dictionary names are the denormalized copies
+# on the cash flow row, so no dictionary table is joined
+CASH_FLOW_VALUES = (
+    "id",
+    "status_id",
+    "cash_flow_type_id",
+    "category_id",
+    "subcategory_id",
+    "amount",
+    "created_at",
+    "updated_at",
+    "comment",
+    "cash_flow_type_name",
+    "category_name",
+    "subcategory_name",
+    "status_name",
+)
+
+
+def cash_flow_values(queryset: QuerySet[CashFlow]) -> QuerySet:
+    """Turn a (filtered, ordered) cash flow queryset into the value rows read by
+    ``cash_flow_representation``.
+
+    Annotations added by the filters are kept, so keyset cursors can read them.
+    """
+    return queryset.values(*CASH_FLOW_VALUES, *queryset.query.annotations)
+
+
+def cash_flow_representation(row: Mapping[str, Any]) -> dict[str, Any]:
+    """Representation of a value row, identical to ``CashFlowSerializer.data``
+    but without model instances and per-field serializer calls"""
+    return {
+        "id": row["id"],
+        "status": row["status_id"],
+        "cash_flow_type": row["cash_flow_type_id"],
+        "cash_flow_type_name": row["cash_flow_type_name"],
+        "category": row["category_id"],
+        "category_name": row["category_name"],
+        "subcategory": row["subcategory_id"],
+        "subcategory_name": row["subcategory_name"],
+        "amount": str(row["amount"]),
+        "created_at": format_datetime(row["created_at"]),
+        "updated_at": format_datetime(row["updated_at"]),
+        "comment": row["comment"],
+        "status_name": row["status_name"],
+    }
+
+
+def format_datetime(value: datetime) -> str:
+    """Render an aware datetime like DRF's ``DateTimeField``"""
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value.removesuffix("+00:00") + "Z"
+    return value
+
+
+class CashFlowBulkItemSerializer(serializers.Serializer):
+    """One row of a bulk create/update; dictionaries are plain ids resolved in bulk"""
+
+    id = serializers.IntegerField(min_value=1, required=False)
+    status = serializers.IntegerField(min_value=1)
+    cash_flow_type = serializers.IntegerField(min_value=1)
+    category = serializers.IntegerField(min_value=1)
+    subcategory = serializers.IntegerField(min_value=1)
+    amount = serializers.DecimalField(max_digits=AMOUNT_MAX_DIGITS, decimal_places=2)
+    comment = serializers.CharField(allow_blank=True, required=False, default="")
 
     def validate_amount(self, value: float) -> float:
         """Ensure the amount is positive"""
@@ -110,3 +248,227 @@ class CashFlowSerializer(serializers.ModelSerializer):
             error = {"amount": "Amount must be positive"}
             raise serializers.ValidationError(error)
         return value
+
+
+class CashFlowBulkSerializer(serializers.Serializer):
+    """Envelope of a bulk create/update request"""
+
+    items = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.CASH_FLOW_BULK_MAX_ROWS,
+    )
+    mode = serializers.ChoiceField(choices=["atomic", "partial"], default="atomic")
+    batch_size = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.CASH_FLOW_BULK_MAX_ROWS,
+        default=settings.CASH_FLOW_BULK_BATCH_SIZE,
+    )
+
+
+class CashFlowBulkDeleteSerializer(serializers.Serializer):
+    """Envelope of a bulk delete request"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.CASH_FLOW_BULK_MAX_ROWS,
+    )
+    mode = serializers.ChoiceField(choices=["atomic", "partial"], default="atomic")
+
+
+class CashFlowExportQuerySerializer(serializers.Serializer):
+    """Query parameters of the cash flow export"""
+
+    output = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+    compress = serializers.ChoiceField(choices=["gzip"], required=False)
+
+
+class CashFlowImportSerializer(serializers.Serializer):
+    """Upload of the cash flow CSV import"""
+
+    file = serializers.FileField()
+    create_missing = serializers.BooleanField(default=False)
+    batch_size = serializers.IntegerField(min_value=1, required=False)
+
+
+DIMENSIONS = ("status", "cash_flow_type", "category", "subcategory")
+PERIODS = ("day", "week", "month", "year")
+
+
+def parse_dimensions(value: str) -> list[str]:
+    """Parse a comma separated list of dictionary dimensions"""
+    dimensions = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = sorted(set(dimensions) - set(DIMENSIONS))
+    if unknown:
+        error = f"Unknown dimensions: {', '.join(unknown)}."
+        raise serializers.ValidationError(error)
+    return list(dict.fromkeys(dimensions))
+
+
+class CashFlowSummaryQuerySerializer(serializers.Serializer):
+    """Query parameters of the cash flow summary"""
+
+    period = serializers.ChoiceField(choices=PERIODS, default="day")
+    group_by = serializers.CharField(required=False, default="")
+
+    def validate_group_by(self, value: str) -> list[str]:
+        """Parse a comma separated list of dictionary dimensions"""
+        return parse_dimensions(value)
+
+
+class CashFlowSummarySerializer(TimedSerializerMixin, serializers.Serializer):
+    """Totals of cash flows for one period and combination of dimensions"""
+
+    period = serializers.DateField()
+    status = serializers.IntegerField(required=False)
+    cash_flow_type = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    subcategory = serializers.IntegerField(required=False)
+    total = serializers.DecimalField(max_digits=TOTAL_MAX_DIGITS, decimal_places=2)
+    count = serializers.IntegerField()
+
+
+class CashFlowPivotQuerySerializer(serializers.Serializer):
+    """Query parameters of the cash flow pivot report"""
+
+    rows = serializers.CharField(required=False, default="cash_flow_type,category,subcategory")
+    columns = serializers.ChoiceField(
+        choices=[*PERIODS, *DIMENSIONS],
+        default="month",
+        allow_blank=True,
+    )
+
+    def validate_rows(self, value: str) -> list[str]:
+        """Parse the row hierarchy, outermost dimension first"""
+        dimensions = parse_dimensions(value)
+        if not dimensions:
+            error = "At least one row dimension is required."
+            raise serializers.ValidationError(error)
+        return dimensions
+
+    def validate(self, data: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Ensure a dimension is not used for both rows and columns"""
+        if data["columns"] in data["rows"]:
+            error = {"columns": "The column dimension is already a row dimension."}
+            raise serializers.ValidationError(error)
+        return data
+
+
+class CashFlowBalanceQuerySerializer(serializers.Serializer):
+    """Query parameters of the balance endpoint"""
+
+    date = serializers.DateField(required=False)
+
+
+class CashFlowSyncQuerySerializer(serializers.Serializer):
+    """Query parameters of the delta sync; no token starts a full sync"""
+
+    token = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.CASH_FLOW_SYNC_BATCH_SIZE,
+        default=settings.CASH_FLOW_SYNC_BATCH_SIZE,
+    )
+
+
+class CashFlowBalanceSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Balance of one status at the end of a day"""
+
+    status = serializers.IntegerField()
+    status_name = serializers.CharField()
+    balance = serializers.DecimalField(max_digits=TOTAL_MAX_DIGITS, decimal_places=2)
+
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """State, progress and result link of a background job"""
+
+    rows_per_second = serializers.SerializerMethodField()
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "params",
+            "state",
+            "attempts",
+            "max_attempts",
+            "processed",
+            "total",
+            "rows_per_second",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "result_url",
+        ]
+        read_only_fields = fields
+
+    def get_rows_per_second(self, obj: Job) -> float | None:
+        """Return the throughput of the current or last attempt up to its last
+        progress update"""
+        last_seen = obj.finished_at or obj.heartbeat_at
+        if obj.started_at is None or last_seen is None or last_seen <= obj.started_at:
+            return None
+        return round(obj.processed / (last_seen - obj.started_at).total_seconds(), 1)
+
+    def get_result_url(self, obj: Job) -> str | None:
+        """Return the download link of a finished job's result file"""
+        if obj.state != Job.State.SUCCEEDED or not obj.result:
+            return None
+        return reverse("job-result", args=[obj.pk], request=self.context.get("request"))
+
+
+class JobSubmitSerializer(serializers.Serializer):
+    """A job to queue: its kind and the query parameters of the matching endpoint"""
+
+    # Renames are queued by the rename itself
+    kind = serializers.ChoiceField(
+        choices=[choice for choice in Job.Kind.choices if choice[0] != Job.Kind.RENAME]
+    )
+    params = serializers.DictField(child=serializers.CharField(allow_blank=True), default=dict)
+
+    def validate(self, data: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Check the parameters the way the matching endpoint does"""
+        if data["kind"] == Job.Kind.EXPORT:
+            query_class, filterset_class = CashFlowExportQuerySerializer, CashFlowFilter
+        elif data["kind"] == Job.Kind.PIVOT:
+            query_class, filterset_class = CashFlowPivotQuerySerializer, CashFlowRollupFilter
+        elif data["kind"] == Job.Kind.MERGE:
+            merge_query = DictionaryMergeSerializer(data=data["params"])
+            if not merge_query.is_valid():
+                raise serializers.ValidationError({"params": merge_query.errors})
+            return data
+        elif data["params"]:
+            error = {"params": "This job takes no parameters."}
+            raise serializers.ValidationError(error)
+        else:
+            return data
+        query = query_class(data=data["params"])
+        filterset = filterset_class(data["params"])
+        errors = {}
+        if not query.is_valid():
+            errors.update(query.errors)
+        if not filterset.is_valid():
+            errors.update({name: list(messages) for name, messages in filterset.errors.items()})
+        if errors:
+            raise serializers.ValidationError({"params": errors})
+        return data
+
+
+class DictionaryMergeSerializer(serializers.Serializer):
+    """A dictionary merge: the row whose cash flows move to ``target``, then is deleted"""
+
+    model = serializers.ChoiceField(choices=list(merge.MODELS))
+    source = serializers.IntegerField()
+    target = serializers.IntegerField()
+
+    def validate(self, data: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Check that both rows exist and differ"""
+        try:
+            merge.DictionaryMerge(data["model"], data["source"], data["target"])
+        except merge.MergeError as exc:
+            raise serializers.ValidationError(str(exc)) from exc
+        return data
@@ -0,0 +1,142 @@
+from typing import Any
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import dictionaries, events, instrumentation, jobs, renames, rollup, versions
+from .models import CashFlow, CashFlowTombstone, CashFlowType, Category, Job, Status, Subcategory
+
+
+@receiver(pre_save, sender=CashFlow)
+def remember_previous_row(sender: type[CashFlow], instance: CashFlow, **kwargs: Any) -> None:
+    """Lock and remember the stored row so post_save can move it between rollup keys"""
+    instance._rollup_previous = (  # noqa: SLF001
+        None
+        if rollup.is_deferred() or instance._state.adding or instance.pk is None  # noqa: SLF001
+        else sender.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values(*rollup.ROW_FIELDS)
+        .first()
+    )
+
+
+@receiver(post_save, sender=CashFlow)
+def update_rollup_on_save(instance: CashFlow, **kwargs: Any) -> None:
+    """Replace the previous version of the row with the saved one in the rollup"""
+    if rollup.is_deferred():
+        return
+    previous = getattr(instance, "_rollup_previous", None)
+    rollup.apply_deltas(
+        rollup.collect_deltas(
+            added=[rollup.instance_row(instance)],
+            removed=[previous] if previous else [],
+        )
+    )
+
+
+@receiver(post_delete, sender=CashFlow)
+def update_rollup_on_delete(instance: CashFlow, **kwargs: Any) -> None:
+    """Remove a deleted row from the rollup"""
+    if rollup.is_deferred():
+        return
+    rollup.apply_deltas(rollup.collect_deltas(removed=[rollup.instance_row(instance)]))
+
+
+@receiver(post_delete, sender=CashFlow)
+def leave_tombstone(instance: CashFlow, **kwargs: Any) -> None:
+    """Record the deletion for the delta sync (bulk deletes record their own)"""
+    if not rollup.is_deferred():
+        CashFlowTombstone.objects.create(cash_flow_id=instance.pk)
+
+
+@receiver(post_save, sender=CashFlow)
+@receiver(post_delete, sender=CashFlow)
+def bump_cash_flow_version(**kwargs: Any) -> None:
+    """Retire the cached list responses once the write commits (bulk writes bump it once)"""
+    if not rollup.is_deferred():
+        versions.bump_on_commit(versions.CASH_FLOWS)
+
+
+@receiver(post_save, sender=CashFlow)
+def publish_saved(instance: CashFlow, created: bool, **kwargs: Any) -> None:  # noqa: FBT001
+    """Notify the event stream clients of a saved row (bulk writes publish their own events)"""
+    if not rollup.is_deferred():
+        events.cash_flows_saved([instance], created=created)
+
+
+@receiver(post_delete, sender=CashFlow)
+def publish_deleted(instance: CashFlow, **kwargs: Any) -> None:
+    """Notify the event stream clients of a deleted row"""
+    if not rollup.is_deferred():
+        events.cash_flows_deleted([instance.pk])
+
+
+@receiver(pre_save, sender=CashFlowType)
+def remember_previous_sign(
+    sender: type[CashFlowType], instance: CashFlowType, **kwargs: Any
+) -> None:
+    """Remember the stored sign so post_save can tell whether balances changed"""
+    instance._previous_sign = (  # noqa: SLF001
+        None
+        if instance._state.adding or instance.pk is None  # noqa: SLF001
+        else sender.objects.filter(pk=instance.pk).values_list("sign", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=CashFlowType)
+def rebuild_balances_on_sign_change(instance: CashFlowType, **kwargs: Any) -> None:
+    """Queue the recomputation of the balance snapshots when a type flips between
+    income and expense; the balances keep the old sign until the job has run"""
+    previous = getattr(instance, "_previous_sign", None)
+    if previous is not None and previous != instance.sign:
+        jobs.submit(Job.Kind.BALANCE_REBUILD, {})
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=CashFlowType)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Status)
+@receiver(post_delete, sender=CashFlowType)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+def invalidate_dictionaries(**kwargs: Any) -> None:
+    """Bump the dictionary version so every worker reloads its dictionary cache,
+    and tell the event stream clients to reload the dictionary tree"""
+    dictionaries.changed()
+    events.dictionaries_changed()
+
+
+@receiver(pre_save, sender=Status)
+@receiver(pre_save, sender=CashFlowType)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Subcategory)
+def remember_previous_name(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """Remember the stored name so post_save can tell whether the row was renamed"""
+    instance._previous_name = (  # noqa: SLF001
+        None
+        if instance._state.adding or instance.pk is None  # noqa: SLF001
+        else sender.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+    )
+
+
+# Connected after invalidate_dictionaries: the job is submitted under the bumped
+# dictionary version, so it is not mistaken for the job of an earlier rename
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=CashFlowType)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+def refresh_names_on_rename(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """Queue the rewrite of the name copies in the cash flows of a renamed row"""
+    previous = getattr(instance, "_previous_name", None)
+    if previous is not None and previous != instance.name:
+        renames.submit(sender, instance.pk)
+
+
+@receiver(connection_created)
+def instrument_connection(connection: BaseDatabaseWrapper, **kwargs: Any) -> None:
+    """Count and time the statements of every request (see middleware.py)"""
+    instrumentation.install(connection)
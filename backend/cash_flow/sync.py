@@ -0,0 +1,151 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, F, Q, Value
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import CashFlow, CashFlowTombstone
+from .serializers import cash_flow_values
+
+# Delta sync: the changes of the cash flow table form one timeline of saved rows
+# (by updated_at) and deleted ones (tombstones, by deleted_at), ordered by
+# (time, deleted, id). A sync token is a position on that timeline; a batch
+# holds the entries after it, and its token is where the next batch starts.
+#
+# A transaction commits its rows after it took their timestamps, so a batch
+# only reaches up to a horizon: the start of the oldest open transaction, less
+# a safety margin for the gap between taking a timestamp and the first
+# statement. Entries before the horizon can no longer appear behind a token.
+# A transaction open for longer than CASH_FLOW_SYNC_MAX_LAG_SECONDS no longer
+# holds the horizon back; its changes may be missed by clients past it.
+# Rows leaving with a detached partition are not reported as deleted.
+
+
+@dataclass(frozen=True, order=True)
+class Position:
+    """A point on the change timeline; entries after it are not yet synced"""
+
+    at: datetime
+    deleted: bool = False
+    id: int = 0
+
+
+@dataclass
+class SyncBatch:
+    """Saved rows and deleted ids after a position, and the position after them"""
+
+    changed: list[dict[str, Any]] = field(default_factory=list)
+    deleted: list[int] = field(default_factory=list)
+    position: Position | None = None
+    more: bool = False
+
+
+class SyncTokenExpired(APIException):
+    """The tombstones a token depends on were purged; the client syncs from scratch"""
+
+    status_code = status.HTTP_410_GONE
+    default_detail = "The sync token has expired, start a full sync without a token."
+    default_code = "sync_token_expired"
+
+
+def encode_token(position: Position) -> str:
+    """Opaque token of a position"""
+    payload = [position.at.isoformat(), int(position.deleted), position.id]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_token(token: str) -> Position:
+    """Position of a token; raises ``ValueError`` for a malformed one"""
+    try:
+        at, deleted, pk = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        position = Position(datetime.fromisoformat(at), bool(deleted), int(pk))
+    except (binascii.Error, TypeError, ValueError) as exc:
+        error = "Invalid sync token."
+        raise ValueError(error) from exc
+    if timezone.is_naive(position.at):
+        error = "Invalid sync token."
+        raise ValueError(error)
+    return position
+
+
+def horizon() -> datetime:
+    """Time before which every change is committed or rolled back"""
+    with connection.cursor() as cursor:
+        # Only the client transactions of this database can write cash flows; one
+        # open for longer than the maximum lag is ignored rather than holding the
+        # horizon back for every client
+        cursor.execute(
+            "SELECT LEAST(clock_timestamp(), MIN(xact_start)) FROM pg_stat_activity"
+            " WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid()"
+            " AND datname = current_database() AND backend_type = 'client backend'"
+            " AND xact_start > clock_timestamp() - make_interval(secs => %s)",
+            [settings.CASH_FLOW_SYNC_MAX_LAG_SECONDS],
+        )
+        (now,) = cursor.fetchone()
+    return now - timedelta(seconds=settings.CASH_FLOW_SYNC_MARGIN_SECONDS)
+
+
+def changes(after: Position | None, limit: int) -> SyncBatch:
+    """Up to ``limit`` changes after ``after`` (from the beginning for ``None``)"""
+    if after is not None and after.at < tombstone_cutoff():
+        raise SyncTokenExpired
+    until = horizon()
+    saved = CashFlow.objects.filter(updated_at__lt=until).order_by()
+    deleted = CashFlowTombstone.objects.filter(deleted_at__lt=until).order_by()
+    if after is not None:
+        saved_after = Q(updated_at__gt=after.at)
+        if not after.deleted:
+            saved_after |= Q(updated_at=after.at, id__gt=after.id)
+        deleted_after = Q(deleted_at__gt=after.at) | (
+            Q(deleted_at=after.at, cash_flow_id__gt=after.id)
+            if after.deleted
+            else Q(deleted_at=after.at)
+        )
+        saved = saved.filter(saved_after)
+        deleted = deleted.filter(deleted_after)
+    timeline = (
+        saved.annotate(at=F("updated_at"), deleted=Value(value=False, output_field=BooleanField()))
+        .values_list("at", "deleted", "id")
+        .union(
+            deleted.annotate(
+                at=F("deleted_at"), deleted=Value(value=True, output_field=BooleanField())
+            ).values_list("at", "deleted", "cash_flow_id"),
+            all=True,
+        )
+        .order_by("at", "deleted", "id")
+    )
+    entries = [Position(*entry) for entry in timeline[: limit + 1]]
+
+    batch = SyncBatch(more=len(entries) > limit)
+    entries = entries[:limit]
+    ids = [entry.id for entry in entries if not entry.deleted]
+    rows = {row["id"]: row for row in cash_flow_values(CashFlow.objects.filter(pk__in=ids))}
+    # A row deleted since the timeline was read is reported by its tombstone later
+    batch.changed = [rows[pk] for pk in ids if pk in rows]
+    batch.deleted = [entry.id for entry in entries if entry.deleted]
+    if batch.more:
+        batch.position = entries[-1]
+    else:
+        end = Position(until)
+        batch.position = max(after, end) if after is not None else end
+    return batch
+
+
+def tombstone_cutoff() -> datetime:
+    """Tombstones older than this are purged"""
+    return timezone.now() - timedelta(days=settings.CASH_FLOW_TOMBSTONE_DAYS)
+
+
+def purge_tombstones() -> int:
+    """Delete the tombstones past the retention period; returns their number"""
+    deleted, _ = CashFlowTombstone.objects.filter(deleted_at__lt=tombstone_cutoff()).delete()
+    return deleted
@@ -0,0 +1,112 @@
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import HttpRequest, QueryDict
+from django_filters.utils import translate_validation
+from rest_framework.request import Request
+
+from . import balance, events, export, jobs, merge, pivot, renames, replicas, rollup
+from .filters import CashFlowRollupFilter
+from .models import CashFlow, CashFlowRollup, Job
+from .renderers import ORJSONRenderer
+from .serializers import CashFlowExportQuerySerializer, CashFlowPivotQuerySerializer
+from .views import CashFlowViewSet
+
+# Job handlers (see jobs.HANDLERS). The parameters of the export and pivot jobs
+# are the query parameters of the matching endpoints; like those endpoints, they
+# read from a replica when one is configured.
+
+
+def export_cash_flows(job: Job, progress: jobs.Progress) -> str:
+    """Write the cash flow export of the job's parameters to its result file"""
+    query = CashFlowExportQuerySerializer(data=job.params)
+    query.is_valid(raise_exception=True)
+    with replicas.request_scope(sticky=False):
+        replicas.use_replica()
+        encoder = export.ExportEncoder(
+            query.validated_data["output"],
+            compress="compress" in query.validated_data,
+        )
+        queryset = cash_flows(job.params)
+        total = queryset.count()
+        progress(0, total, force=True)
+        chunk_size = settings.CASH_FLOW_EXPORT_CHUNK_SIZE
+        rows = queryset.values_list(*export.COLUMNS).iterator(chunk_size=chunk_size)
+        with jobs.result_file(job, encoder.filename) as (name, file):
+            if header := encoder.header():
+                file.write(header)
+            for processed, row in enumerate(rows, start=1):
+                if chunk := encoder.encode(row):
+                    file.write(chunk)
+                if processed % chunk_size == 0:
+                    progress(processed)
+            if chunk := encoder.finish():
+                file.write(chunk)
+    progress(total, force=True)
+    return name
+
+
+def pivot_report(job: Job, progress: jobs.Progress) -> str:
+    """Write the pivot report of the job's parameters to its result file as JSON"""
+    query = CashFlowPivotQuerySerializer(data=job.params)
+    query.is_valid(raise_exception=True)
+    with replicas.request_scope(sticky=False):
+        replicas.use_replica()
+        filterset = CashFlowRollupFilter(_query_dict(job.params), CashFlowRollup.objects.all())
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        report = pivot.pivot(
+            filterset.qs, query.validated_data["rows"], query.validated_data["columns"]
+        )
+    with jobs.result_file(job, "pivot.json") as (name, file):
+        file.write(ORJSONRenderer().render(report))
+    progress(1, 1, force=True)
+    return name
+
+
+def rebuild_rollup(job: Job, progress: jobs.Progress) -> None:  # noqa: ARG001
+    """Rebuild the daily rollup and the balance snapshots from the cash flows"""
+    rows = rollup.rebuild()
+    balance.rebuild()
+    events.cash_flows_changed()
+    progress(rows, rows, force=True)
+
+
+def rebuild_balances(job: Job, progress: jobs.Progress) -> None:  # noqa: ARG001
+    """Recompute the balance snapshots from the daily rollup"""
+    rows = balance.rebuild()
+    progress(rows, rows, force=True)
+
+
+def merge_dictionary(job: Job, progress: jobs.Progress) -> None:
+    """Move the cash flows of one dictionary row to another and delete it; a
+    retried attempt carries on where the last one stopped"""
+    params = job.params
+    merge.DictionaryMerge(params["model"], int(params["source"]), int(params["target"])).run(
+        progress
+    )
+    progress(job.processed, job.total, force=True)
+
+
+def refresh_dictionary_names(job: Job, progress: jobs.Progress) -> None:
+    """Copy the new name of a renamed dictionary row to its cash flows in batches"""
+    renames.refresh(job.params["model"], int(job.params["id"]), progress=progress)
+    progress(job.processed, job.total, force=True)
+
+
+def cash_flows(params: Mapping[str, str]) -> QuerySet[CashFlow]:
+    """Return the cash flows the list endpoint filters and orders by ``params``"""
+    http_request = HttpRequest()
+    http_request.method = "GET"
+    http_request.GET = _query_dict(params)
+    view = CashFlowViewSet(
+        request=Request(http_request), format_kwarg=None, action="export", kwargs={}
+    )
+    return view.filter_queryset(CashFlow.objects.all())
+
+
+def _query_dict(params: Mapping[str, str]) -> QueryDict:
+    query = QueryDict(mutable=True)
+    query.update(params)
+    return query
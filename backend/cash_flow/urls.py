@@ -5,8 +5,11 @@ from .views import (
     CashFlowTypeViewSet,
     CashFlowViewSet,
     CategoryViewSet,
+    DictionaryTreeView,
+    JobViewSet,
     StatusViewSet,
     SubcategoryViewSet,
+    event_stream,
 )
 
 router = routers.DefaultRouter()
@@ -15,7 +18,10 @@ router.register(r"statuses", StatusViewSet)
 router.register(r"categories", CategoryViewSet)
 router.register(r"subcategories", SubcategoryViewSet)
 router.register(r"cash_flows", CashFlowViewSet)
+router.register(r"jobs", JobViewSet)
 
 urlpatterns = [
+    path("dictionaries/", DictionaryTreeView.as_view(), name="dictionaries"),
+    path("events/", event_stream, name="events"),
     path("", include(router.urls)),
 ]
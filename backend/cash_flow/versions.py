@@ -0,0 +1,49 @@
+from collections.abc import Iterable
+
+from django.db import connection, transaction
+
+from .models import DataVersion
+
+DICTIONARIES = "dictionaries"
+CASH_FLOWS = "cash_flows"
+
+
+def get(key: str, using: str | None = None) -> int:
+    """Return the version of ``key``; 0 until it is bumped for the first time"""
+    return get_many([key], using)[key]
+
+
+def get_many(keys: Iterable[str], using: str | None = None) -> dict[str, int]:
+    """Return the versions of several keys in one query, from the ``using``
+    database or the one the router picks"""
+    keys = list(keys)
+    versions = dict(
+        DataVersion.objects.using(using).filter(key__in=keys).values_list("key", "version")
+    )
+    return {key: versions.get(key, 0) for key in keys}
+
+
+async def aget(key: str) -> int:
+    """Async ``get``"""
+    version = await DataVersion.objects.filter(key=key).values_list("version", flat=True).afirst()
+    return version or 0
+
+
+def bump(key: str) -> None:
+    """Increment the version of ``key`` in the current transaction"""
+    table = DataVersion._meta.db_table  # noqa: SLF001
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (key, version) VALUES (%s, 1)"  # noqa: S608
+            f" ON CONFLICT (key) DO UPDATE SET version = {table}.version + 1",
+            [key],
+        )
+
+
+def bump_on_commit(key: str) -> None:
+    """Increment the version of ``key`` once the current transaction commits.
+
+    For frequently written data: the version row is then locked by its own
+    short update instead of until the end of every writing transaction.
+    """
+    transaction.on_commit(lambda: bump(key))
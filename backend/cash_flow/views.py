@@ -1,61 +1,231 @@
+import io
+from collections.abc import Mapping, Sequence
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.db.models.functions import Trunc
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import pagination, permissions, viewsets
-from rest_framework.filters import OrderingFilter
+from django_filters.utils import translate_validation
+from rest_framework import mixins, pagination, permissions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
-from .filters import CashFlowFilter
-from .models import CashFlow, CashFlowType, Category, Status, Subcategory
+from . import (
+    balance,
+    bulk,
+    dictionaries,
+    events,
+    export,
+    instrumentation,
+    jobs,
+    merge,
+    pivot,
+    response_cache,
+    sync,
+    versions,
+)
+from .filters import SEARCH_RANK, CashFlowFilter, CashFlowOrderingFilter, CashFlowRollupFilter
+from .importer import CashFlowImporter, ImportFormatError
+from .mixins import AsyncReadMixin, ReplicaReadMixin
+from .models import CashFlow, CashFlowRollup, CashFlowType, Category, Job, Status, Subcategory
+from .pagination import (
+    EstimatedCountPagination,
+    KeysetPagination,
+    StandardResultsSetPagination,
+)
 from .serializers import (
+    CashFlowBalanceQuerySerializer,
+    CashFlowBalanceSerializer,
+    CashFlowBulkDeleteSerializer,
+    CashFlowBulkSerializer,
+    CashFlowExportQuerySerializer,
+    CashFlowImportSerializer,
+    CashFlowPivotQuerySerializer,
     CashFlowSerializer,
+    CashFlowSummaryQuerySerializer,
+    CashFlowSummarySerializer,
+    CashFlowSyncQuerySerializer,
     CashFlowTypeSerializer,
     CategorySerializer,
+    DictionaryMergeSerializer,
+    JobSerializer,
+    JobSubmitSerializer,
     StatusSerializer,
     SubcategorySerializer,
+    cash_flow_representation,
+    cash_flow_values,
 )
 
 
-class StandardResultsSetPagination(pagination.PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "page_size"
-    max_page_size = 100
+class CachedDictionaryViewSet(ReplicaReadMixin, AsyncReadMixin, viewsets.ModelViewSet):
+    """Dictionary viewset whose reads are served from the dictionary cache"""
+
+    replica_actions = frozenset({"list", "retrieve"})
+
+    @response_cache.cached
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """List the cached rows, ordered by name like the queryset"""
+        return self._list(dictionaries.get())
+
+    @response_cache.cached
+    async def alist(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """Async ``list``"""
+        return self._list(await dictionaries.aget())
+
+    def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """Return one cached row"""
+        return self._retrieve(dictionaries.get())
+
+    async def aretrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """Async ``retrieve``"""
+        return self._retrieve(await dictionaries.aget())
+
+    def get_cache_versions(self) -> Sequence[int]:
+        """Return the data versions of the cached list responses"""
+        return [dictionaries.get().version]
+
+    async def aget_cache_versions(self) -> Sequence[int]:
+        """Async ``get_cache_versions``"""
+        return [(await dictionaries.aget()).version]
+
+    @action(detail=True, methods=["post"])
+    def merge(self, request: Request, pk: str | None = None) -> Response:
+        """Queue a merge job (see merge.py) moving the cash flows of this row to the
+        ``target`` row and deleting this row"""
+        model_name = next(
+            name for name, model in merge.MODELS.items() if model is self.queryset.model
+        )
+        params = {"model": model_name, "source": pk, "target": request.data.get("target")}
+        DictionaryMergeSerializer(data=params).is_valid(raise_exception=True)
+        job, created = jobs.submit(
+            Job.Kind.MERGE, {key: str(value) for key, value in params.items()}
+        )
+        return job_response(job, created, request)
+
+    def _list(self, snapshot: dictionaries.DictionarySnapshot) -> Response:
+        objects = list(snapshot.for_model(self.queryset.model).values())
+        page = self.paginate_queryset(objects)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(objects, many=True).data)
+
+    def _retrieve(self, snapshot: dictionaries.DictionarySnapshot) -> Response:
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError as exc:
+            raise NotFound from exc
+        obj = snapshot.for_model(self.queryset.model).get(pk)
+        if obj is None:
+            raise NotFound
+        return Response(self.get_serializer(obj).data)
+
+
+def job_response(job: Job, created: bool, request: Request) -> Response:  # noqa: FBT001
+    """Return a submitted job: 202 when it was queued, 200 when an equal pending
+    or finished job was returned instead"""
+    return Response(
+        JobSerializer(job, context={"request": request}).data,
+        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+        headers={"Location": reverse("job-detail", args=[job.pk], request=request)},
+    )
+
+
+def metrics(request: HttpRequest) -> HttpResponse:  # noqa: ARG001
+    """Request metrics of this worker process in the Prometheus text format"""
+    return HttpResponse(
+        instrumentation.metrics.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+async def event_stream(request: HttpRequest) -> StreamingHttpResponse:  # noqa: ARG001
+    """Server-sent events with the cash flow and dictionary changes committed
+    from now on (see events.py); served under ASGI only"""
+    response = StreamingHttpResponse(events.stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Keep reverse proxies from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class DictionaryTreeView(ReplicaReadMixin, APIView):
+    """All statuses and the whole type → category → subcategory tree in one response.
+
+    The strong ETag is the dictionary data version: a matching ``If-None-Match``
+    is answered with 304 from the dictionary cache without querying the
+    dictionary tables.
+    """
 
+    permission_classes = [permissions.AllowAny]
+    replica_actions = frozenset({"get"})
+
+    def get(self, request: Request) -> Response:
+        """Return the tree, or 304 when the client already has this version"""
+        snapshot = dictionaries.get()
+        etag = quote_etag(f"dictionaries-{snapshot.version}")
+        client_etags = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in client_etags or "*" in client_etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(snapshot.tree)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
 
-class CashFlowTypeViewSet(viewsets.ModelViewSet):
+
+class CashFlowTypeViewSet(CachedDictionaryViewSet):
     queryset = CashFlowType.objects.all().order_by("name")
     serializer_class = CashFlowTypeSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
 
 
-class StatusViewSet(viewsets.ModelViewSet):
+class StatusViewSet(CachedDictionaryViewSet):
     queryset = Status.objects.all().order_by("name")
     serializer_class = StatusSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedDictionaryViewSet):
     queryset = Category.objects.all().select_related("cash_flow_type").order_by("name")
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
 
 
-class SubcategoryViewSet(viewsets.ModelViewSet):
+class SubcategoryViewSet(CachedDictionaryViewSet):
     queryset = Subcategory.objects.all().select_related("category").order_by("name")
     serializer_class = SubcategorySerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
 
 
-class CashFlowViewSet(viewsets.ModelViewSet):
-    queryset = CashFlow.objects.all().select_related(
-        "cash_flow_type", "status", "subcategory", "category"
+class CashFlowViewSet(ReplicaReadMixin, AsyncReadMixin, viewsets.ModelViewSet):
+    # The search vector is only read by the database
+    queryset = (
+        CashFlow.objects.all()
+        .select_related("cash_flow_type", "status", "subcategory", "category")
+        .defer("search_vector")
     )
     serializer_class = CashFlowSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, CashFlowOrderingFilter]
     filterset_class = CashFlowFilter
-    pagination_class = StandardResultsSetPagination
+    pagination_class = EstimatedCountPagination
     ordering_fields = [
         "created_at",
         "amount",
@@ -63,5 +233,311 @@ class CashFlowViewSet(viewsets.ModelViewSet):
         "category__name",
         "subcategory__name",
         "status__name",
+        SEARCH_RANK,
     ]
     ordering = ["-created_at"]
+    cursor_pagination_class = KeysetPagination
+    # Adds the balance of the row's status right after the row (see balance.py)
+    running_balance_query_param = "running_balance"
+    # The delta sync stays on the primary, where its horizon sees the open transactions
+    replica_actions = frozenset({"list", "retrieve", "export", "summary", "pivot", "balance"})
+
+    @property
+    def paginator(self) -> pagination.BasePagination | None:
+        """Page numbers by default; keyset pagination for ``?pagination=cursor``
+        and for requests that follow a cursor link"""
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            use_cursor = (
+                params.get("pagination") == "cursor"
+                or self.cursor_pagination_class.cursor_query_param in params
+            )
+            self._paginator = (
+                self.cursor_pagination_class() if use_cursor else self.pagination_class()
+            )
+        return self._paginator
+
+    @response_cache.cached
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """List value rows with the dictionary names joined in SQL.
+
+        Skips model instances and ``CashFlowSerializer``; the output is the same.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(cash_flow_values(queryset))
+        balances = balance.running_balances(page) if self.with_running_balance else None
+        return self.get_paginated_response(self._represent(page, balances))
+
+    @response_cache.cached
+    async def alist(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """Async ``list``: the page and its count are fetched with the async ORM.
+
+        Filtering runs in a thread because the filterset validates the dictionary
+        ids against the database.
+        """
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(
+            cash_flow_values(queryset), request, view=self
+        )
+        balances = (
+            await sync_to_async(balance.running_balances)(page)
+            if self.with_running_balance
+            else None
+        )
+        return self.get_paginated_response(self._represent(page, balances))
+
+    def get_cache_versions(self) -> Sequence[int]:
+        """Return the data versions of the cached list responses; rows carry
+        dictionary names"""
+        return [versions.get(versions.CASH_FLOWS), dictionaries.get().version]
+
+    async def aget_cache_versions(self) -> Sequence[int]:
+        """Async ``get_cache_versions``"""
+        return [await versions.aget(versions.CASH_FLOWS), (await dictionaries.aget()).version]
+
+    @property
+    def with_running_balance(self) -> bool:
+        """Whether the listing asks for the ``running_balance`` column"""
+        value = self.request.query_params.get(self.running_balance_query_param, "")
+        return value.lower() in {"1", "true"}
+
+    def _represent(
+        self, page: Sequence[Mapping[str, Any]], balances: Mapping[int, Decimal] | None
+    ) -> Sequence[dict[str, Any]]:
+        with instrumentation.serializing():
+            data = [cash_flow_representation(row) for row in page]
+            if balances is not None:
+                for row, item in zip(page, data, strict=True):
+                    # None for a row deleted between the page and the balance queries
+                    running = balances.get(row["id"])
+                    item["running_balance"] = None if running is None else str(running)
+        return data
+
+    async def aretrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:  # noqa: ARG002
+        """Async ``retrieve``"""
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (CashFlow.DoesNotExist, TypeError, ValueError, ValidationError) as exc:
+            raise Http404 from exc
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data)
+
+    def perform_content_negotiation(
+        self,
+        request: Request,
+        force: bool = False,  # noqa: FBT001, FBT002
+    ) -> tuple[Any, str]:
+        """Let the export pick its own content type whatever the ``Accept`` header says"""
+        return super().perform_content_negotiation(request, force=force or self.action == "export")
+
+    @action(detail=False, methods=["get"])
+    def export(self, request: Request) -> StreamingHttpResponse:
+        """Stream every row matching the ``CashFlowFilter`` and ``ordering`` parameters.
+
+        ``output=csv|ndjson`` selects the format, ``compress=gzip`` compresses it.
+        Rows are read through a server-side cursor as value tuples, so memory use
+        does not depend on the number of rows.
+        """
+        query = CashFlowExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        encoder = export.ExportEncoder(
+            query.validated_data["output"],
+            compress="compress" in query.validated_data,
+        )
+
+        queryset = self.filter_queryset(CashFlow.objects.all())
+        # Rows are read after the view returns: keep the database of this request
+        queryset = queryset.using(queryset.db)
+        stream = export.astream if isinstance(request._request, ASGIRequest) else export.stream  # noqa: SLF001
+        response = StreamingHttpResponse(
+            stream(queryset, encoder), content_type=encoder.content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{encoder.filename}"'
+        return response
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request: Request) -> Response:
+        """Totals per day/week/month/year answered from the daily rollup.
+
+        Accepts the ``CashFlowFilter`` parameters plus ``period`` and a comma
+        separated ``group_by`` list of dictionary dimensions.
+        """
+        query = CashFlowSummaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        period = query.validated_data["period"]
+        dimensions = query.validated_data["group_by"]
+
+        filterset = CashFlowRollupFilter(request.query_params, CashFlowRollup.objects.all())
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        rows = (
+            filterset.qs.annotate(period=Trunc("day", period))
+            .values("period", *dimensions)
+            .annotate(total=Sum("total"), count=Sum("count"))
+            .order_by("period", *dimensions)
+        )
+        serializer = CashFlowSummarySerializer(rows, many=True)
+        return Response({"period": period, "group_by": dimensions, "results": serializer.data})
+
+    @action(detail=False, methods=["get"])
+    def pivot(self, request: Request) -> Response:
+        """Pivot report with every hierarchy subtotal, answered from the daily rollup.
+
+        Accepts the ``CashFlowFilter`` parameters plus ``rows``, a comma separated
+        dimension hierarchy (type, category, subcategory by default), and
+        ``columns``: a period (month by default), a dimension or empty.
+        """
+        query = CashFlowPivotQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        filterset = CashFlowRollupFilter(request.query_params, CashFlowRollup.objects.all())
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return Response(
+            pivot.pivot(filterset.qs, query.validated_data["rows"], query.validated_data["columns"])
+        )
+
+    @action(detail=False, methods=["get"])
+    def balance(self, request: Request) -> Response:
+        """Balance of every status at the end of ``date`` (today by default),
+        from the nearest balance snapshot plus the rollup days after it"""
+        query = CashFlowBalanceQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        day = query.validated_data.get("date") or timezone.localdate()
+        statuses = dictionaries.get().statuses
+        balances = balance.balances_at(day, statuses)
+        rows = [
+            {"status": pk, "status_name": obj.name, "balance": balances.get(pk, 0)}
+            for pk, obj in statuses.items()
+        ]
+        serializer = CashFlowBalanceSerializer(rows, many=True)
+        return Response({"date": day, "results": serializer.data})
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request: Request) -> Response:
+        """Rows saved and ids deleted since ``token``, in batches of ``limit`` changes.
+
+        Without a token every row is returned, batch by batch. Each response
+        carries the token of the next request and ``more: true`` while more
+        changes are ready; an expired token is answered with 410.
+        """
+        query = CashFlowSyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            after = sync.decode_token(query.validated_data["token"])
+        except KeyError:
+            after = None
+        except ValueError as exc:
+            raise serializers.ValidationError({"token": [str(exc)]}) from exc
+        batch = sync.changes(after, query.validated_data["limit"])
+        with instrumentation.serializing():
+            changed = [cash_flow_representation(row) for row in batch.changed]
+        return Response(
+            {
+                "changed": changed,
+                "deleted": batch.deleted,
+                "token": sync.encode_token(batch.position),
+                "more": batch.more,
+            }
+        )
+
+    @action(detail=False, methods=["post", "patch", "delete"])
+    def bulk(self, request: Request) -> Response:
+        """Create (POST), partially update (PATCH) or delete (DELETE) many rows.
+
+        ``mode=atomic`` writes nothing when any row is rejected, ``mode=partial``
+        writes the valid rows; rejected rows are reported by their request index.
+        """
+        if request.method == "DELETE":
+            envelope = CashFlowBulkDeleteSerializer(data=request.data)
+            envelope.is_valid(raise_exception=True)
+            result = bulk.delete(
+                envelope.validated_data["ids"],
+                atomic=envelope.validated_data["mode"] == "atomic",
+            )
+        else:
+            envelope = CashFlowBulkSerializer(data=request.data)
+            envelope.is_valid(raise_exception=True)
+            operation = bulk.create if request.method == "POST" else bulk.update
+            result = operation(
+                envelope.validated_data["items"],
+                atomic=envelope.validated_data["mode"] == "atomic",
+                batch_size=envelope.validated_data["batch_size"],
+            )
+
+        if result.errors and not result.ids:
+            code = status.HTTP_400_BAD_REQUEST
+        elif result.errors:
+            code = status.HTTP_207_MULTI_STATUS
+        elif request.method == "POST":
+            code = status.HTTP_201_CREATED
+        else:
+            code = status.HTTP_200_OK
+        return Response({"ids": result.ids, "errors": result.errors}, status=code)
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_csv(self, request: Request) -> Response:
+        """Import an uploaded CSV file through PostgreSQL ``COPY``.
+
+        Dictionaries are referenced by name; valid lines are imported in batches and
+        rejected ones are reported with their line numbers.
+        """
+        upload = CashFlowImportSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        importer = CashFlowImporter(
+            create_missing=upload.validated_data["create_missing"],
+            batch_size=upload.validated_data.get("batch_size"),
+        )
+        lines = io.TextIOWrapper(upload.validated_data["file"], encoding="utf-8", newline="")
+        try:
+            report = importer.run(lines)
+        except (ImportFormatError, UnicodeDecodeError) as exc:
+            return Response({"file": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        code = status.HTTP_400_BAD_REQUEST if report.rejected and not report.imported else None
+        return Response(report.as_dict(), status=code or status.HTTP_200_OK)
+
+
+class JobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Background jobs (see jobs.py): submit, poll and download the result"""
+
+    queryset = Job.objects.order_by("-id")
+    serializer_class = JobSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = StandardResultsSetPagination
+
+    def create(self, request: Request) -> Response:
+        """Queue a job (202), or return the equal pending or finished job (200)"""
+        submission = JobSubmitSerializer(data=request.data)
+        submission.is_valid(raise_exception=True)
+        job, created = jobs.submit(
+            submission.validated_data["kind"], submission.validated_data["params"]
+        )
+        return job_response(job, created, request)
+
+    @action(detail=True, methods=["get"])
+    def result(self, request: Request, pk: str | None = None) -> FileResponse:  # noqa: ARG002
+        """Download the result file of a succeeded job"""
+        job = self.get_object()
+        if job.state != Job.State.SUCCEEDED or not job.result:
+            error = "The job has no result file."
+            raise NotFound(error)
+        try:
+            file = job.result.open("rb")
+        except FileNotFoundError as exc:
+            error = "The result file has been deleted."
+            raise NotFound(error) from exc
+        filename = Path(job.result.name).name
+        # Compressed and JSON results are recognized by their extension
+        content_type = export.CONTENT_TYPES.get(filename.rpartition(".")[2])
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+
+    def perform_content_negotiation(
+        self,
+        request: Request,
+        force: bool = False,  # noqa: FBT001, FBT002
+    ) -> tuple[Any, str]:
+        """Let the result download keep its own content type whatever the ``Accept``
+        header says"""
+        return super().perform_content_negotiation(request, force=force or self.action == "result")
@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -26,6 +28,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "cash_flow",
     "rest_framework",
     "django_filters",
@@ -33,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "cash_flow.middleware.PerformanceMiddleware",
+    "cash_flow.middleware.PrimaryStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -111,9 +116,39 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
         "HOST": os.environ.get("POSTGRES_HOST", "db"),
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # psycopg connection pool shared by the threads of a worker process
+        "OPTIONS": {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+                "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            },
+        },
     }
 }
 
+# Read replicas (cash_flow.replicas): comma separated host[:port] of streaming
+# replicas of the database above, e.g. "db_replica:5432". The cash flow list and
+# reports and the dictionary reads go to a replica; a client reads from the
+# primary for CASH_FLOW_REPLICA_STICKY_SECONDS after each of its writes
+CASH_FLOW_READ_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.environ.get("POSTGRES_REPLICAS", "").replace(" ", "").split(",")), start=1
+):
+    host, _, port = address.partition(":")
+    alias = f"replica_{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "OPTIONS": {"pool": dict(DATABASES["default"]["OPTIONS"]["pool"])},
+        # Tests read the test database of the primary
+        "TEST": {"MIRROR": "default"},
+    }
+    CASH_FLOW_READ_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["cash_flow.replicas.ReplicaRouter"]
+CASH_FLOW_REPLICA_STICKY_SECONDS = int(os.environ.get("CASH_FLOW_REPLICA_STICKY_SECONDS", "5"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -125,13 +160,101 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "PAGE_SIZE_QUERY_PARAM": "page_size",
     "MAX_PAGE_SIZE": 100,
+    "DEFAULT_RENDERER_CLASSES": [
+        "cash_flow.renderers.ORJSONRenderer",
+        "cash_flow.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Bulk cash flow endpoints: rows per INSERT/UPDATE batch and rows per request
+CASH_FLOW_BULK_BATCH_SIZE = int(os.environ.get("CASH_FLOW_BULK_BATCH_SIZE", "1000"))
+CASH_FLOW_BULK_MAX_ROWS = int(os.environ.get("CASH_FLOW_BULK_MAX_ROWS", "10000"))
+
+# Rows fetched per server-side cursor round trip by the streaming export
+CASH_FLOW_EXPORT_CHUNK_SIZE = int(os.environ.get("CASH_FLOW_EXPORT_CHUNK_SIZE", "2000"))
+
+# Serve list/retrieve of the cash flow and dictionary viewsets natively async under ASGI
+CASH_FLOW_ASYNC_READS = os.environ.get("CASH_FLOW_ASYNC_READS", "1") == "1"
+
+# Cash flow listings count at most this many rows unless ?exact_count=true
+CASH_FLOW_COUNT_CAP = int(os.environ.get("CASH_FLOW_COUNT_CAP", "10000"))
+
+# Monthly CashFlow partitions kept ready ahead of the current month
+CASH_FLOW_PARTITION_MONTHS_AHEAD = int(os.environ.get("CASH_FLOW_PARTITION_MONTHS_AHEAD", "3"))
+
+# Rows copied and inserted per transaction by the CSV import
+CASH_FLOW_IMPORT_BATCH_SIZE = int(os.environ.get("CASH_FLOW_IMPORT_BATCH_SIZE", "10000"))
+
+# Dictionary merges (cash_flow.merge): cash flows moved per transaction and the
+# seconds paused between two batches
+CASH_FLOW_MERGE_BATCH_SIZE = int(os.environ.get("CASH_FLOW_MERGE_BATCH_SIZE", "2000"))
+CASH_FLOW_MERGE_PAUSE = float(os.environ.get("CASH_FLOW_MERGE_PAUSE", "0.1"))
+
+# Seconds a worker trusts its dictionary cache before re-checking the shared version
+DICTIONARY_CACHE_CHECK_INTERVAL = float(os.environ.get("DICTIONARY_CACHE_CHECK_INTERVAL", "1.0"))
+
+# Share of requests logged with their timings by cash_flow.middleware.PerformanceMiddleware
+CASH_FLOW_PERF_LOG_SAMPLE_RATE = float(os.environ.get("CASH_FLOW_PERF_LOG_SAMPLE_RATE", "0.01"))
+# Executions of one SQL statement within a request that are logged as an N+1 pattern
+CASH_FLOW_N_PLUS_ONE_THRESHOLD = int(os.environ.get("CASH_FLOW_N_PLUS_ONE_THRESHOLD", "5"))
+
+# Live change events (cash_flow.events): keepalive interval of the event stream,
+# events buffered per client before it is told to reload, and the pause before
+# reconnecting the LISTEN connection
+CASH_FLOW_EVENTS_KEEPALIVE = float(os.environ.get("CASH_FLOW_EVENTS_KEEPALIVE", "15"))
+CASH_FLOW_EVENTS_QUEUE_SIZE = int(os.environ.get("CASH_FLOW_EVENTS_QUEUE_SIZE", "100"))
+CASH_FLOW_EVENTS_RETRY_SECONDS = float(os.environ.get("CASH_FLOW_EVENTS_RETRY_SECONDS", "3"))
+
+# Delta sync (cash_flow.sync): changes per batch (default and maximum), seconds the
+# batches stay behind the oldest open transaction, age in seconds after which an
+# open transaction no longer holds them back, and days tombstones are kept
+CASH_FLOW_SYNC_BATCH_SIZE = int(os.environ.get("CASH_FLOW_SYNC_BATCH_SIZE", "1000"))
+CASH_FLOW_SYNC_MARGIN_SECONDS = float(os.environ.get("CASH_FLOW_SYNC_MARGIN_SECONDS", "5"))
+CASH_FLOW_SYNC_MAX_LAG_SECONDS = float(os.environ.get("CASH_FLOW_SYNC_MAX_LAG_SECONDS", "600"))
+CASH_FLOW_TOMBSTONE_DAYS = int(os.environ.get("CASH_FLOW_TOMBSTONE_DAYS", "90"))
+
+# Caches: process-local by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache (e.g. django.core.cache.backends.redis.RedisCache and a redis:// URL) when
+# running several workers
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "cash-flow"),
+    }
 }
 
+# Response cache of the list endpoints (cash_flow.response_cache): the CACHES alias,
+# empty to turn it off, and the seconds an entry of a retired data version is kept
+CASH_FLOW_RESPONSE_CACHE = os.environ.get("CASH_FLOW_RESPONSE_CACHE", "default")
+CASH_FLOW_RESPONSE_CACHE_TIMEOUT = int(os.environ.get("CASH_FLOW_RESPONSE_CACHE_TIMEOUT", "300"))
+
+# Background jobs (cash_flow.jobs): worker threads of the run_jobs command,
+# attempts per job, base delay of the exponential retry backoff (seconds),
+# seconds without a heartbeat after which a running job is taken back, and days
+# finished jobs and their result files are kept
+CASH_FLOW_JOB_CONCURRENCY = int(os.environ.get("CASH_FLOW_JOB_CONCURRENCY", "2"))
+CASH_FLOW_JOB_MAX_ATTEMPTS = int(os.environ.get("CASH_FLOW_JOB_MAX_ATTEMPTS", "3"))
+CASH_FLOW_JOB_RETRY_DELAY = float(os.environ.get("CASH_FLOW_JOB_RETRY_DELAY", "30"))
+CASH_FLOW_JOB_STALE_SECONDS = float(os.environ.get("CASH_FLOW_JOB_STALE_SECONDS", "120"))
+CASH_FLOW_JOB_RETENTION_DAYS = int(os.environ.get("CASH_FLOW_JOB_RETENTION_DAYS", "7"))
+
+# Stored results of the run_benchmarks command that later runs are compared with
+CASH_FLOW_BENCHMARK_BASELINE = Path(
+    os.environ.get("CASH_FLOW_BENCHMARK_BASELINE", BASE_DIR / "benchmarks" / "baseline.json")
+)
+
 # CORS: allow local frontend
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
+# The frontend sends cookies for the read-your-writes stickiness of the replicas
+CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag", "Server-Timing"]
 
 LOGGING = {
     "version": 1,
@@ -142,9 +265,18 @@ LOGGING = {
         },
     },
     "loggers": {
+        # DEBUG logs every SQL statement (only when DEBUG = True); costly under load
         "django.db.backends": {
             "handlers": ["console"],
-            "level": "DEBUG",
+            "level": os.environ.get("DJANGO_DB_LOG_LEVEL", "INFO"),
+        },
+        "cash_flow.performance": {
+            "handlers": ["console"],
+            "level": "INFO",
+        },
+        "cash_flow.jobs": {
+            "handlers": ["console"],
+            "level": "INFO",
         },
     },
-}
\ No newline at end of file
+}
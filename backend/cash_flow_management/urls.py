@@ -3,10 +3,12 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 from cash_flow import urls as cash_flow_urls
+from cash_flow.views import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include(cash_flow_urls)),
+    path("metrics", metrics, name="metrics"),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
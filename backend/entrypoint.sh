@@ -5,6 +5,15 @@ set -e
 python manage.py makemigrations --noinput
 python manage.py migrate --noinput
 
+# Create upcoming monthly cash flow partitions (also run it periodically, e.g. daily)
+python manage.py cash_flow_partitions
+
+# Snapshot the daily balances up to yesterday (also run it periodically, e.g. daily)
+python manage.py cash_flow_balances
+
+# Drop the delete records of the delta sync past their retention (also run it periodically, e.g. daily)
+python manage.py purge_cash_flow_tombstones
+
 # Collect static files
 python manage.py collectstatic --noinput
 
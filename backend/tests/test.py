@@ -1,6 +1,1964 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from datetime import UTC, date, datetime, timedelta
+from datetime import time as dt_time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Self
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+import psycopg
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cash_flow import (
+    balance,
+    bulk,
+    dictionaries,
+    events,
+    instrumentation,
+    jobs,
+    merge,
+    partitions,
+    pivot,
+    replicas,
+    response_cache,
+    rollup,
+    sync,
+    versions,
+)
+from cash_flow.importer import CashFlowImporter
+from cash_flow.models import (
+    CashFlow,
+    CashFlowRollup,
+    CashFlowTombstone,
+    CashFlowType,
+    Category,
+    Job,
+    Status,
+    Subcategory,
+)
+from cash_flow.pagination import EstimatedCountPaginator, KeysetPagination
+from cash_flow.renderers import ORJSONRenderer
+from cash_flow.serializers import (
+    CashFlowBalanceSerializer,
+    CashFlowSerializer,
+    CashFlowSummarySerializer,
+    StatusSerializer,
+    cash_flow_values,
+)
+from cash_flow.views import CashFlowViewSet, StatusViewSet
+
+# Plan nodes that read a whole table or sort rows
+SCAN_OR_SORT = re.compile(r"(?:^|->\s+)(?:Parallel )?(?:Seq Scan|(?:Incremental )?Sort)\b")
+ORDERINGS = [
+    prefix + name
+    for name in (
+        "created_at",
+        "amount",
+        "cash_flow_type__name",
+        "category__name",
+        "subcategory__name",
+        "status__name",
+    )
+    for prefix in ("", "-")
+]
 
 
 # Create your tests here.
 class Test(TestCase):
     """Test class"""
+
+
+class CashFlowListPlanTest(TestCase):
+    """The supported filter and ordering combinations of the cash flow list are
+    served by indexes: no sequential scan and no sort in the plan.
+
+    Sequential scans and sorts are disabled for the planner, so it picks an
+    index whenever one can deliver the rows in order; a plan that still scans
+    or sorts has no such index.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Pick the dictionary rows to filter by"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        cls.filters = {
+            "status": Status.objects.first().pk,
+            "cash_flow_type": subcategory.category.cash_flow_type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+        }
+        # The last months: the monthly partitions and the default one
+        today = timezone.localdate()
+        cls.date_range = {
+            "created_at_after": (today - timedelta(days=90)).isoformat(),
+            "created_at_before": today.isoformat(),
+        }
+
+    def plan(self, params: dict[str, Any]) -> str:
+        """Return the plan of the list page query for the query parameters"""
+        request = Request(APIRequestFactory().get("/api/cash_flows/", params))
+        view = CashFlowViewSet(request=request, format_kwarg=None, action="list", kwargs={})
+        queryset = cash_flow_values(view.filter_queryset(view.get_queryset()))[:10]
+        with connection.cursor() as cursor:
+            for setting in ("enable_seqscan", "enable_sort", "enable_incremental_sort"):
+                cursor.execute(f"SET LOCAL {setting} = off")
+        return queryset.explain()
+
+    def assert_index_only_plan(self, params: dict[str, Any]) -> None:
+        """Fail when the plan scans or sorts"""
+        plan = self.plan(params)
+        nodes = [line.strip() for line in plan.splitlines() if SCAN_OR_SORT.search(line.strip())]
+        self.assertEqual(nodes, [], f"{params}:\n{plan}")
+
+    def test_orderings(self) -> None:
+        """Every ordering of the unfiltered list"""
+        for ordering in ORDERINGS:
+            with self.subTest(ordering=ordering):
+                self.assert_index_only_plan({"ordering": ordering})
+
+    def test_orderings_in_date_range(self) -> None:
+        """Every ordering of a date range"""
+        for ordering in ORDERINGS:
+            with self.subTest(ordering=ordering):
+                self.assert_index_only_plan({"ordering": ordering, **self.date_range})
+
+    def test_dictionary_filters(self) -> None:
+        """Each dictionary filter in date ordering, with and without a date range"""
+        for name, pk in self.filters.items():
+            for ordering in ("created_at", "-created_at"):
+                for date_range in ({}, self.date_range):
+                    with self.subTest(filter=name, ordering=ordering, date_range=bool(date_range)):
+                        self.assert_index_only_plan({name: pk, "ordering": ordering, **date_range})
+
+    def test_default_ordering(self) -> None:
+        """The list without parameters"""
+        self.assert_index_only_plan({})
+
+    def test_amount_range(self) -> None:
+        """An amount range in amount ordering"""
+        for ordering in ("amount", "-amount"):
+            with self.subTest(ordering=ordering):
+                self.assert_index_only_plan(
+                    {"amount_min": "100.00", "amount_max": "5000.00", "ordering": ordering}
+                )
+
+
+class CashFlowSortKeyTest(TestCase):
+    """The denormalized dictionary names follow writes and renames"""
+
+    def setUp(self) -> None:
+        """Create one cash flow"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.cash_flow = CashFlow.objects.create(
+            status=Status.objects.first(),
+            cash_flow_type_id=subcategory.category.cash_flow_type_id,
+            category=subcategory.category,
+            subcategory=subcategory,
+            amount=Decimal("10.00"),
+        )
+
+    def names(self) -> dict[str, str]:
+        """Return the stored name columns of the cash flow"""
+        return (
+            CashFlow.objects.filter(pk=self.cash_flow.pk)
+            .values("status_name", "cash_flow_type_name", "category_name", "subcategory_name")
+            .get()
+        )
+
+    def test_names_are_set_on_insert(self) -> None:
+        """A new row carries the names of its dictionary rows"""
+        self.assertEqual(
+            self.names(),
+            {
+                "status_name": self.cash_flow.status.name,
+                "cash_flow_type_name": self.cash_flow.cash_flow_type.name,
+                "category_name": self.cash_flow.category.name,
+                "subcategory_name": self.cash_flow.subcategory.name,
+            },
+        )
+
+    def test_names_follow_a_changed_reference(self) -> None:
+        """Moving a row to another category updates its category name"""
+        category = Category.objects.create(
+            name="Другая категория", cash_flow_type_id=self.cash_flow.cash_flow_type_id
+        )
+        CashFlow.objects.filter(pk=self.cash_flow.pk).update(category=category)
+        self.assertEqual(self.names()["category_name"], "Другая категория")
+
+    @override_settings(CASH_FLOW_MERGE_BATCH_SIZE=1, CASH_FLOW_MERGE_PAUSE=0)
+    def test_names_follow_a_rename(self) -> None:
+        """A rename queues a job that rewrites the copies in batches, moving
+        updated_at and the cash flow data version"""
+        other = CashFlow.objects.create(
+            status=self.cash_flow.status,
+            cash_flow_type=self.cash_flow.cash_flow_type,
+            category=self.cash_flow.category,
+            subcategory=self.cash_flow.subcategory,
+            amount=Decimal("20.00"),
+        )
+        updated_at = CashFlow.objects.get(pk=self.cash_flow.pk).updated_at
+        version = versions.get(versions.CASH_FLOWS)
+        category = self.cash_flow.category
+        old_name = category.name
+        category.name = "Переименованная категория"
+        category.save()
+        self.assertEqual(self.names()["category_name"], old_name)
+
+        job = jobs.claim("test/1")
+        self.assertEqual(
+            (job.kind, job.params), (Job.Kind.RENAME, {"model": "category", "id": str(category.pk)})
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.execute(job)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.processed, job.total), (Job.State.SUCCEEDED, 2, 2))
+        self.assertEqual(
+            set(
+                CashFlow.objects.filter(pk__in=[self.cash_flow.pk, other.pk]).values_list(
+                    "category_name", flat=True
+                )
+            ),
+            {"Переименованная категория"},
+        )
+        self.assertGreater(CashFlow.objects.get(pk=self.cash_flow.pk).updated_at, updated_at)
+        self.assertGreaterEqual(versions.get(versions.CASH_FLOWS), version + 2)
+
+
+class CashFlowAmountTest(TestCase):
+    """Amounts are stored in minor units and read back as decimals"""
+
+    def test_minor_units(self) -> None:
+        """An amount beyond the old numeric(10, 2) is stored exactly"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        cash_flow = CashFlow.objects.create(
+            status=Status.objects.first(),
+            cash_flow_type_id=subcategory.category.cash_flow_type_id,
+            category=subcategory.category,
+            subcategory=subcategory,
+            amount=Decimal("12345678901.25"),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT amount_minor FROM cash_flow_cashflow WHERE id = %s", [cash_flow.pk]
+            )
+            self.assertEqual(cursor.fetchone(), (1234567890125,))
+        stored = CashFlow.objects.filter(amount__gte=Decimal("12345678901.25")).get()
+        self.assertEqual(str(stored.amount), "12345678901.25")
+
+    def test_large_sums_serialize(self) -> None:
+        """Totals and balances above 1e14 fit their serializer fields"""
+        total = Decimal("123456789012345.00")
+        summary = CashFlowSummarySerializer(
+            {"period": timezone.localdate(), "total": total, "count": 12}
+        )
+        self.assertEqual(summary.data["total"], "123456789012345.00")
+        balance = CashFlowBalanceSerializer({"status": 1, "status_name": "", "balance": total})
+        self.assertEqual(balance.data["balance"], "123456789012345.00")
+
+
+@override_settings(CASH_FLOW_READ_REPLICAS=["replica_1"])
+class ReplicaRoutingTest(SimpleTestCase):
+    """Reads go to the replica only when the request opted in and may read stale rows"""
+
+    router = replicas.ReplicaRouter()
+
+    def test_reads_stay_on_the_primary_by_default(self) -> None:
+        """A request that did not opt in reads from the primary"""
+        with replicas.request_scope(sticky=False):
+            self.assertEqual(self.router.db_for_read(CashFlow), "default")
+
+    def test_replica_reads(self) -> None:
+        """An opted-in request reads from the replica and writes to the primary"""
+        with replicas.request_scope(sticky=False):
+            replicas.use_replica()
+            self.assertEqual(self.router.db_for_read(CashFlow), "replica_1")
+            self.assertEqual(self.router.db_for_write(CashFlow), "default")
+        self.assertEqual(self.router.db_for_read(CashFlow), "default")
+
+    def test_sticky_client_reads_from_the_primary(self) -> None:
+        """A client that just wrote reads from the primary"""
+        with replicas.request_scope(sticky=True):
+            replicas.use_replica()
+            self.assertEqual(self.router.db_for_read(CashFlow), "default")
+
+    @override_settings(CASH_FLOW_READ_REPLICAS=[])
+    def test_without_replicas(self) -> None:
+        """Without replicas everything reads from the primary"""
+        with replicas.request_scope(sticky=False):
+            replicas.use_replica()
+            self.assertEqual(self.router.db_for_read(CashFlow), "default")
+
+    def test_migrations_run_on_the_primary(self) -> None:
+        """Replicas follow the primary and are never migrated"""
+        self.assertTrue(self.router.allow_migrate("default", "cash_flow"))
+        self.assertFalse(self.router.allow_migrate("replica_1", "cash_flow"))
+
+
+class ServerTimingTest(SimpleTestCase):
+    """Serialization is timed apart from the view and the rendering"""
+
+    def test_serialize_entry(self) -> None:
+        """Nested serializers count once; the header carries a serialize entry"""
+        with instrumentation.collect() as stats:
+            started = time.perf_counter()
+            data = StatusSerializer([Status(pk=1, name="Бизнес")], many=True).data
+            with instrumentation.serializing(), instrumentation.serializing():
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(data, [{"id": 1, "name": "Бизнес"}])
+        self.assertGreaterEqual(stats.serialize_seconds, 0.01)
+        self.assertLessEqual(stats.serialize_seconds, elapsed)
+        self.assertIn(
+            f"serialize;dur={stats.serialize_seconds * 1000:.1f}",
+            instrumentation.server_timing(stats),
+        )
+
+
+@override_settings(CASH_FLOW_JOB_MAX_ATTEMPTS=2)
+class JobQueueTest(TestCase):
+    """Equal submissions share a job; failed attempts are retried, then fail"""
+
+    def test_equal_submissions_share_a_job(self) -> None:
+        """The second equal submission returns the queued job"""
+        job, created = jobs.submit(Job.Kind.PIVOT, {"rows": "category"})
+        again, created_again = jobs.submit(Job.Kind.PIVOT, {"rows": "category"})
+        self.assertEqual((created, created_again, again.pk), (True, False, job.pk))
+        other, created_other = jobs.submit(Job.Kind.PIVOT, {"rows": "status"})
+        self.assertTrue(created_other)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_failed_attempts(self) -> None:
+        """A failing job is queued again until its last attempt"""
+        job, _ = jobs.submit(Job.Kind.EXPORT, {"output": "xml"})
+        jobs.execute(jobs.claim("test/1"))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (Job.State.QUEUED, 1))
+        self.assertIn("ValidationError", job.error)
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        jobs.execute(jobs.claim("test/1"))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (Job.State.FAILED, 2))
+        self.assertIsNone(jobs.claim("test/1"))
+
+
+class DictionaryMergeTest(TestCase):
+    """A merge moves the cash flows and children of a row, then deletes it"""
+
+    def setUp(self) -> None:
+        """Create two categories of different types with cash flows in the first"""
+        types = CashFlowType.objects.all()[:2]
+        self.source = Category.objects.create(name="Слияние: источник", cash_flow_type=types[0])
+        self.target = Category.objects.create(name="Слияние: цель", cash_flow_type=types[1])
+        self.subcategory = Subcategory.objects.create(name="Слияние", category=self.source)
+        status = Status.objects.first()
+        for amount in (1, 2, 3, 4, 5):
+            CashFlow.objects.create(
+                status=status,
+                cash_flow_type=types[0],
+                category=self.source,
+                subcategory=self.subcategory,
+                amount=Decimal(amount),
+            )
+
+    def test_category_merge(self) -> None:
+        """The rows move in batches and take the target's type, as does the rollup"""
+        progress = []
+        report = merge.DictionaryMerge(
+            "category", self.source.pk, self.target.pk, batch_size=2, pause=0
+        ).run(lambda moved, total: progress.append((moved, total)))
+        self.assertEqual(report.rows, 5)
+        self.assertEqual(progress, [(0, 5), (2, 5), (4, 5), (5, 5)])
+        self.assertFalse(Category.objects.filter(pk=self.source.pk).exists())
+        self.subcategory.refresh_from_db()
+        self.assertEqual(self.subcategory.category_id, self.target.pk)
+        moved = CashFlow.objects.filter(subcategory=self.subcategory)
+        self.assertEqual(
+            set(moved.values_list("category_id", "cash_flow_type_id")),
+            {(self.target.pk, self.target.cash_flow_type_id)},
+        )
+        self.assertEqual(
+            list(
+                CashFlowRollup.objects.filter(subcategory=self.subcategory).values_list(
+                    "cash_flow_type_id", "total", "count"
+                )
+            ),
+            [(self.target.cash_flow_type_id, Decimal(15), 5)],
+        )
+
+
+class CashFlowRollupTest(TestCase):
+    """The daily rollup equals a fresh GROUP BY over the cash flows after every
+    kind of write, single rows through the signals and sets through ``bulk``"""
+
+    def setUp(self) -> None:
+        """Create a category of its own with two subcategories"""
+        self.status = Status.objects.first()
+        self.category = Category.objects.create(
+            name="Свёртка", cash_flow_type=CashFlowType.objects.first()
+        )
+        self.subcategories = [
+            Subcategory.objects.create(name=f"Свёртка {number}", category=self.category)
+            for number in (1, 2)
+        ]
+
+    def create(self, amount: str, subcategory: int = 0) -> CashFlow:
+        """Create one cash flow in a subcategory of the test category"""
+        return CashFlow.objects.create(
+            status=self.status,
+            cash_flow_type_id=self.category.cash_flow_type_id,
+            category=self.category,
+            subcategory=self.subcategories[subcategory],
+            amount=Decimal(amount),
+        )
+
+    def item(self, amount: str, **values: Any) -> dict[str, Any]:
+        """Return one row of a bulk request"""
+        return {
+            "status": self.status.pk,
+            "cash_flow_type": self.category.cash_flow_type_id,
+            "category": self.category.pk,
+            "subcategory": self.subcategories[0].pk,
+            "amount": amount,
+            **values,
+        }
+
+    def assert_rollup_matches(self) -> None:
+        """Compare the rollup rows with the cash flows grouped by day and keys"""
+        columns = ("day", *rollup.KEY_FIELDS, "total", "count")
+        expected = (
+            CashFlow.objects.annotate(
+                day=TruncDate("created_at", tzinfo=timezone.get_default_timezone())
+            )
+            .values("day", *rollup.KEY_FIELDS)
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .values_list(*columns)
+        )
+        self.assertEqual(
+            sorted(CashFlowRollup.objects.values_list(*columns)),
+            sorted(expected),
+        )
+
+    def test_single_row_writes(self) -> None:
+        """Create, update, moving keys and day, and delete"""
+        cash_flow = self.create("10.50")
+        other = self.create("4.25")
+        self.assert_rollup_matches()
+        cash_flow.amount = Decimal("12.75")
+        cash_flow.save()
+        self.assert_rollup_matches()
+        cash_flow.subcategory = self.subcategories[1]
+        cash_flow.created_at -= timedelta(days=40)
+        cash_flow.save()
+        self.assert_rollup_matches()
+        other.delete()
+        self.assert_rollup_matches()
+        CashFlow.objects.filter(pk=cash_flow.pk).delete()
+        self.assert_rollup_matches()
+        self.assertFalse(CashFlowRollup.objects.filter(category=self.category).exists())
+
+    def test_amounts_given_as_str_or_float(self) -> None:
+        """Amounts assigned as a string or a float are summed as stored"""
+        cash_flow = CashFlow.objects.create(
+            status=self.status,
+            cash_flow_type_id=self.category.cash_flow_type_id,
+            category=self.category,
+            subcategory=self.subcategories[0],
+            amount="10.05",
+        )
+        cash_flow.amount = 2.5
+        cash_flow.save()
+        self.create("1.25")
+        self.assert_rollup_matches()
+        self.assertEqual(
+            CashFlowRollup.objects.get(subcategory=self.subcategories[0]).total, Decimal("3.75")
+        )
+
+    def test_bulk_writes(self) -> None:
+        """Bulk create, update and the deferred bulk delete"""
+        created = bulk.create(
+            [self.item("1.00"), self.item("2.00"), self.item("3.00")],
+            atomic=True,
+            batch_size=2,
+        )
+        self.assert_rollup_matches()
+        bulk.update(
+            [
+                {"id": created.ids[0], "amount": "5.00"},
+                {"id": created.ids[1], "subcategory": self.subcategories[1].pk},
+            ],
+            atomic=True,
+            batch_size=2,
+        )
+        self.assert_rollup_matches()
+        bulk.delete(created.ids[1:], atomic=True)
+        self.assert_rollup_matches()
+        self.assertEqual(
+            list(
+                CashFlowRollup.objects.filter(category=self.category).values_list(
+                    "subcategory_id", "total", "count"
+                )
+            ),
+            [(self.subcategories[0].pk, Decimal("5.00"), 1)],
+        )
+
+    def test_summary(self) -> None:
+        """The summary endpoint returns the totals of the cash flows"""
+        self.create("1.10")
+        self.create("2.20", subcategory=1)
+        moved = self.create("3.30", subcategory=1)
+        moved.created_at -= timedelta(days=1)
+        moved.save()
+        view = CashFlowViewSet.as_view({"get": "summary"})
+        response = view(
+            APIRequestFactory().get(
+                "/api/cash_flows/summary/",
+                {"category": self.category.pk, "group_by": "subcategory"},
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        expected = (
+            CashFlow.objects.filter(category=self.category)
+            .annotate(day=TruncDate("created_at", tzinfo=timezone.get_default_timezone()))
+            .values_list("day", "subcategory_id")
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by("day", "subcategory_id")
+        )
+        self.assertEqual(
+            [
+                (row["period"], row["subcategory"], Decimal(row["total"]), row["count"])
+                for row in response.data["results"]
+            ],
+            [(day.isoformat(), *rest) for day, *rest in expected],
+        )
+
+
+class CashFlowBalanceTest(TestCase):
+    """Balances stay equal to a plain SUM of the signed amounts when cash flows
+    are written into the days that already have snapshots"""
+
+    DAYS = (12, 9, 6, 3, 1, 0)
+
+    def setUp(self) -> None:
+        """Create cash flows on a few past days and snapshot them"""
+        with connection.cursor() as cursor:
+            # TRUNCATE and ALTER TABLE refuse tables with deferred checks pending
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        self.status = Status.objects.first()
+        self.expense = Subcategory.objects.select_related("category").get(name="VPS")
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(
+                name="Остаток", cash_flow_type=CashFlowType.objects.get(sign=1)
+            )
+            self.income = Subcategory.objects.create(name="Остаток", category=category)
+        self.today = timezone.localdate()
+        self.rows = [
+            self.create("100.00", self.income, days_ago=10),
+            self.create("30.00", self.expense, days_ago=8),
+            self.create("45.50", self.expense, days_ago=5),
+            self.create("12.25", self.income, days_ago=2),
+            self.create("7.00", self.expense),
+        ]
+        balance.take()
+
+    def create(self, amount: str, subcategory: Subcategory, days_ago: int = 0) -> CashFlow:
+        """Create a cash flow ``days_ago`` days back"""
+        cash_flow = CashFlow.objects.create(
+            status=self.status,
+            cash_flow_type_id=subcategory.category.cash_flow_type_id,
+            category_id=subcategory.category_id,
+            subcategory=subcategory,
+            amount=Decimal(amount),
+        )
+        if days_ago:
+            cash_flow.created_at -= timedelta(days=days_ago)
+            cash_flow.save()
+        return cash_flow
+
+    def assert_balances_match(self) -> None:
+        """Compare the balances at the end of several days with a plain SUM"""
+        for days_ago in self.DAYS:
+            day = self.today - timedelta(days=days_ago)
+            end = timezone.make_aware(datetime.combine(day + timedelta(days=1), dt_time.min))
+            expected = sum(
+                (
+                    cash_flow.amount * cash_flow.cash_flow_type.sign
+                    for cash_flow in CashFlow.objects.filter(
+                        status=self.status, created_at__lt=end
+                    ).select_related("cash_flow_type")
+                ),
+                Decimal(0),
+            )
+            balances = balance.balances_at(day, [self.status.pk])
+            self.assertEqual(balances[self.status.pk], expected, day)
+
+    def test_writes_into_the_past(self) -> None:
+        """Backdated creates (single and imported), updates and deletes"""
+        self.assert_balances_match()
+        self.create("20.00", self.income, days_ago=7)
+        self.assert_balances_match()
+        created_at = (timezone.localtime() - timedelta(days=4)).isoformat()
+        line = [
+            self.status.name,
+            self.expense.category.cash_flow_type.name,
+            self.expense.category.name,
+            self.expense.name,
+            "15.00",
+            created_at,
+        ]
+        report = CashFlowImporter().run(
+            ["status,cash_flow_type,category,subcategory,amount,created_at", ",".join(line)]
+        )
+        self.assertEqual(report.imported, 1)
+        self.assert_balances_match()
+        first, second, third = self.rows[:3]
+        first.amount = Decimal("110.00")
+        first.save()
+        self.assert_balances_match()
+        second.created_at -= timedelta(days=3)
+        second.save()
+        self.assert_balances_match()
+        third.subcategory = self.income
+        third.category_id = self.income.category_id
+        third.cash_flow_type_id = self.income.category.cash_flow_type_id
+        third.save()
+        self.assert_balances_match()
+        third.delete()
+        self.assert_balances_match()
+
+    def test_sign_change(self) -> None:
+        """A type turned from expense into income queues a rebuild of the snapshots"""
+        cash_flow_type = self.expense.category.cash_flow_type
+        cash_flow_type.sign = 1
+        cash_flow_type.save()
+        job = Job.objects.get(kind=Job.Kind.BALANCE_REBUILD, state=Job.State.QUEUED)
+        jobs.execute(jobs.claim("test/1"))
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.State.SUCCEEDED)
+        self.assert_balances_match()
+
+    def test_running_balance_of_a_deleted_row(self) -> None:
+        """A row deleted between the page and the balance queries gets a null
+        running balance instead of failing the listing"""
+        view = CashFlowViewSet(request=Request(APIRequestFactory().get("/")), format_kwarg=None)
+        page = list(
+            cash_flow_values(
+                CashFlow.objects.filter(pk__in=[self.rows[0].pk, self.rows[-1].pk]).order_by(
+                    "created_at", "id"
+                )
+            )
+        )
+        self.rows[0].delete()
+        data = view._represent(page, balance.running_balances(page))  # noqa: SLF001
+        self.assertIsNone(data[0]["running_balance"])
+        self.assertEqual(Decimal(data[1]["running_balance"]), Decimal("-70.25"))
+
+
+class CashFlowBulkTest(TestCase):
+    """The bulk endpoint in atomic and partial mode and its status codes"""
+
+    def setUp(self) -> None:
+        """Create two cash flows"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.values = {
+            "status": Status.objects.first().pk,
+            "cash_flow_type": subcategory.category.cash_flow_type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+        }
+        self.ids = [
+            CashFlow.objects.create(
+                **{f"{name}_id": pk for name, pk in self.values.items()},
+                amount=Decimal(amount),
+            ).pk
+            for amount in ("1.00", "2.00")
+        ]
+        self.unknown = max(self.ids) + 1000
+
+    def request(self, method: str, data: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+        """Send a bulk request; return the status code and the body"""
+        view = CashFlowViewSet.as_view({method: "bulk"})
+        request = getattr(APIRequestFactory(), method)("/api/cash_flows/bulk/", data, format="json")
+        response = view(request)
+        return response.status_code, response.data
+
+    def amounts(self) -> list[Decimal]:
+        """Return the stored amounts of the created rows"""
+        return list(
+            CashFlow.objects.filter(pk__in=self.ids).order_by("pk").values_list("amount", flat=True)
+        )
+
+    def test_create(self) -> None:
+        """An invalid row rejects an atomic request and is skipped by a partial one"""
+        items = [{**self.values, "amount": "3.00"}, {**self.values, "amount": "-1"}]
+        status_code, body = self.request("post", {"items": items})
+        self.assertEqual((status_code, body["ids"]), (400, []))
+        self.assertEqual([error["index"] for error in body["errors"]], [1])
+        self.assertFalse(CashFlow.objects.filter(amount=Decimal("3.00")).exists())
+
+        status_code, body = self.request("post", {"items": items, "mode": "partial"})
+        self.assertEqual((status_code, len(body["ids"])), (207, 1))
+        self.assertEqual(CashFlow.objects.get(pk=body["ids"][0]).amount, Decimal("3.00"))
+
+        status_code, body = self.request("post", {"items": items[:1]})
+        self.assertEqual((status_code, body["errors"]), (201, []))
+
+    def test_update(self) -> None:
+        """Ids are accepted as strings; duplicate and unknown ids are reported"""
+        status_code, body = self.request(
+            "patch", {"items": [{"id": str(self.ids[0]), "amount": "5.00"}]}
+        )
+        self.assertEqual((status_code, body), (200, {"ids": [self.ids[0]], "errors": []}))
+        self.assertEqual(self.amounts(), [Decimal("5.00"), Decimal("2.00")])
+
+        items = [
+            {"id": self.ids[1], "amount": "6.00"},
+            {"id": self.ids[1], "amount": "7.00"},
+            {"id": self.unknown, "amount": "8.00"},
+        ]
+        status_code, body = self.request("patch", {"items": items})
+        self.assertEqual((status_code, body["ids"]), (400, []))
+        self.assertEqual(self.amounts(), [Decimal("5.00"), Decimal("2.00")])
+
+        status_code, body = self.request("patch", {"items": items, "mode": "partial"})
+        self.assertEqual((status_code, body["ids"]), (207, [self.ids[1]]))
+        self.assertEqual(
+            body["errors"],
+            [
+                {"index": 1, "errors": {"id": ["Duplicate id."]}},
+                {"index": 2, "errors": {"id": [bulk.DOES_NOT_EXIST.format(pk=self.unknown)]}},
+            ],
+        )
+        self.assertEqual(self.amounts(), [Decimal("5.00"), Decimal("6.00")])
+
+    def test_delete(self) -> None:
+        """Unknown ids reject an atomic delete and are reported by a partial one"""
+        ids = [self.ids[0], self.unknown]
+        status_code, body = self.request("delete", {"ids": ids})
+        self.assertEqual((status_code, body["ids"]), (400, []))
+        self.assertEqual(len(self.amounts()), 2)
+
+        status_code, body = self.request("delete", {"ids": ids, "mode": "partial"})
+        self.assertEqual(
+            (status_code, body),
+            (
+                207,
+                {
+                    "ids": [self.ids[0]],
+                    "errors": [
+                        {
+                            "index": 1,
+                            "errors": {"id": [bulk.DOES_NOT_EXIST.format(pk=self.unknown)]},
+                        }
+                    ],
+                },
+            ),
+        )
+        self.assertEqual(self.amounts(), [Decimal("2.00")])
+
+        status_code, body = self.request("delete", {"ids": self.ids[1:]})
+        self.assertEqual((status_code, body["ids"]), (200, self.ids[1:]))
+
+
+class CashFlowSyncTest(TestCase):
+    """Walking the change timeline in small batches neither loses nor repeats changes.
+
+    Timestamps are set to minutes in the past, before the horizon of open
+    transactions, so every change is ready to be synced.
+    """
+
+    def setUp(self) -> None:
+        """Create ten cash flows saved two by two a minute apart"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.values = {
+            "status_id": Status.objects.first().pk,
+            "cash_flow_type_id": subcategory.category.cash_flow_type_id,
+            "category_id": subcategory.category_id,
+            "subcategory_id": subcategory.pk,
+        }
+        self.start = timezone.now() - timedelta(hours=1)
+        self.ids = [self.create(minutes=number // 2, amount=number + 1) for number in range(10)]
+
+    def create(self, minutes: int, amount: int = 1) -> int:
+        """Create a cash flow saved at ``start + minutes``; return its id"""
+        pk = CashFlow.objects.create(**self.values, amount=Decimal(amount)).pk
+        self.stamp([pk], minutes)
+        return pk
+
+    def stamp(self, ids: list[int], minutes: int) -> None:
+        """Move the last save or deletion of the rows to ``start + minutes``"""
+        at = self.start + timedelta(minutes=minutes)
+        CashFlow.objects.filter(pk__in=ids).update(updated_at=at)
+        CashFlowTombstone.objects.filter(cash_flow_id__in=ids).update(deleted_at=at)
+
+    def update(self, pk: int, amount: int, minutes: int) -> None:
+        """Save a new amount of a cash flow at ``start + minutes``"""
+        cash_flow = CashFlow.objects.get(pk=pk)
+        cash_flow.amount = Decimal(amount)
+        cash_flow.save()
+        self.stamp([pk], minutes)
+
+    def delete(self, pk: int, minutes: int) -> None:
+        """Delete a cash flow at ``start + minutes``; the signal leaves its tombstone"""
+        CashFlow.objects.get(pk=pk).delete()
+        self.stamp([pk], minutes)
+
+    def delete_in_bulk(self, ids: list[int], minutes: int) -> None:
+        """Delete cash flows at ``start + minutes`` with one bulk delete"""
+        bulk.delete(ids, atomic=True)
+        self.stamp(ids, minutes)
+
+    def walk(
+        self, position: sync.Position | None, limit: int, batches: int | None = None
+    ) -> tuple[list[tuple[int, Decimal | None]], sync.Position]:
+        """Follow the tokens to the end, or for ``batches`` batches that all have
+        more changes after them; return the saved rows as (id, amount), the
+        deleted ones as (id, None), and the last position"""
+        entries = []
+        for _ in range(batches or 1000):
+            batch = sync.changes(position, limit)
+            self.assertLessEqual(len(batch.changed) + len(batch.deleted), limit)
+            if position is not None:
+                self.assertGreater(batch.position, position)
+            position = batch.position
+            entries += [(row["id"], row["amount"]) for row in batch.changed]
+            entries += [(pk, None) for pk in batch.deleted]
+            if batches is not None:
+                self.assertTrue(batch.more)
+            elif not batch.more:
+                break
+        return entries, position
+
+    def assert_synced(self, limit: int) -> None:
+        """Interleave writes and deletes with batches, then finish the walk: the
+        client's copy equals the table"""
+        client: dict[int, Decimal] = {}
+        changes = [
+            lambda minutes: self.update(self.ids[0], 100, minutes),
+            lambda minutes: self.update(self.ids[8], 200, minutes),
+            lambda minutes: self.delete(self.ids[1], minutes),
+            lambda minutes: self.delete_in_bulk([self.ids[3], self.ids[9]], minutes),
+            lambda minutes: self.create(minutes, amount=300),
+        ]
+        position = None
+        for minutes, change in enumerate(changes, start=10):
+            entries, position = self.walk(position, limit, batches=1)
+            self.apply(client, entries)
+            change(minutes)
+        entries, position = self.walk(position, limit)
+        self.apply(client, entries)
+        self.assertEqual(client, dict(CashFlow.objects.values_list("id", "amount")))
+        self.assertEqual(self.walk(position, limit)[0], [])
+
+    def apply(self, client: dict[int, Decimal], entries: list[tuple[int, Decimal | None]]) -> None:
+        """Apply synced entries to the client's copy of the amounts"""
+        for pk, amount in entries:
+            if amount is None:
+                client.pop(pk, None)
+            else:
+                client[pk] = amount
+
+    def test_saved_and_deleted_at_one_timestamp(self) -> None:
+        """Saves come before the deletions of the same time, each exactly once;
+        single and bulk deletes leave tombstones"""
+        amounts = dict(CashFlow.objects.filter(pk__in=self.ids).values_list("id", "amount"))
+        self.delete(self.ids[1], minutes=0)
+        self.delete_in_bulk([self.ids[3]], minutes=0)
+        self.stamp(self.ids, minutes=0)
+        saved = [(pk, amounts[pk]) for pk in self.ids if pk not in {self.ids[1], self.ids[3]}]
+        for limit in (1, 2, 3, 20):
+            with self.subTest(limit=limit):
+                entries, _ = self.walk(None, limit)
+                self.assertEqual(
+                    [entry for entry in entries if entry[0] in self.ids],
+                    [*saved, (self.ids[1], None), (self.ids[3], None)],
+                )
+
+    def test_more(self) -> None:
+        """``more`` holds while changes are left; the last batch moves to the horizon"""
+        first = sync.changes(None, len(self.ids) - 1)
+        self.assertTrue(first.more)
+        rest = sync.changes(first.position, len(self.ids))
+        self.assertFalse(rest.more)
+        self.assertGreater(rest.position.at, self.start + timedelta(minutes=4))
+        last = sync.changes(rest.position, 1)
+        self.assertEqual((last.changed, last.deleted, last.more), ([], [], False))
+
+    def test_one_by_one(self) -> None:
+        """Batches of one change"""
+        self.assert_synced(limit=1)
+
+    def test_two_by_two(self) -> None:
+        """Batches of two changes"""
+        self.assert_synced(limit=2)
+
+    def test_horizon(self) -> None:
+        """Without other transactions the horizon is the margin before now"""
+        before = timezone.now()
+        horizon = sync.horizon()
+        margin = timedelta(seconds=settings.CASH_FLOW_SYNC_MARGIN_SECONDS)
+        self.assertGreaterEqual(horizon, before - margin)
+        self.assertLessEqual(horizon, timezone.now() - margin)
+
+    def test_expired_token(self) -> None:
+        """A token older than the tombstones is answered with 410"""
+        at = timezone.now() - timedelta(days=settings.CASH_FLOW_TOMBSTONE_DAYS, hours=1)
+        view = CashFlowViewSet.as_view({"get": "sync"})
+        response = view(
+            APIRequestFactory().get(
+                "/api/cash_flows/sync/", {"token": sync.encode_token(sync.Position(at))}
+            )
+        )
+        self.assertEqual(response.status_code, 410)
+
+
+class KeysetPaginationTest(TestCase):
+    """Cursor pages walk the rows once in both directions, ties broken by id"""
+
+    # Bounds the walks, so a cursor that stands still fails instead of looping
+    MAX_PAGES = 10
+
+    def setUp(self) -> None:
+        """Create seven cash flows sharing three creation times"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        created = [
+            CashFlow.objects.create(
+                status=Status.objects.first(),
+                cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                category=subcategory.category,
+                subcategory=subcategory,
+                amount=Decimal(number % 3 + 1),
+            )
+            for number in range(7)
+        ]
+        now = timezone.now()
+        for number, cash_flow in enumerate(created):
+            CashFlow.objects.filter(pk=cash_flow.pk).update(
+                created_at=now - timedelta(hours=number % 3)
+            )
+        self.queryset = CashFlow.objects.filter(pk__in=[obj.pk for obj in created])
+
+    def page(
+        self, queryset: QuerySet, link: str | None = None
+    ) -> tuple[list[int], KeysetPagination]:
+        """Return the ids of the page behind ``link`` (the first one for ``None``)
+        and its paginator"""
+        params = {"page_size": 2}
+        if link is not None:
+            params["cursor"] = parse_qs(urlsplit(link).query)["cursor"][0]
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get("/api/cash_flows/", params))
+        return [obj.pk for obj in paginator.paginate_queryset(queryset, request)], paginator
+
+    def test_walk_both_ways(self) -> None:
+        """Following next links, then previous links, visits every row once in order"""
+        # The orderings as completed by the paginator's tiebreaker
+        for ordering in (
+            ["-created_at", "-id"],
+            ["amount", "id"],
+            ["created_at", "-amount", "-id"],
+        ):
+            with self.subTest(ordering=ordering):
+                queryset = self.queryset.order_by(*ordering[:-1])
+                expected = list(queryset.order_by(*ordering).values_list("id", flat=True))
+                ids, paginator = self.page(queryset)
+                pages = [ids]
+                while (link := paginator.get_next_link()) is not None and len(
+                    pages
+                ) < self.MAX_PAGES:
+                    ids, paginator = self.page(queryset, link)
+                    pages.append(ids)
+                self.assertEqual([pk for ids in pages for pk in ids], expected)
+                self.assertEqual([len(ids) for ids in pages], [2, 2, 2, 1])
+
+                backward = [pages[-1]]
+                while (link := paginator.get_previous_link()) is not None and len(
+                    backward
+                ) < self.MAX_PAGES:
+                    ids, paginator = self.page(queryset, link)
+                    backward.append(ids)
+                self.assertEqual(backward, pages[::-1])
+
+    def test_cursor_of_another_ordering(self) -> None:
+        """A cursor made for one ordering is rejected by another with 404"""
+        _, paginator = self.page(self.queryset.order_by("-created_at"))
+        link = paginator.get_next_link()
+        self.assertEqual(len(self.page(self.queryset.order_by("-created_at"), link)[0]), 2)
+        with self.assertRaisesMessage(NotFound, KeysetPagination.invalid_cursor_message):
+            self.page(self.queryset.order_by("amount"), link)
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """The orjson renderer writes the bytes of DRF's JSONRenderer"""
+
+    def test_same_output(self) -> None:
+        """Dates, decimals, large integers, floats and line separators"""
+        values = {
+            "utc": datetime(2024, 1, 1, 12, 0, 0, 123456, tzinfo=UTC),
+            "offset": datetime(2024, 1, 1, 12, 0, tzinfo=timezone.get_fixed_timezone(180)),
+            "naive": datetime(2024, 1, 1, 12, 0),  # noqa: DTZ001
+            "date": date(2024, 1, 1),
+            "time": dt_time(12, 0, 0, 500),
+            "duration": timedelta(hours=1),
+            "decimals": [Decimal("1.10"), Decimal("1E+2")],
+            "integers": [2**63 - 1, 2**70, -(2**70)],
+            "floats": [0.1, 1e16, 1e-5, -2.5e-7],
+            "text": "line\u2028separator",
+            "keys": {1: "integer key"},
+        }
+        for name, value in values.items():
+            with self.subTest(name):
+                data = {"value": value, "next": None}
+                self.assertEqual(
+                    ORJSONRenderer().render(data, "application/json"),
+                    JSONRenderer().render(data, "application/json"),
+                )
+
+    def test_non_finite_numbers(self) -> None:
+        """NaN and infinities are refused like JSONRenderer refuses them"""
+        for value in (float("nan"), float("inf"), Decimal("NaN")):
+            with self.subTest(value=value):
+                for renderer in (JSONRenderer(), ORJSONRenderer()):
+                    with self.assertRaisesMessage(ValueError, "not JSON compliant"):
+                        renderer.render({"value": value, "next": None}, "application/json")
+
+
+@override_settings(CASH_FLOW_RESPONSE_CACHE="default")
+class ResponseCacheTest(TestCase):
+    """List responses are cached per data version and normalized URL"""
+
+    CASH_FLOWS = "/api/cash_flows/?pagination=cursor"
+
+    def setUp(self) -> None:
+        """Start from an empty cache"""
+        response_cache.get_cache().clear()
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.values = {
+            "status": Status.objects.first(),
+            "cash_flow_type_id": subcategory.category.cash_flow_type_id,
+            "category_id": subcategory.category_id,
+            "subcategory": subcategory,
+        }
+
+    def get(self, url: str) -> tuple[str, Any]:
+        """Request a list; return the X-Cache header and the body"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response[response_cache.HEADER], response.json()
+
+    def test_hit(self) -> None:
+        """The second equal request is served from the cache"""
+        header, data = self.get("/api/statuses/")
+        self.assertEqual(header, "MISS")
+        self.assertEqual(self.get("/api/statuses/"), ("HIT", data))
+
+    def test_miss_after_a_write(self) -> None:
+        """A cash flow write bumps the version, so the list is built again"""
+        self.assertEqual(self.get(self.CASH_FLOWS)[0], "MISS")
+        self.assertEqual(self.get(self.CASH_FLOWS)[0], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            cash_flow = CashFlow.objects.create(**self.values, amount=Decimal("5.00"))
+        header, data = self.get(self.CASH_FLOWS)
+        self.assertEqual(header, "MISS")
+        self.assertIn(cash_flow.pk, [row["id"] for row in data["results"]])
+
+    def test_miss_after_a_rename(self) -> None:
+        """A dictionary rename bumps the dictionary version of both lists"""
+        status = self.values["status"]
+        for url in ("/api/statuses/", self.CASH_FLOWS):
+            self.assertEqual(self.get(url)[0], "MISS")
+        with self.captureOnCommitCallbacks(execute=True):
+            status.name = "Переименован"
+            status.save()
+        header, data = self.get("/api/statuses/")
+        self.assertEqual(header, "MISS")
+        self.assertIn("Переименован", [row["name"] for row in data["results"]])
+        self.assertEqual(self.get(self.CASH_FLOWS)[0], "MISS")
+
+    def test_query_parameter_order(self) -> None:
+        """Query parameters in another order share the cached response"""
+        self.assertEqual(self.get("/api/statuses/?page=1&page_size=2")[0], "MISS")
+        self.assertEqual(self.get("/api/statuses/?page_size=2&page=1")[0], "HIT")
+        self.assertEqual(self.get("/api/statuses/?page=1&page_size=3")[0], "MISS")
+
+
+class FakeListenConnection:
+    """Async LISTEN connection that yields the payloads put into ``notifications``;
+    a None payload breaks the connection"""
+
+    def __init__(self, listening: asyncio.Queue["FakeListenConnection"]) -> None:
+        """Start with no statements and no notifications; a LISTEN puts the
+        connection into ``listening``"""
+        self.listening = listening
+        self.executed: list[str] = []
+        self.notifications: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def __aenter__(self) -> Self:
+        """Enter the connection block"""
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Leave the connection block"""
+
+    async def execute(self, query: str) -> None:
+        """Record a statement"""
+        self.executed.append(query)
+        if query.startswith("LISTEN"):
+            await self.listening.put(self)
+
+    async def notifies(self) -> AsyncIterator[SimpleNamespace]:
+        """Yield the queued notifications"""
+        while (payload := await self.notifications.get()) is not None:
+            yield SimpleNamespace(payload=payload)
+        error = "connection lost"
+        raise psycopg.OperationalError(error)
+
+
+class EventHubTest(SimpleTestCase):
+    """The hub fans the notifications of a (fake) LISTEN connection out to the
+    subscribers and tells them to resync when they may have missed events"""
+
+    TIMEOUT = 1.0
+
+    def setUp(self) -> None:
+        """Hand out fake connections instead of connecting to PostgreSQL"""
+        self.connections: list[FakeListenConnection] = []
+        self.listening: asyncio.Queue[FakeListenConnection] = asyncio.Queue()
+        patcher = mock.patch.object(psycopg.AsyncConnection, "connect", self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def connect(self, **params: Any) -> FakeListenConnection:  # noqa: ARG002
+        """Open a new fake connection"""
+        self.connections.append(FakeListenConnection(self.listening))
+        return self.connections[-1]
+
+    async def listened(self) -> FakeListenConnection:
+        """Wait until the hub has issued LISTEN on a new connection"""
+        return await asyncio.wait_for(self.listening.get(), self.TIMEOUT)
+
+    async def test_fan_out(self) -> None:
+        """Every subscriber gets every notification; the last one leaving stops
+        the listener"""
+        hub = events.EventHub(queue_size=4, retry_seconds=0)
+        queues = [hub.subscribe(), hub.subscribe()]
+        conn = await self.listened()
+        self.assertEqual(conn.executed, [f"LISTEN {events.CHANNEL}"])
+        await conn.notifications.put('{"model": "cash_flow"}')
+        for queue in queues:
+            payload = await asyncio.wait_for(queue.get(), self.TIMEOUT)
+            self.assertEqual(payload, '{"model": "cash_flow"}')
+        task = hub._task  # noqa: SLF001
+        for queue in queues:
+            hub.unsubscribe(queue)
+        await asyncio.wait([task], timeout=self.TIMEOUT)
+        self.assertTrue(task.cancelled())
+        self.assertEqual(len(self.connections), 1)
+
+    async def test_overflow(self) -> None:
+        """A subscriber whose queue is full gets a single RESYNC instead"""
+        hub = events.EventHub(queue_size=2, retry_seconds=0)
+        queue = hub.subscribe()
+        for number in range(3):
+            hub.broadcast(str(number))
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait(), events.RESYNC)
+        hub.unsubscribe(queue)
+
+    async def test_reconnect(self) -> None:
+        """After a lost connection the hub listens again and sends a RESYNC"""
+        hub = events.EventHub(queue_size=4, retry_seconds=0)
+        queue = hub.subscribe()
+        conn = await self.listened()
+        with self.assertLogs(events.logger, "WARNING"):
+            await conn.notifications.put(None)
+            self.assertIsNot(await self.listened(), conn)
+        self.assertEqual(await asyncio.wait_for(queue.get(), self.TIMEOUT), events.RESYNC)
+        hub.unsubscribe(queue)
+
+    @override_settings(CASH_FLOW_EVENTS_KEEPALIVE=0.01)
+    async def test_stream(self) -> None:
+        """The stream sends the retry delay, keepalive comments and SSE data lines"""
+        hub = events.EventHub(queue_size=4, retry_seconds=0)
+        with mock.patch.object(events, "hub", hub):
+            stream = events.stream()
+            self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+            self.assertEqual(await anext(stream), b": keepalive\n\n")
+            conn = await self.listened()
+            await conn.notifications.put('{"model": "dictionaries", "action": "changed"}')
+            self.assertEqual(
+                await anext(stream), b'data: {"model": "dictionaries", "action": "changed"}\n\n'
+            )
+            await stream.aclose()
+        self.assertIsNone(hub._task)  # noqa: SLF001
+
+
+class EventPublishTest(TransactionTestCase):
+    """Writes publish their events with pg_notify when they commit"""
+
+    serialized_rollback = True
+
+    def test_publish(self) -> None:
+        """A created cash flow is delivered to a listener with its row"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {events.CHANNEL}")
+        try:
+            with transaction.atomic():
+                cash_flow = CashFlow.objects.create(
+                    status=Status.objects.first(),
+                    cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                    category_id=subcategory.category_id,
+                    subcategory=subcategory,
+                    amount=Decimal("5.00"),
+                )
+            notifies = list(connection.connection.notifies(timeout=5, stop_after=1))
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"UNLISTEN {events.CHANNEL}")
+        self.assertEqual(notifies[0].channel, events.CHANNEL)
+        event = orjson.loads(notifies[0].payload)
+        self.assertEqual(
+            (event["model"], event["action"], event["ids"]),
+            (events.CASH_FLOW, events.CREATED, [cash_flow.pk]),
+        )
+        self.assertEqual(event["rows"][0]["amount"], "5.00")
+
+    def test_large_payload(self) -> None:
+        """Rows that do not fit into a NOTIFY payload are left out"""
+        event = {"model": events.CASH_FLOW, "action": events.UPDATED, "ids": [1]}
+        payload = events._payload(event | {"rows": [{"comment": "x" * events.MAX_PAYLOAD}]})  # noqa: SLF001
+        self.assertEqual(orjson.loads(payload), event)
+
+
+class CashFlowImportTest(TestCase):
+    """CSV import through COPY: imported and rejected lines, dictionaries created
+    on the fly, and batches that fail as a whole"""
+
+    HEADER = "status,cash_flow_type,category,subcategory,amount,created_at,comment"
+
+    def line(self, amount: str, **values: str) -> str:
+        """Return one CSV line of an expense; ``values`` replace the other columns"""
+        values = {
+            "status": "Бизнес",
+            "cash_flow_type": "Списание",
+            "category": "Инфраструктура",
+            "subcategory": "VPS",
+            "amount": amount,
+            "created_at": "",
+            "comment": "",
+        } | values
+        return ",".join(values.values())
+
+    def test_copy(self) -> None:
+        """Valid lines are copied in batches with their dates and comments"""
+        report = CashFlowImporter(batch_size=2).run(
+            [
+                self.HEADER,
+                self.line("10.00", comment="Первая"),
+                self.line('"2,50"'),
+                self.line("1.25", created_at="2024-03-01"),
+            ]
+        )
+        self.assertEqual((report.rows, report.imported, report.rejected), (3, 3, 0))
+        self.assertEqual(
+            sorted(CashFlow.objects.values_list("amount", "comment", "subcategory__name")),
+            [
+                (Decimal("1.25"), "", "VPS"),
+                (Decimal("2.50"), "", "VPS"),
+                (Decimal("10.00"), "Первая", "VPS"),
+            ],
+        )
+        self.assertEqual(
+            timezone.localdate(CashFlow.objects.get(amount=Decimal("1.25")).created_at),
+            date(2024, 3, 1),
+        )
+        self.assertEqual(
+            CashFlowRollup.objects.aggregate(total=Sum("total"), count=Sum("count")),
+            {"total": Decimal("13.75"), "count": 3},
+        )
+
+    def test_rejected_lines(self) -> None:
+        """Invalid lines are counted, and the first ones kept with their reasons"""
+        report = CashFlowImporter(max_rejects=4).run(
+            [
+                self.HEADER,
+                self.line("1.00", status="Никто"),
+                self.line("abc"),
+                self.line("-1"),
+                self.line("1.00", category="Маркетинг"),
+                self.line("1.00"),
+                self.line("1.00", category=""),
+            ]
+        )
+        self.assertEqual((report.rows, report.imported, report.rejected), (6, 1, 5))
+        self.assertEqual(
+            report.rejects,
+            [
+                {"line": 2, "error": 'Unknown status "Никто".'},
+                {"line": 3, "error": 'Invalid amount "abc".'},
+                {"line": 4, "error": "Amount must be positive."},
+                {"line": 5, "error": "Subcategory does not belong to the selected category."},
+            ],
+        )
+        self.assertEqual(CashFlow.objects.count(), 1)
+
+    def test_create_missing(self) -> None:
+        """Unknown categories and subcategories are rejected, or created once"""
+        lines = [
+            self.HEADER,
+            self.line("1.00", category="Новая", subcategory="Новая подкатегория"),
+            self.line("2.00", category="Новая", subcategory="Новая подкатегория"),
+        ]
+        report = CashFlowImporter().run(lines)
+        self.assertEqual(report.rejects[0], {"line": 2, "error": 'Unknown category "Новая".'})
+        self.assertFalse(Category.objects.filter(name="Новая").exists())
+        report = CashFlowImporter(create_missing=True).run(lines)
+        self.assertEqual((report.imported, report.rejected), (2, 0))
+        subcategory = Subcategory.objects.select_related("category").get(name="Новая подкатегория")
+        self.assertEqual(subcategory.category.name, "Новая")
+        self.assertEqual(
+            subcategory.category.cash_flow_type_id,
+            CashFlowType.objects.get(name="Списание").pk,
+        )
+        self.assertEqual(CashFlow.objects.filter(subcategory=subcategory).count(), 2)
+
+    def test_failed_batch(self) -> None:
+        """A batch the database refuses leaves no trace in the rollup, the balance
+        snapshots or the data version, while the other batches are imported"""
+        status = Status.objects.first()
+        subcategory = Subcategory.objects.select_related("category").get(name="VPS")
+        earlier = CashFlow.objects.create(
+            status=status,
+            cash_flow_type_id=subcategory.category.cash_flow_type_id,
+            category_id=subcategory.category_id,
+            subcategory=subcategory,
+            amount=Decimal("3.00"),
+        )
+        earlier.created_at -= timedelta(days=5)
+        earlier.save()
+        balance.take()
+        with self.captureOnCommitCallbacks(execute=True):
+            removed = Status.objects.create(name="Удалённый")
+        importer = CashFlowImporter(batch_size=1)
+        removed_pk = removed.pk
+        removed.delete()
+        version = versions.get(versions.CASH_FLOWS)
+        created_at = (timezone.localtime() - timedelta(days=7)).isoformat()
+        with connection.cursor() as cursor:
+            # Check the foreign keys on insert rather than at the end of the test
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        with self.captureOnCommitCallbacks(execute=True):
+            report = importer.run(
+                [
+                    self.HEADER,
+                    self.line("1.00", created_at=created_at),
+                    self.line("2.00", status=removed.name, created_at=created_at),
+                ]
+            )
+        self.assertEqual((report.imported, report.rejected), (1, 1))
+        self.assertEqual(report.rejects[0]["line"], 3)
+        self.assertTrue(report.rejects[0]["error"].startswith("Batch failed:"))
+        self.assertEqual(versions.get(versions.CASH_FLOWS), version + 1)
+        self.assertFalse(CashFlowRollup.objects.filter(status_id=removed_pk).exists())
+        self.assertEqual(
+            CashFlowRollup.objects.aggregate(total=Sum("total"), count=Sum("count")),
+            {"total": Decimal("4.00"), "count": 2},
+        )
+        day = timezone.localdate() - timedelta(days=5)
+        self.assertEqual(
+            balance.balances_at(day, [status.pk, removed_pk]),
+            {status.pk: Decimal("-4.00"), removed_pk: 0},
+        )
+
+
+class CashFlowExportTest(TestCase):
+    """Exported rows equal the CashFlowSerializer output in every format"""
+
+    def setUp(self) -> None:
+        """Create cash flows whose comments need quoting"""
+        # Another test may have left a snapshot of its own rolled back dictionaries
+        dictionaries.cache.invalidate()
+        subcategory = Subcategory.objects.select_related("category").first()
+        for amount, comment in (
+            ("1.00", ""),
+            ("2.50", 'Запятая, "кавычки"'),
+            ("1234567.89", "first line\nsecond line"),
+        ):
+            CashFlow.objects.create(
+                status=Status.objects.first(),
+                cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal(amount),
+                comment=comment,
+            )
+        self.expected = sorted(
+            CashFlowSerializer(CashFlow.objects.all(), many=True).data, key=lambda row: row["id"]
+        )
+
+    def export(self, output: str, **params: str) -> bytes:
+        """Download the export"""
+        response = self.client.get("/api/cash_flows/export/", {"output": output, **params})
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_csv(self) -> None:
+        """CSV has the serializer columns and values"""
+        reader = csv.DictReader(io.StringIO(self.export("csv").decode()))
+        self.assertEqual(reader.fieldnames, list(self.expected[0]))
+        self.assertEqual(
+            sorted(reader, key=lambda row: int(row["id"])),
+            [{name: str(value) for name, value in row.items()} for row in self.expected],
+        )
+
+    def test_ndjson(self) -> None:
+        """Every NDJSON line is a serializer row"""
+        rows = [json.loads(line) for line in self.export("ndjson").decode().splitlines()]
+        self.assertEqual(sorted(rows, key=lambda row: row["id"]), self.expected)
+
+    def test_gzip(self) -> None:
+        """The compressed export decompresses to the plain one"""
+        for output in ("csv", "ndjson"):
+            with self.subTest(output):
+                self.assertEqual(
+                    gzip.decompress(self.export(output, compress="gzip")), self.export(output)
+                )
+
+
+class DictionaryTreeTest(TestCase):
+    """The dictionary tree is revalidated with the dictionary version as ETag"""
+
+    URL = "/api/dictionaries/"
+
+    def setUp(self) -> None:
+        """Drop the dictionary snapshot of earlier tests"""
+        dictionaries.cache.invalidate()
+
+    def test_not_modified(self) -> None:
+        """A matching If-None-Match is answered with an empty 304"""
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        response = self.client.get(self.URL, headers={"If-None-Match": f'"other", {etag}'})
+        self.assertEqual((response.status_code, response["ETag"]), (304, etag))
+        self.assertEqual(response.content, b"")
+        response = self.client.get(self.URL, headers={"If-None-Match": '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_after_a_write(self) -> None:
+        """A dictionary write changes the ETag and the tree"""
+        etag = self.client.get(self.URL)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Новая ветка", cash_flow_type=CashFlowType.objects.first())
+        response = self.client.get(self.URL, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Новая ветка", response.content.decode())
+
+
+class EstimatedCountPaginationTest(TestCase):
+    """Counts of the cash flow listing: estimated, capped or exact"""
+
+    ESTIMATE = 50_000
+
+    def setUp(self) -> None:
+        """Create five cash flows and fake the planner estimate of the table"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        CashFlow.objects.bulk_create(
+            CashFlow(
+                status=Status.objects.first(),
+                cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal(amount),
+            )
+            for amount in range(1, 6)
+        )
+        patcher = mock.patch("cash_flow.pagination._estimated_rows", return_value=self.ESTIMATE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def paginator(self, queryset: QuerySet, **options: Any) -> EstimatedCountPaginator:
+        """Paginate ``queryset`` by two rows"""
+        return EstimatedCountPaginator(queryset.order_by("id"), 2, **options)
+
+    def test_capped_count(self) -> None:
+        """A filtered count stops at the cap and is then not exact"""
+        filtered = CashFlow.objects.filter(amount__gte=1)
+        paginator = self.paginator(filtered, cap=3)
+        self.assertEqual((paginator.count, paginator.count_exact), (3, False))
+        paginator = self.paginator(filtered, cap=10)
+        self.assertEqual((paginator.count, paginator.count_exact), (5, True))
+
+    def test_page_beyond_the_cap(self) -> None:
+        """Asking for a page raises the cap far enough to reach it"""
+        paginator = self.paginator(CashFlow.objects.filter(amount__gte=1), cap=1)
+        page = paginator.page(3)
+        self.assertEqual(len(page.object_list), 1)
+        self.assertEqual((paginator.count, paginator.count_exact), (5, True))
+
+    def test_estimate(self) -> None:
+        """An unfiltered count is the planner estimate once it exceeds the cap"""
+        paginator = self.paginator(CashFlow.objects.all(), cap=3)
+        self.assertEqual((paginator.count, paginator.count_exact), (self.ESTIMATE, False))
+        paginator = self.paginator(CashFlow.objects.all(), cap=3, exact=True)
+        self.assertEqual((paginator.count, paginator.count_exact), (5, True))
+
+    @override_settings(CASH_FLOW_COUNT_CAP=3, CASH_FLOW_RESPONSE_CACHE="")
+    def test_exact_count_parameter(self) -> None:
+        """``?exact_count=true`` replaces the estimate and the capped count"""
+        for params, count, exact in (
+            ({}, self.ESTIMATE, False),
+            ({"exact_count": "true"}, 5, True),
+            ({"amount_min": "1"}, 3, False),
+            ({"amount_min": "1", "exact_count": "true"}, 5, True),
+        ):
+            with self.subTest(params):
+                data = self.client.get("/api/cash_flows/", {"page_size": 2, **params}).json()
+                self.assertEqual((data["count"], data["count_exact"]), (count, exact))
+
+
+@override_settings(CASH_FLOW_RESPONSE_CACHE="")
+class CashFlowSearchTest(TestCase):
+    """``?search=`` matches comments by full text or by trigrams and ranks them"""
+
+    COMMENTS = {
+        "rent": "Аренда сервера",
+        "servers": "Сервер, сервер и ещё раз сервер",
+        "english": "Payment for servers",
+        "docker": "Docker registry mirror",
+        "other": "Реклама",
+    }
+
+    def setUp(self) -> None:
+        """Create one cash flow per comment, with growing amounts"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.ids = {
+            name: CashFlow.objects.create(
+                status=Status.objects.first(),
+                cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal(number),
+                comment=comment,
+            ).pk
+            for number, (name, comment) in enumerate(self.COMMENTS.items(), start=1)
+        }
+
+    def search(self, value: str, **params: str) -> list[str]:
+        """Return the names of the found comments in the listed order"""
+        names = {pk: name for name, pk in self.ids.items()}
+        response = self.client.get("/api/cash_flows/", {"search": value, **params})
+        self.assertEqual(response.status_code, 200)
+        return [names[row["id"]] for row in response.json()["results"]]
+
+    def test_full_text(self) -> None:
+        """Inflected forms match in Russian and in English"""
+        self.assertEqual(set(self.search("сервер")), {"rent", "servers"})
+        self.assertEqual(self.search("server"), ["english"])
+
+    def test_typo(self) -> None:
+        """A misspelt word is found by trigram word similarity"""
+        self.assertEqual(self.search("dockerr"), ["docker"])
+
+    def test_rank(self) -> None:
+        """Without an ordering the more relevant comment comes first"""
+        self.assertEqual(self.search("сервер"), ["servers", "rent"])
+        self.assertEqual(self.search("сервер", ordering="amount"), ["rent", "servers"])
+
+
+class DictionaryCacheTest(TestCase):
+    """The process-local dictionary snapshot follows the dictionary version"""
+
+    def setUp(self) -> None:
+        """Use a cache of this test that checks the version once a minute"""
+        self.cache = dictionaries.DictionaryCache(check_interval=60)
+        patcher = mock.patch.object(dictionaries, "cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.snapshot = self.cache.get()
+
+    def test_check_interval(self) -> None:
+        """Within the interval the snapshot is kept unless a fresh one is asked for"""
+        status = Status.objects.create(name="Новый статус")
+        self.assertIs(self.cache.get(), self.snapshot)
+        snapshot = self.cache.get(fresh=True)
+        self.assertGreater(snapshot.version, self.snapshot.version)
+        self.assertEqual(snapshot.statuses[status.pk].name, "Новый статус")
+        self.assertIs(self.cache.get(fresh=True), snapshot)
+
+    def test_invalidate_on_commit(self) -> None:
+        """A change made in this process drops the snapshot once it commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            status = Status.objects.create(name="Новый статус")
+        self.assertIn(status.pk, self.cache.get().statuses)
+
+    def test_tree(self) -> None:
+        """The tree nests the categories and subcategories under their type"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        tree = self.snapshot.tree
+        self.assertEqual(tree["version"], self.snapshot.version)
+        self.assertEqual(len(tree["statuses"]), Status.objects.count())
+        cash_flow_type = next(
+            item
+            for item in tree["cash_flow_types"]
+            if item["id"] == subcategory.category.cash_flow_type_id
+        )
+        category = next(
+            item for item in cash_flow_type["categories"] if item["id"] == subcategory.category_id
+        )
+        self.assertIn({"id": subcategory.pk, "name": subcategory.name}, category["subcategories"])
+
+    def test_field_reloads_for_unknown_ids(self) -> None:
+        """A row created since the last check is accepted, an unknown id rejected"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        status = Status.objects.create(name="Новый статус")
+        data = {
+            "status": status.pk,
+            "cash_flow_type": subcategory.category.cash_flow_type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "1.00",
+        }
+        serializer = CashFlowSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data["status"].name, "Новый статус")
+        unknown = status.pk + 1000
+        serializer = CashFlowSerializer(data=data | {"status": unknown})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors["status"], [f'Invalid pk "{unknown}" - object does not exist.']
+        )
+
+    def test_bulk_reloads_for_unknown_ids(self) -> None:
+        """Bulk rows that reference a row created since the last check are created"""
+        subcategory = Subcategory.objects.select_related("category").first()
+        status = Status.objects.create(name="Новый статус")
+        result = bulk.create(
+            [
+                {
+                    "status": status.pk,
+                    "cash_flow_type": subcategory.category.cash_flow_type_id,
+                    "category": subcategory.category_id,
+                    "subcategory": subcategory.pk,
+                    "amount": "1.00",
+                }
+            ],
+            atomic=True,
+            batch_size=10,
+        )
+        self.assertEqual(CashFlow.objects.get(pk=result.ids[0]).status_id, status.pk)
+
+
+class CountingAuthentication(BaseAuthentication):
+    """Authentication that records its calls and never authenticates"""
+
+    calls = 0
+
+    def authenticate(self, request: Request) -> None:  # noqa: ARG002
+        """Count the call"""
+        type(self).calls += 1
+
+
+class AsyncReadTest(TestCase):
+    """The native async read path and its sync/async benchmark"""
+
+    def test_lazy_authentication_of_reads(self) -> None:
+        """Reads authenticate on first use of ``request.user``, writes up front"""
+        for action, calls in (("list", 0), ("retrieve", 0), ("create", 1)):
+            with self.subTest(action):
+                CountingAuthentication.calls = 0
+                request = Request(
+                    APIRequestFactory().get("/"), authenticators=[CountingAuthentication()]
+                )
+                StatusViewSet(action=action).perform_authentication(request)
+                self.assertEqual(CountingAuthentication.calls, calls)
+
+    def test_same_response(self) -> None:
+        """Both paths answer a list with the same body"""
+        bodies = []
+        for async_reads in (False, True):
+            with override_settings(CASH_FLOW_ASYNC_READS=async_reads, CASH_FLOW_RESPONSE_CACHE=""):
+                bodies.append(self.client.get("/api/statuses/").json())
+        self.assertEqual(bodies[0], bodies[1])
+
+    def test_benchmark(self) -> None:
+        """The benchmark reports one error-free line per mode"""
+        out = io.StringIO()
+        call_command(
+            "benchmark_reads", paths=["/api/statuses/"], requests=2, concurrency=2, stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ["sync", "async"])
+        for line in lines:
+            self.assertTrue(line.endswith("errors 0"), line)
+
+
+class PivotTest(TestCase):
+    """Every subtotal of the pivot report equals a plain aggregation of the cash flows"""
+
+    def setUp(self) -> None:
+        """Create cash flows in four subcategories over two months"""
+        for number, subcategory in enumerate(
+            Subcategory.objects.select_related("category").order_by("id")[:4], start=1
+        ):
+            for days_ago in (0, 40):
+                cash_flow = CashFlow.objects.create(
+                    status=Status.objects.first(),
+                    cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                    category_id=subcategory.category_id,
+                    subcategory=subcategory,
+                    amount=Decimal(number) * (days_ago + 1),
+                )
+                if days_ago:
+                    cash_flow.created_at -= timedelta(days=days_ago)
+                    cash_flow.save()
+
+    def assert_pivot_matches(self, rows: list[str], columns: str) -> None:
+        """Compare every report row and cell with a GROUP BY over the filtered cash flows"""
+        report = pivot.pivot(CashFlowRollup.objects.all(), rows, columns)
+        expected_rows = 1 + sum(
+            CashFlow.objects.order_by()
+            .values(*(f"{name}_id" for name in rows[:depth]))
+            .distinct()
+            .count()
+            for depth in range(1, len(rows) + 1)
+        )
+        self.assertEqual(len(report["total"]), expected_rows)
+        self.assertEqual(report["depth"][0], 0)
+        for index, depth in enumerate(report["depth"]):
+            keys = {f"{name}_id": report["keys"][name][index] for name in rows[:depth]}
+            cash_flows = CashFlow.objects.filter(**keys)
+            self.assertEqual(
+                Decimal(report["total"][index]),
+                cash_flows.aggregate(total=Sum("amount"))["total"],
+                keys,
+            )
+            if columns:
+                column = (
+                    TruncMonth("created_at", tzinfo=timezone.get_default_timezone())
+                    if columns == "month"
+                    else F(f"{columns}_id")
+                )
+                cells = dict(
+                    cash_flows.annotate(column=column)
+                    .values_list("column")
+                    .annotate(total=Sum("amount"))
+                    .order_by()
+                )
+                self.assertEqual(
+                    {
+                        key: Decimal(value)
+                        for key, value in zip(
+                            report["column_keys"], report["values"][index], strict=True
+                        )
+                        if value is not None
+                    },
+                    {
+                        key.date().isoformat() if columns == "month" else key: total
+                        for key, total in cells.items()
+                    },
+                    keys,
+                )
+
+    def test_rollup(self) -> None:
+        """Subtotals by category and subcategory, by month and without columns"""
+        for rows, columns in (
+            (["category", "subcategory"], "month"),
+            (["category", "subcategory"], ""),
+            (["cash_flow_type", "category"], "subcategory"),
+        ):
+            with self.subTest(rows=rows, columns=columns):
+                self.assert_pivot_matches(rows, columns)
+
+
+class PartitionTest(TestCase):
+    """Monthly partitions: rows leave the default partition when their month gets
+    a partition, and leave the rollup when it is detached"""
+
+    MAY = date(2001, 5, 1)
+    JUNE = date(2001, 6, 1)
+
+    def setUp(self) -> None:
+        """Create rows of two old months, which land in the default partition, and a current one"""
+        with connection.cursor() as cursor:
+            # TRUNCATE and ALTER TABLE refuse tables with deferred checks pending
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.ids: dict[date, list[int]] = {}
+        for day in (self.MAY, self.MAY + timedelta(days=30), self.JUNE, None):
+            cash_flow = CashFlow.objects.create(
+                status=Status.objects.first(),
+                cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal("1.00"),
+            )
+            if day is not None:
+                cash_flow.created_at = timezone.make_aware(datetime.combine(day, dt_time(12)))
+                cash_flow.save()
+            self.ids.setdefault(day and day.replace(day=1), []).append(cash_flow.pk)
+
+    def ids_in(self, table: str) -> set[int]:
+        """Return the cash flow ids stored in one partition"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {table}")  # noqa: S608
+            return {pk for (pk,) in cursor.fetchall()}
+
+    def test_create(self) -> None:
+        """A new partition takes the rows of its month out of the default partition"""
+        self.assertLessEqual(
+            {*self.ids[self.MAY], *self.ids[self.JUNE]}, self.ids_in(partitions.DEFAULT_PARTITION)
+        )
+        partitions.create(partitions.month_start(self.MAY))
+        name = partitions.partition_name(partitions.month_start(self.MAY))
+        self.assertEqual(self.ids_in(name), set(self.ids[self.MAY]))
+        default = self.ids_in(partitions.DEFAULT_PARTITION)
+        self.assertFalse(default & set(self.ids[self.MAY]))
+        self.assertLessEqual(set(self.ids[self.JUNE]), default)
+        self.assertEqual(CashFlow.objects.count(), 4)
+        created = partitions.ensure(0)
+        self.assertIn(partitions.partition_name(partitions.month_start(self.JUNE)), created)
+        self.assertFalse(self.ids_in(partitions.DEFAULT_PARTITION) & set(self.ids[self.JUNE]))
+
+    def test_detach(self) -> None:
+        """Detached rows leave the cash flows and the rollup, and the table is archived"""
+        for month in (self.MAY, self.JUNE):
+            partitions.create(partitions.month_start(month))
+        version = versions.get(versions.CASH_FLOWS)
+        with self.captureOnCommitCallbacks(execute=True):
+            detached = partitions.detach(
+                partitions.month_start(date(2001, 7, 1)), archive_schema="cash_flow_archive_test"
+            )
+        self.assertEqual(
+            detached,
+            [
+                partitions.partition_name(partitions.month_start(month))
+                for month in (self.MAY, self.JUNE)
+            ],
+        )
+        self.assertEqual(list(CashFlow.objects.values_list("id", flat=True)), self.ids[None])
+        self.assertFalse(CashFlowRollup.objects.filter(day__lt=date(2001, 7, 1)).exists())
+        self.assertEqual(
+            CashFlowRollup.objects.aggregate(total=Sum("total"), count=Sum("count")),
+            {"total": Decimal("1.00"), "count": 1},
+        )
+        self.assertEqual(versions.get(versions.CASH_FLOWS), version + 2)
+        self.assertEqual(
+            self.ids_in(f"cash_flow_archive_test.{detached[0]}"), set(self.ids[self.MAY])
+        )
+
+
+class CashFlowAdminTest(TestCase):
+    """The cash flow changelist: comment search and the created month/day filters"""
+
+    URL = "/admin/cash_flow/cashflow/"
+
+    def setUp(self) -> None:
+        """Log in as a superuser and create cash flows on three days"""
+        self.client.force_login(
+            get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        )
+        subcategory = Subcategory.objects.select_related("category").first()
+        self.ids = {}
+        for day, comment in (
+            (date(2001, 5, 30), "Аренда сервера"),
+            (date(2001, 5, 31), "Реклама"),
+            (date(2001, 6, 1), "Docker registry mirror"),
+        ):
+            cash_flow = CashFlow.objects.create(
+                status=Status.objects.first(),
+                cash_flow_type_id=subcategory.category.cash_flow_type_id,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                amount=Decimal("1.00"),
+                comment=comment,
+            )
+            cash_flow.created_at = timezone.make_aware(datetime.combine(day, dt_time(23, 30)))
+            cash_flow.save()
+            self.ids[day] = cash_flow.pk
+
+    def changelist(self, **params: str) -> tuple[set[int], str]:
+        """Return the ids on the changelist page and its HTML"""
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return {obj.pk for obj in response.context["cl"].result_list}, response.content.decode()
+
+    def test_search(self) -> None:
+        """The search box finds comments by full text and by trigrams"""
+        self.assertEqual(self.changelist(q="сервер")[0], {self.ids[date(2001, 5, 30)]})
+        self.assertEqual(self.changelist(q="dockerr")[0], {self.ids[date(2001, 6, 1)]})
+
+    def test_month_and_day_filters(self) -> None:
+        """Month and day choices come from the rollup and select local days"""
+        ids, html = self.changelist(created_month="2001-05")
+        self.assertEqual(ids, {self.ids[date(2001, 5, 30)], self.ids[date(2001, 5, 31)]})
+        self.assertIn("created_month=2001-06", html)
+        self.assertIn("created_day=2001-05-31", html)
+        self.assertNotIn("created_day=2001-06-01", html)
+        ids, _ = self.changelist(created_month="2001-05", created_day="2001-05-31")
+        self.assertEqual(ids, {self.ids[date(2001, 5, 31)]})
+        ids, _ = self.changelist(created_month="2001-13")
+        self.assertEqual(len(ids), len(self.ids))
+
+
+class BenchmarkSmokeTest(TestCase):
+    """generate_cash_flows loads a dataset that run_benchmarks measures without errors"""
+
+    def setUp(self) -> None:
+        """Allow the TRUNCATE and ALTER TABLE of the rollup, snapshot and partition rebuilds"""
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = Path(directory.name) / "baseline.json"
+
+    def test_generate_and_benchmark(self) -> None:
+        """Every case is reported once, error-free, and the baseline is saved"""
+        before = CashFlow.objects.count()
+        out = io.StringIO()
+        call_command("generate_cash_flows", rows=50, years=0.5, batch_size=20, stdout=out)
+        self.assertIn("Generated 50 cash flows", out.getvalue())
+        self.assertEqual(CashFlow.objects.count(), before + 50)
+
+        out = io.StringIO()
+        call_command(
+            "run_benchmarks",
+            requests=1,
+            warmup=0,
+            baseline=self.baseline,
+            save_baseline=True,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], f"Dataset: {before + 50} cash flows")
+        cases = [line for line in lines if " ms, " in line]
+        self.assertIn("write bulk delete", {line.split(":")[0] for line in cases})
+        for line in cases:
+            self.assertTrue(line.endswith(", 0 errors"), line)
+        self.assertEqual(len(orjson.loads(self.baseline.read_bytes())["results"]), len(cases))
+        # The write cases remove what they created
+        self.assertEqual(CashFlow.objects.count(), before + 50)
@@ -1,6 +1,6 @@
-import { useCallback, useEffect, useMemo, useState } from "react";
+import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { Alert, Box, Button, CircularProgress, Container, Paper, Stack, Typography } from "@mui/material";
-import type { CashFlow, CashFlowFilters, Category, CashFlowType, Status, Subcategory, ID, Paginated } from "./types";
+import type { CashFlow, CashFlowFilters, Category, CashFlowType, Status, Subcategory, ID, Paginated, ChangeEvent } from "./types";
 import { api } from "./api";
 import FiltersBar from "./components/FiltersBar";
 import CashFlowTable from "./components/CashFlowTable";
@@ -9,6 +9,33 @@ import ConfirmDialog from "./components/ConfirmDialog";
 import DictionaryTable from "./components/DictionaryTable";
 import type { DictMode } from "./components/DictionaryTable";
 
+// Where a new row goes: on top of the first page of the default ordering, nowhere
+// when it fails a dictionary filter, unknown when the filters cannot be checked here
+function placement(row: CashFlow, filters: CashFlowFilters): 'first' | 'none' | 'unknown' {
+  const keys = ['status', 'cash_flow_type', 'category', 'subcategory'] as const
+  if (keys.some((key) => filters[key] && filters[key] !== row[key])) return 'none'
+  if (filters.search || filters.created_at_after || filters.created_at_before || filters.amount_min || filters.amount_max) return 'unknown'
+  return (filters.ordering || '-created_at') === '-created_at' ? 'first' : 'unknown'
+}
+
+// Replace the displayed versions of the given rows, keeping their running balances
+function patchRows(page: Paginated<CashFlow>, rows: CashFlow[]): Paginated<CashFlow> {
+  const byId = new Map(rows.map((row) => [row.id, row]))
+  return { ...page, results: page.results.map((row) => ({ ...row, ...byId.get(row.id) })) }
+}
+
+function prependRows(page: Paginated<CashFlow>, rows: CashFlow[], pageSize: number): Paginated<CashFlow> {
+  const shown = new Set(page.results.map((row) => row.id))
+  const added = rows.filter((row) => !shown.has(row.id))
+  return { ...page, count: page.count + added.length, results: [...added, ...page.results].slice(0, pageSize) }
+}
+
+function removeRows(page: Paginated<CashFlow>, ids: ID[]): Paginated<CashFlow> {
+  const removed = new Set(ids)
+  const results = page.results.filter((row) => !removed.has(row.id))
+  return { ...page, count: page.count - (page.results.length - results.length), results }
+}
+
 function App() {
   const [statuses, setStatuses] = useState<Status[]>([]);
   const [types, setTypes] = useState<CashFlowType[]>([]);
@@ -28,6 +55,8 @@ function App() {
   const [data, setData] = useState<Paginated<CashFlow> | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Set when pushed changes may affect the page in ways it cannot patch itself
+  const [stale, setStale] = useState(false);
 
   const [formOpen, setFormOpen] = useState(false);
   const [editing, setEditing] = useState<CashFlow | null>(null);
@@ -43,6 +72,7 @@ function App() {
     
     setLoading(true);
     setError(null);
+    setStale(false);
     api.getCashFlows(filters)
       .then(setData)
       .catch((e) => setError(String(e.message || e)))
@@ -57,8 +87,8 @@ function App() {
   // Load dictionaries once
   useEffect(() => {
     let cancelled = false;
-    Promise.all([api.getStatuses(), api.getTypes(), api.getCategories(), api.getSubcategories()])
-      .then(([st, tp, cat, sub]) => {
+    api.getDictionaries()
+      .then(({ statuses: st, types: tp, categories: cat, subcategories: sub }) => {
         if (cancelled) return;
         setStatuses(st);
         setTypes(tp);
@@ -69,13 +99,25 @@ function App() {
     return () => { cancelled = true };
   }, []);
 
+  // New rows are put on top of the first page when they surely belong there
+  const addRows = (rows: CashFlow[]) => {
+    const firstPage = !data?.previous
+    const fitting = rows.filter((row) => placement(row, filters) === 'first')
+    if (firstPage && fitting.length) {
+      setData((d) => d && prependRows(d, fitting, filters.page_size ?? pageSize))
+    }
+    if (rows.some((row) => placement(row, filters) === 'unknown') || (!firstPage && fitting.length)) {
+      setStale(true)
+    }
+  };
+
   const handleDelete = async () => {
     if (!toDelete) return;
     try {
       await api.deleteCashFlow(toDelete.id as ID);
+      setData((d) => d && removeRows(d, [toDelete.id]));
       setConfirmOpen(false);
       setToDelete(null);
-      fetchData();
     } catch (e: any) {
       setError(String(e.message || e));
     }
@@ -85,14 +127,14 @@ function App() {
     try {
       if (payload.id) {
         const { id, ...rest } = payload;
-        await api.updateCashFlow(id as ID, rest);
+        const row = await api.updateCashFlow(id as ID, rest);
+        setData((d) => d && patchRows(d, [row]));
       } else {
         const { id: _omit, ...rest } = payload; // keep category in payload
-        await api.createCashFlow(rest);
+        addRows([await api.createCashFlow(rest)]);
       }
       setFormOpen(false);
       setEditing(null);
-      fetchData();
     } catch (e: any) {
       setError(String(e.message || e));
     }
@@ -102,8 +144,8 @@ function App() {
 
   // Dictionaries refresh helper
   const refreshDictionaries = useCallback(() => {
-    Promise.all([api.getStatuses(), api.getTypes(), api.getCategories(), api.getSubcategories()])
-      .then(([st, tp, cat, sub]) => {
+    api.getDictionaries()
+      .then(({ statuses: st, types: tp, categories: cat, subcategories: sub }) => {
         setStatuses(st);
         setTypes(tp);
         setCategories(cat);
@@ -112,14 +154,41 @@ function App() {
       .catch((e) => console.error(e));
   }, []);
 
-  // Dictionaries changed
+  // Dictionaries changed; the cash flow page is refetched when switching back to it
   const onDictionariesChanged = useCallback(() => {
     refreshDictionaries();
-    // If we're in cash_flows mode, refresh the data
-    if (mode === 'cash_flows') {
-      fetchData();
+  }, [refreshDictionaries]);
+
+  // Patch the current page with the changes pushed by the server instead of refetching it
+  const applyChange = (event: ChangeEvent) => {
+    if (event.model === 'dictionaries') {
+      refreshDictionaries();
+      // Names or signs shown on the page may have changed
+      if (mode === 'cash_flows') setStale(true);
+      return;
     }
-  }, [mode, refreshDictionaries, fetchData]);
+    if (mode !== 'cash_flows') return;
+    if (event.action === 'changed') {
+      setStale(true);
+    } else if (event.action === 'deleted') {
+      setData((d) => d && removeRows(d, event.ids ?? []));
+    } else if (event.rows) {
+      setData((d) => d && patchRows(d, event.rows ?? []));
+      if (event.action === 'created') addRows(event.rows);
+    } else {
+      // Too many rows for one event: fetch the displayed ones
+      const shown = new Set(data?.results.map((row) => row.id));
+      Promise.all((event.ids ?? []).filter((id) => shown.has(id)).map(api.getCashFlow))
+        .then((rows) => setData((d) => d && patchRows(d, rows)))
+        .catch((e) => console.error(e));
+      if (event.action === 'created') setStale(true);
+    }
+  };
+  const applyChangeRef = useRef(applyChange);
+  applyChangeRef.current = applyChange;
+
+  // One event stream for the lifetime of the page
+  useEffect(() => api.subscribeChanges((event) => applyChangeRef.current(event)), []);
 
   const content = useMemo(() => {
     return (
@@ -153,6 +222,11 @@ function App() {
                     onReset={resetFilters}
                   />
                   <Stack direction="column" spacing={2} sx={{ width: '100%' }}>
+                  {stale && (
+                    <Alert severity="info" action={<Button color="inherit" size="small" onClick={fetchData}>Обновить</Button>}>
+                      Данные изменились
+                    </Alert>
+                  )}
 
                   <Box display="flex" justifyContent="space-between" alignItems="center" mt={2} gap={2}>
                     <Button variant="outlined" size="small" disabled={!data?.previous} onClick={() => data?.previous && api.getCashFlowsByUrl(data.previous).then(setData)}>← Предыдущая</Button>
@@ -224,7 +298,7 @@ function App() {
         </Box>
       </Stack>
     );
-  }, [mode, loading, error, data, pageSize, dictPageSizes, types, categories, statuses, subcategories, filters]);
+  }, [mode, loading, error, stale, data, pageSize, dictPageSizes, types, categories, statuses, subcategories, filters, fetchData, onDictionariesChanged]);
   
 
   return (
@@ -1,4 +1,4 @@
-import type { CashFlow, CashFlowFilters, Paginated, Status, CashFlowType, Category, Subcategory, ID } from './types'
+import type { CashFlow, CashFlowFilters, Paginated, Status, CashFlowType, Category, Subcategory, ID, Dictionaries, DictionaryTree, ChangeEvent } from './types'
 
 const BASE_API = (import.meta as any).env?.VITE_API_URL || 'http://127.0.0.1:8000/api'
 
@@ -16,6 +16,8 @@ function buildQuery(params: Record<string, any>) {
 async function http<T>(path: string, init?: RequestInit): Promise<T> {
   const res = await fetch(`${BASE_API}${path}`, {
     headers: { 'Content-Type': 'application/json' },
+    // The API's stickiness cookie keeps reads on the primary database after a write
+    credentials: 'include',
     ...init,
   })
   if (!res.ok) {
@@ -29,6 +31,7 @@ async function http<T>(path: string, init?: RequestInit): Promise<T> {
 async function httpAbsolute<T>(url: string, init?: RequestInit): Promise<T> {
   const res = await fetch(url, {
     headers: { 'Content-Type': 'application/json' },
+    credentials: 'include',
     ...init,
   })
   if (!res.ok) {
@@ -39,19 +42,67 @@ async function httpAbsolute<T>(url: string, init?: RequestInit): Promise<T> {
   return res.json() as Promise<T>
 }
 
+// Last dictionary tree and its ETag; the server answers 304 while it is current
+let dictionariesCache: { etag: string; data: Dictionaries } | null = null
+
+function flattenDictionaries(tree: DictionaryTree): Dictionaries {
+  const types: CashFlowType[] = []
+  const categories: Category[] = []
+  const subcategories: Subcategory[] = []
+  tree.cash_flow_types.forEach(({ categories: typeCategories, ...type }) => {
+    types.push(type)
+    typeCategories.forEach(({ subcategories: categorySubcategories, ...category }) => {
+      categories.push({ ...category, cash_flow_type: type.id, cash_flow_type_name: type.name })
+      categorySubcategories.forEach((subcategory) => {
+        subcategories.push({ ...subcategory, category: category.id, category_name: category.name })
+      })
+    })
+  })
+  const byName = (a: { name: string }, b: { name: string }) => a.name.localeCompare(b.name)
+  return { statuses: tree.statuses, types, categories: categories.sort(byName), subcategories: subcategories.sort(byName) }
+}
+
+async function getDictionaries(): Promise<Dictionaries> {
+  const res = await fetch(`${BASE_API}/dictionaries/`, {
+    headers: dictionariesCache ? { 'If-None-Match': dictionariesCache.etag } : {},
+    cache: 'no-store',
+    credentials: 'include',
+  })
+  if (res.status === 304 && dictionariesCache) return dictionariesCache.data
+  if (!res.ok) {
+    const text = await res.text().catch(() => '')
+    throw new Error(`HTTP ${res.status}: ${text}`)
+  }
+  const data = flattenDictionaries(await res.json())
+  const etag = res.headers.get('ETag')
+  dictionariesCache = etag ? { etag, data } : null
+  return data
+}
+
+// Live changes over server-sent events. The browser reconnects by itself;
+// events missed meanwhile are reported as one "changed" event.
+function subscribeChanges(onEvent: (event: ChangeEvent) => void): () => void {
+  const source = new EventSource(`${BASE_API}/events/`)
+  let lost = false
+  source.onmessage = (e) => onEvent(JSON.parse(e.data))
+  source.onerror = () => { lost = true }
+  source.onopen = () => {
+    if (lost) onEvent({ model: 'cash_flow', action: 'changed' })
+    lost = false
+  }
+  return () => source.close()
+}
+
 // Dictionaries
 export const api = {
-  // Use a large page_size for dropdown sources to include newly created items immediately
-  getStatuses: () => http<Paginated<Status>>('/statuses/?page_size=100').then(d => d.results),
+  // Statuses and the whole type → category → subcategory tree in one request
+  getDictionaries,
   listStatuses: (params: Record<string, any> = {}) => http<Paginated<Status>>(`/statuses/${buildQuery(params)}`),
   getStatusesByUrl: (url: string) => httpAbsolute<Paginated<Status>>(url),
-  getTypes: () => http<Paginated<CashFlowType>>('/cash_flow_types/?page_size=100').then(d => d.results),
   listTypes: (params: Record<string, any> = {}) => http<Paginated<CashFlowType>>(`/cash_flow_types/${buildQuery(params)}`),
   getTypesByUrl: (url: string) => httpAbsolute<Paginated<CashFlowType>>(url),
-  getCategories: () => http<Paginated<Category>>('/categories/?page_size=100').then(d => d.results),
   listCategories: (params: Record<string, any> = {}) => http<Paginated<Category>>(`/categories/${buildQuery(params)}`),
   getCategoriesByUrl: (url: string) => httpAbsolute<Paginated<Category>>(url),
-  getSubcategories: () => http<Paginated<Subcategory>>('/subcategories/?page_size=100').then(d => d.results),
   listSubcategories: (params: Record<string, any> = {}) => http<Paginated<Subcategory>>(`/subcategories/${buildQuery(params)}`),
   getSubcategoriesByUrl: (url: string) => httpAbsolute<Paginated<Subcategory>>(url),
   createStatus: (payload: { name: string }) => http<Status>('/statuses/', { method: 'POST', body: JSON.stringify(payload) }),
@@ -73,6 +124,10 @@ export const api = {
 
   getCashFlowsByUrl: (url: string) => httpAbsolute<Paginated<CashFlow>>(url),
 
+  getCashFlow: (id: ID) => http<CashFlow>(`/cash_flows/${id}/`),
+
+  subscribeChanges,
+
   createCashFlow: (payload: {
     status: ID
     cash_flow_type: ID
@@ -96,7 +151,11 @@ function toApiFilters(f: CashFlowFilters) {
     subcategory: f.subcategory,
     created_at_after: f.created_at_after,
     created_at_before: f.created_at_before,
+    amount_min: f.amount_min,
+    amount_max: f.amount_max,
+    search: f.search,
     page_size: f.page_size,
     ordering: f.ordering,
+    running_balance: 1,
   }
 }
@@ -48,6 +48,7 @@ export default function CashFlowTable({ rows, onEdit, onDelete, sortKey, sortDir
                 Статус
               </TableSortLabel>
             </TableCell>
+            <TableCell align="right">Остаток</TableCell>
             <TableCell>Комментарий</TableCell>
             <TableCell align="right">Действия</TableCell>
           </TableRow>
@@ -82,6 +83,7 @@ export default function CashFlowTable({ rows, onEdit, onDelete, sortKey, sortDir
               <TableCell>{r.subcategory_name}</TableCell>
               <TableCell align="right">{r.amount}</TableCell>
               <TableCell>{r.status_name}</TableCell>
+              <TableCell align="right">{r.running_balance}</TableCell>
               <TableCell>{r.comment}</TableCell>
               <TableCell align="right" onClick={(e) => e.stopPropagation()}>
                 <Button size="small" variant="outlined" color="primary" sx={{ mr: 1 }} onClick={() => onEdit(r)}>Ред.</Button>
@@ -1,3 +1,4 @@
+import { useEffect, useState } from "react";
 import { Box, Button, MenuItem, Stack, TextField } from "@mui/material";
 import type { CashFlowFilters, Category, CashFlowType, ID, Status, Subcategory } from "../types";
 
@@ -23,8 +24,27 @@ export default function FiltersBar({ statuses, types, categories, subcategories,
     ? subcategories.filter((s) => s.category === value.category)
     : subcategories;
 
+  // Search text is applied after a short pause in typing
+  const [search, setSearch] = useState(value.search ?? "");
+  useEffect(() => setSearch(value.search ?? ""), [value.search]);
+  useEffect(() => {
+    const next = search.trim() || undefined;
+    if (next === value.search) return;
+    // Search results are ranked by relevance unless a column sort is chosen afterwards
+    const timer = setTimeout(() => onChange({ ...value, search: next, ordering: next ? undefined : "-created_at" }), 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
   return (
     <Stack direction={{ xs: "column", sm: "column" }} spacing={2} alignItems="left" mb={2}>
+      <TextField
+        label="Поиск по комментарию"
+        size="small"
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        sx={{ minWidth: 220 }}
+      />
+
       <TextField
         select
         label="Тип"
@@ -128,6 +148,24 @@ export default function FiltersBar({ statuses, types, categories, subcategories,
             },
           }}
         />
+        <TextField
+          type="number"
+          label="Сумма от"
+          size="small"
+          value={value.amount_min ?? ""}
+          onChange={(e) => onChange({ ...value, amount_min: e.target.value || undefined })}
+          inputProps={{ min: 0, step: "0.01" }}
+          sx={{ width: 140 }}
+        />
+        <TextField
+          type="number"
+          label="Сумма до"
+          size="small"
+          value={value.amount_max ?? ""}
+          onChange={(e) => onChange({ ...value, amount_max: e.target.value || undefined })}
+          inputProps={{ min: 0, step: "0.01" }}
+          sx={{ width: 140 }}
+        />
 
       {onReset && (
         <Button variant="outlined" size="small" onClick={onReset}>Сбросить</Button>
@@ -8,6 +8,8 @@ export interface Status {
 export interface CashFlowType {
   id: ID;
   name: string;
+  // 1 for income, -1 for expense
+  sign?: 1 | -1;
 }
 
 export interface Category {
@@ -24,6 +26,23 @@ export interface Subcategory {
   category_name: string;
 }
 
+export interface DictionaryTree {
+  version: number;
+  statuses: Status[];
+  cash_flow_types: (CashFlowType & {
+    categories: (Omit<Category, 'cash_flow_type' | 'cash_flow_type_name'> & {
+      subcategories: Omit<Subcategory, 'category' | 'category_name'>[];
+    })[];
+  })[];
+}
+
+export interface Dictionaries {
+  statuses: Status[];
+  types: CashFlowType[];
+  categories: Category[];
+  subcategories: Subcategory[];
+}
+
 export interface CashFlow {
   id: ID;
   status: ID;
@@ -35,12 +54,26 @@ export interface CashFlow {
   subcategory_name: string;
   amount: string;
   created_at: string;
+  updated_at: string;
   comment: string;
   status_name: string;
+  // Balance of the status right after this row (requested with running_balance=1)
+  running_balance?: string;
+}
+
+// Change pushed by /api/events/; "changed" without ids means "reload"
+export interface ChangeEvent {
+  model: 'cash_flow' | 'dictionaries';
+  action: 'created' | 'updated' | 'deleted' | 'changed';
+  ids?: ID[];
+  // Representation of created/updated rows, omitted when too large for one event
+  rows?: CashFlow[];
 }
 
 export interface Paginated<T> {
   count: number;
+  // false when count is an estimate or a lower bound (cash flow listings)
+  count_exact?: boolean;
   next: string | null;
   previous: string | null;
   results: T[];
@@ -53,6 +86,9 @@ export interface CashFlowFilters {
   subcategory?: ID | '';
   created_at_after?: string;
   created_at_before?: string;
+  amount_min?: string;
+  amount_max?: string;
+  search?: string;
   page_size?: number;
   ordering?: string;
 }
@@ -0,0 +1,5 @@
+#!/bin/sh
+# Init script of the primary (docker-compose.replica.yml): let the streaming
+# replica connect for replication with the database user's password
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
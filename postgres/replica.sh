@@ -0,0 +1,16 @@
+#!/bin/sh
+# Entrypoint of the streaming replica (docker-compose.replica.yml): clone the
+# primary on the first start, then follow it as a read-only hot standby
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    mkdir -p "$PGDATA"
+    chown postgres:postgres "$PGDATA"
+    chmod 700 "$PGDATA"
+    until su-exec postgres pg_basebackup --host="$PRIMARY_HOST" --username="$POSTGRES_USER" \
+        --pgdata="$PGDATA" --wal-method=stream --checkpoint=fast --write-recovery-conf; do
+        echo "Waiting for the primary..."
+        sleep 2
+    done
+fi
+# Long report queries keep the rows they read instead of being cancelled
+exec su-exec postgres postgres -c hot_standby=on -c hot_standby_feedback=on